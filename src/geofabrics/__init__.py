@@ -8,6 +8,11 @@ Modules:
     * geometry - A module associated with manipulating vector data.
     * dem - A module associated with reading, generating, and combining DEMs
     * bathymetry_estimation - A module associated with estimating river characteristics
+    * runner - A module for running the processors given an instruction file
+    * performance - A module for recording the performance of processor stages
+    * benchmarking - A module for benchmarking processors over processing parameters
+    * synthetic - A module for generating synthetic catchments for benchmarking
+    * kernel_benchmarks - A module for micro-benchmarking the processing kernels
 """
 
 from . import version
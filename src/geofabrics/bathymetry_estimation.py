@@ -7,36 +7,49 @@ information.
 import geopandas
 import pandas
 import pathlib
+import hashlib
 import shapely
 import numpy
 import xarray
 import scipy
 import scipy.signal
 import scipy.interpolate
+import scipy.linalg
+import scipy.spatial
 import matplotlib.pyplot
 import logging
+from . import geometry
 
 
-def _segment_slope(x_array, y_array, index):
-    """Return the slope and length characteristics of a line segment.
+def _banded_difference_penalty(
+    coefficients: list, length: int, weights: numpy.ndarray = None
+) -> list:
+    """Return the diagonals of D.T @ diag(weights) @ D where the rows of the
+    difference matrix D are the coefficients shifted one column each row (i.e.
+    numpy.diff of the identity matrix). Diagonal k is the kth upper diagonal.
 
     Parameters
     ----------
 
-    x_array
-        The x values of all polyline nodes.
-    y_array
-        The y values of all polyline nodes.
-    index
-        The segment index (the index of the starting node in the segment)
+    coefficients
+        The coefficients of a row of the difference matrix - e.g. [-1, 1] for
+        first differences.
+    length
+        The number of columns in the difference matrix.
+    weights
+        Optionally a weight for each row of the difference matrix.
     """
-    length = numpy.sqrt(
-        (x_array[index + 1] - x_array[index]) ** 2
-        + (y_array[index + 1] - y_array[index]) ** 2
-    )
-    dx = (x_array[index + 1] - x_array[index]) / length
-    dy = (y_array[index + 1] - y_array[index]) / length
-    return dx, dy, length
+
+    n_rows = max(length - len(coefficients) + 1, 0)
+    if weights is None:
+        weights = numpy.ones(n_rows)
+    diagonals = []
+    for k in range(len(coefficients)):
+        diagonal = numpy.zeros(max(length - k, 0))
+        for a in range(len(coefficients) - k):
+            diagonal[a : a + n_rows] += weights * coefficients[a] * coefficients[a + k]
+        diagonals.append(diagonal)
+    return diagonals
 
 
 def node_centred_reach_cross_section(
@@ -53,70 +66,84 @@ def node_centred_reach_cross_section(
         separately.
     """
 
-    cross_sections_dict = {
-        "geometry": [],
-        "nx": [],
-        "ny": [],
-        "length": [],
-        "mid_x": [],
-        "mid_y": [],
-    }
-
     assert len(sampled_channel) == 1, (
         "Expect only one polyline "
         f"geometry per channel. Instead got {len(sampled_channel)}"
     )
 
-    (x_array, y_array) = sampled_channel.iloc[0].geometry.xy
-    for i in range(len(x_array)):
-        # calculate slope along segment
-        if i == 0:
-            # first segment - slope of next segment
-            dx, dy, length = _segment_slope(x_array, y_array, i)
-        elif i == len(x_array) - 1:
-            # last segment - slope of previous segment
-            dx, dy, length = _segment_slope(x_array, y_array, i - 1)
-        else:
-            # slope of the length weighted mean of both segments
-            dx_prev, dy_prev, l_prev = _segment_slope(x_array, y_array, i)
-            dx_next, dy_next, l_next = _segment_slope(x_array, y_array, i - 1)
-            dx = (dx_prev * l_prev + dx_next * l_next) / (l_prev + l_next)
-            dy = (dy_prev * l_prev + dy_next * l_next) / (l_prev + l_next)
-            length = (l_prev + l_next) / 2
-        normal_x = -dy
-        normal_y = dx
-
-        # record normal to a segment nx and ny
-        cross_sections_dict["nx"].append(normal_x)
-        cross_sections_dict["ny"].append(normal_y)
-
-        # calculate transect - using effectively nx and ny
-        cross_sections_dict["geometry"].append(
-            shapely.geometry.LineString(
-                [
-                    [
-                        x_array[i] - transect_radius * normal_x,
-                        y_array[i] - transect_radius * normal_y,
-                    ],
-                    [x_array[i], y_array[i]],
-                    [
-                        x_array[i] + transect_radius * normal_x,
-                        y_array[i] + transect_radius * normal_y,
-                    ],
-                ]
-            )
-        )
-        cross_sections_dict["mid_x"].append(x_array[i])
-        cross_sections_dict["mid_y"].append(y_array[i])
-
-        # record the length of the line segment
-        cross_sections_dict["length"].append(length)
+    xy = shapely.get_coordinates(sampled_channel.iloc[0].geometry)
+    x_array, y_array = xy[:, 0], xy[:, 1]
+
+    # calculate slope along each segment
+    segment_dx = numpy.diff(x_array)
+    segment_dy = numpy.diff(y_array)
+    segment_length = numpy.sqrt(segment_dx**2 + segment_dy**2)
+    segment_dx = segment_dx / segment_length
+    segment_dy = segment_dy / segment_length
+
+    # first node - slope of next segment, last node - slope of previous segment,
+    # otherwise the slope of the length weighted mean of both segments
+    dx = numpy.concatenate([segment_dx[:1], segment_dx, segment_dx[-1:]])
+    dy = numpy.concatenate([segment_dy[:1], segment_dy, segment_dy[-1:]])
+    length = numpy.concatenate(
+        [segment_length[:1], segment_length, segment_length[-1:]]
+    )
+    l_prev = length[:-1]
+    l_next = length[1:]
+    dx = (dx[1:] * l_next + dx[:-1] * l_prev) / (l_prev + l_next)
+    dy = (dy[1:] * l_next + dy[:-1] * l_prev) / (l_prev + l_next)
+    length = (l_prev + l_next) / 2
+    normal_x = -dy
+    normal_y = dx
+
+    # calculate transects - using effectively nx and ny
+    offset = transect_radius * numpy.column_stack([normal_x, normal_y])
+    transects = numpy.stack([xy - offset, xy, xy + offset], axis=1)
+    cross_sections_dict = {
+        "geometry": shapely.linestrings(transects),
+        "nx": normal_x,
+        "ny": normal_y,
+        "length": length,
+        "mid_x": x_array,
+        "mid_y": y_array,
+    }
     cross_sections = geopandas.GeoDataFrame(
         cross_sections_dict, crs=sampled_channel.crs
     )
     return cross_sections
 
 
+def nearest_reach_values(
+    samples: geopandas.GeoDataFrame, reaches: geopandas.GeoDataFrame, columns: list
+) -> pandas.DataFrame:
+    """Return the column values of the nearest reach to each sample with a geometry
+    - taking the minimum of each value where reaches are equally near. Indexed by
+    the samples index.
+
+    Parameters
+    ----------
+
+    samples
+        The samples to match to a reach - i.e. the channel width samples.
+    reaches
+        The reaches to match to.
+    columns
+        The reach columns to return.
+    """
+
+    geometries = samples.geometry.to_numpy()
+    has_geometry = numpy.logical_not(
+        shapely.is_missing(geometries) | shapely.is_empty(geometries)
+    )
+    # All equally nearest reaches - taking the minimum of each value on ties
+    sample_indices, reach_indices = shapely.STRtree(
+        reaches.geometry.to_numpy()
+    ).query_nearest(geometries[has_geometry], all_matches=True)
+    nearest_values = reaches[columns].iloc[reach_indices].groupby(sample_indices).min()
+    nearest_values.index = samples.index[has_geometry][nearest_values.index]
+    return nearest_values
+
+
 class Channel:
     """A class to define a channel centre line from a digital network."""
 
@@ -156,6 +183,7 @@ class Channel:
         area_threshold: float,
         name_dict: dict,
         sampling_direction: int = -1,
+        cache_folder: pathlib.Path = None,
     ):
         """Create a channel object from a REC file.
 
@@ -176,10 +204,30 @@ class Channel:
         sampling_direction
             The direction to sample each reach polyline. 1 if each reach is defined
             downstream to upstream, -1 otherwise.
+        cache_folder
+            The folder to cache the network graph in - if None it isn't cached.
         """
 
-        # Load in network and remove unneeded columns
-        network = geopandas.read_file(network_file).to_crs(crs)
+        # Trace upstream through the network graph then only read those reaches
+        network_file = pathlib.Path(network_file)
+        graph = cls._load_network_graph(
+            network_file=network_file, name_dict=name_dict, cache_folder=cache_folder
+        )
+        reach_ids = cls._get_up_stream_reaches(
+            graph=graph,
+            starting_id=starting_id,
+            area_threshold=area_threshold,
+        )
+        bounds = graph["bounds"][cls._graph_positions(graph, reach_ids)]
+        if numpy.isnan(bounds).any():
+            # Reaches without geometry aren't read with a bbox - read them all
+            bbox = None
+        else:
+            bbox = (*bounds[:, :2].min(axis=0), *bounds[:, 2:].max(axis=0))
+        network = geopandas.read_file(
+            network_file, bbox=bbox, **geometry.READ_ENGINE_OPTIONS
+        )
+        network = network.set_index(name_dict["id"], drop=False).loc[reach_ids]
         # Drop any non-required columns
         network = network[
             [
@@ -191,34 +239,122 @@ class Channel:
                 name_dict["area"],
                 "geometry",
             ]
-        ]
+        ].reset_index(drop=True)
         network = network.rename(
             columns={value: key for key, value in name_dict.items()}
-        )
-        assert len(network["id"]) == len(network["id"].unique()), (
-            "The reach IDs much be unique in for the network to be valid, but there are"
-            "duplicates"
-        )
-        reaches = cls._get_up_stream_reaches(
-            network=network,
-            starting_id=starting_id,
-            area_threshold=area_threshold,
-        )
+        ).to_crs(crs)
         channel = cls(
-            channel=reaches,
+            channel=network,
             resolution=resolution,
             sampling_direction=sampling_direction,
         )
         return channel
 
+    @classmethod
+    def _load_network_graph(
+        cls, network_file: pathlib.Path, name_dict: dict, cache_folder: pathlib.Path
+    ) -> dict:
+        """Return the reach graph of a network - the id, to_node, from_node, area
+        and bounds (in the network CRS) of each reach. The graph is cached in the
+        cache_folder, and only rebuilt if the network file or its columns change.
+        Text columns are stored as fixed width strings so the cache is read without
+        pickle.
+
+        Parameters
+        ----------
+
+        network_file
+            The network file containing geometry and relational information
+            between upstream and downstream reaches.
+        name_dict
+            The column names of the network.
+        cache_folder
+            The folder to cache the graph in - if None it isn't cached.
+        """
+
+        logger = logging.getLogger(f"{__name__}.{cls.__name__}")
+        columns = numpy.array(
+            [name_dict[key] for key in ["id", "to_node", "from_node", "area"]]
+        )
+        stat = network_file.stat()
+        source = numpy.array([stat.st_size, stat.st_mtime_ns])
+        graph_file = None
+        if cache_folder is not None:
+            key = hashlib.sha1(str(network_file.resolve()).encode()).hexdigest()[:16]
+            graph_file = (
+                pathlib.Path(cache_folder) / f"{network_file.stem}_{key}.graph.npz"
+            )
+
+        graph = None
+        if graph_file is not None and graph_file.is_file():
+            try:
+                with numpy.load(graph_file, allow_pickle=False) as cached:
+                    if numpy.array_equal(
+                        cached["source"], source
+                    ) and numpy.array_equal(cached["columns"], columns):
+                        graph = dict(cached)
+            except (ValueError, OSError) as caught_exception:
+                logger.warning(
+                    f"Unable to read the cached reach graph {graph_file} as "
+                    f"{caught_exception}. Rebuilding it."
+                )
+        if graph is None:
+            logger.info(f"Building the reach graph of {network_file}")
+            network = geopandas.read_file(network_file, **geometry.READ_ENGINE_OPTIONS)
+            graph = {}
+            for key in ["id", "to_node", "from_node", "area"]:
+                values = network[name_dict[key]].to_numpy()
+                if values.dtype == object:
+                    # Fixed width strings - object arrays can only be pickled
+                    values = values.astype(str)
+                graph[key] = values
+            graph["bounds"] = network.bounds.to_numpy()
+            graph["source"] = source
+            graph["columns"] = columns
+            if graph_file is not None:
+                try:
+                    graph_file.parent.mkdir(parents=True, exist_ok=True)
+                    numpy.savez(graph_file, **graph)
+                except OSError as caught_exception:
+                    logger.warning(
+                        f"Unable to cache the reach graph at {graph_file} as "
+                        f"{caught_exception}. The graph will be rebuilt each time."
+                    )
+        assert len(graph["id"]) == len(numpy.unique(graph["id"])), (
+            "The reach IDs much be unique in for the network to be valid, but there are"
+            "duplicates"
+        )
+        # Sort for lookups by id and by to_node - stable to keep the network order
+        graph["id_order"] = numpy.argsort(graph["id"], kind="stable")
+        graph["to_node_order"] = numpy.argsort(graph["to_node"], kind="stable")
+        graph["sorted_to_node"] = graph["to_node"][graph["to_node_order"]]
+        return graph
+
+    @classmethod
+    def _graph_positions(cls, graph: dict, reach_ids: list) -> numpy.ndarray:
+        """Return the positions of reach IDs in the network graph.
+
+        Parameters
+        ----------
+
+        graph
+            The network graph.
+        reach_ids
+            The IDs of the reaches - all must be in the network.
+        """
+        sorted_ids = graph["id"][graph["id_order"]]
+        positions = numpy.searchsorted(sorted_ids, reach_ids)
+        return graph["id_order"][numpy.clip(positions, 0, len(sorted_ids) - 1)]
+
     @classmethod
     def _get_up_stream_reaches(
         cls,
-        network: geopandas.GeoDataFrame,
+        graph: dict,
         starting_id: int,
         area_threshold: float = None,
-    ):
+    ) -> list:
         """A function to trace the largest network branch upstream from a starting id.
+        Returns the reach IDs from the starting id upstream.
 
         There must only be one reference to each ID, and no circular relationships in
         the to_node and from_node's.'
@@ -226,42 +362,45 @@ class Channel:
         Parameters
         ----------
 
-        network
-            Contains geometry and relational information between upstream and downstream
-            reaches.
+        graph
+            The network graph - contains relational information between upstream and
+            downstream reaches.
         starting_id
             The ID of the reach to trace upstream from.
-        name_dict
-            The column names of the network.
         area_threshold
             The minimum upstream area for upstream reaches to be included.
         """
-        reaches_index = network[network["id"] == starting_id].index.tolist()
+        position = cls._graph_positions(graph, [starting_id])[0]
+        assert (
+            graph["id"][position] == starting_id
+        ), f"The starting ID {starting_id} is not in the network"
+        reach_ids = [starting_id]
+        visited = {starting_id}
 
         # While loop with several break statements and asserts to avoid run-away code
         while True:
-            upstream_reaches = network[
-                network["to_node"] == network.loc[reaches_index[-1]]["from_node"]
-            ][["area", "id"]]
-            if len(upstream_reaches) == 0:
+            from_node = graph["from_node"][position]
+            upstream = graph["to_node_order"][
+                numpy.searchsorted(graph["sorted_to_node"], from_node, side="left") : (
+                    numpy.searchsorted(graph["sorted_to_node"], from_node, side="right")
+                )
+            ]
+            if len(upstream) == 0:
                 # No more upstream reached
                 break
             # Select the reach with the largest upstream area
-            max_index = upstream_reaches["area"].idxmax()
-            if (
-                area_threshold is not None
-                and upstream_reaches.loc[max_index]["area"] < area_threshold
-            ):
+            position = upstream[numpy.nanargmax(graph["area"][upstream])]
+            if area_threshold is not None and graph["area"][position] < area_threshold:
                 # The minimum upstream area threshold has been reached
                 break
-            next_index = upstream_reaches.loc[max_index]["id"]
-            assert next_index not in numpy.array(reaches_index), (
+            next_id = graph["id"][position]
+            assert next_id not in visited, (
                 "The same reach ID is referenced twice indicating circular network "
                 "connections"
             )
-            reaches_index.append(network[network["id"] == next_index].index[0])
-        reaches = network.loc[reaches_index]
-        return reaches
+            reach_ids.append(next_id)
+            visited.add(next_id)
+        return reach_ids
 
     def get_parametric_spline_fit_points(self, k: int = 3, spacing: float = None):
         """Return the spline smoothed polyline points created from two splines defining
@@ -769,22 +908,25 @@ class InterpolateMeasuredElevations:
             .explode(index_parts=True)
         )
 
-        # Map measured section values then interpolated down/up river
-        nearest_cross_section_point_indices = measured_sections_exploded.apply(
-            lambda row: row.distance(
-                cross_sections["Sections"].explode(index_parts=True)
-            ).idxmin()
-        ).unique()
+        # Map measured section values then interpolated down/up river - the nearest
+        # cross section point to each measured point takes its nearest measured z
+        measured_xyz = shapely.get_coordinates(
+            measured_sections_exploded.to_numpy(), include_z=True
+        )
+        cross_sections_xy = shapely.get_coordinates(
+            cross_sections_exploded.geometry.to_numpy()
+        )
+        _, nearest_cross_section_points = scipy.spatial.cKDTree(
+            cross_sections_xy
+        ).query(measured_xyz[:, :2])
+        nearest_cross_section_points = numpy.unique(nearest_cross_section_points)
+        _, nearest_measured_points = scipy.spatial.cKDTree(measured_xyz[:, :2]).query(
+            cross_sections_xy[nearest_cross_section_points]
+        )
         cross_sections_exploded["z"] = numpy.nan
         cross_sections_exploded.loc[
-            nearest_cross_section_point_indices, "z"
-        ] = cross_sections_exploded.loc[
-            nearest_cross_section_point_indices, "Sections"
-        ].apply(
-            lambda point: measured_sections_exploded.loc[
-                point.distance(measured_sections_exploded).idxmin()
-            ].z
-        )
+            cross_sections_exploded.index[nearest_cross_section_points], "z"
+        ] = measured_xyz[nearest_measured_points, 2]
         cross_sections_exploded["z"] = (
             cross_sections_exploded["z"]
             .groupby(level=1, group_keys=False)
@@ -828,57 +970,24 @@ class InterpolateMeasuredElevations:
 
         intersection_points = cross_sections.intersection(self.thalweg.iloc[0].geometry)
 
-        # Calculate the normalised thalweg location at each measured section
-        def calculate_normalised_thalweg_location(thalweg_point, geometry):
-            """Tuple of the section index, and the point index along the section"""
-            left_bank_distance = thalweg_point.distance(
-                shapely.geometry.Point(geometry.coords[0])
-            )
-            right_bank_distance = thalweg_point.distance(
-                shapely.geometry.Point(geometry.coords[-1])
-            )
-            normalised_thalweg_location = left_bank_distance / (
-                left_bank_distance + right_bank_distance
-            )
-
-            return normalised_thalweg_location
-
-        cross_sections["Thalweg ratio"] = cross_sections.apply(
-            lambda row: calculate_normalised_thalweg_location(
-                intersection_points.loc[row.name],
-                row.geometry,
-            ),
-            axis=1,
+        # Calculate the normalised thalweg location along each cross section
+        left_bank_distance = shapely.distance(
+            intersection_points.to_numpy(),
+            shapely.get_point(cross_sections.geometry.to_numpy(), 0),
+        )
+        right_bank_distance = shapely.distance(
+            intersection_points.to_numpy(),
+            shapely.get_point(cross_sections.geometry.to_numpy(), -1),
+        )
+        cross_sections["Thalweg ratio"] = left_bank_distance / (
+            left_bank_distance + right_bank_distance
         )
 
         # Define equal sample locations on each side of the Thalweg
-        def split_line_to_nodes(line, thalweg_ratio, samples_per_section):
-            """Split line into n_nodes points half equally spaced on each side of the Thalweg"""
-            normalised_node_locations = numpy.concatenate(
-                [
-                    numpy.arange(samples_per_section)
-                    * thalweg_ratio
-                    / samples_per_section,
-                    numpy.arange(samples_per_section + 1)
-                    * (1 - thalweg_ratio)
-                    / samples_per_section
-                    + thalweg_ratio,
-                ]
-            )
-            return shapely.geometry.MultiPoint(
-                line.interpolate(normalised_node_locations, normalized=True)
-            )
-
-        # Apply the function for sampling along each cross section
-        cross_sections["Sections"] = cross_sections[
-            ["geometry", "Thalweg ratio"]
-        ].apply(
-            lambda row: split_line_to_nodes(
-                row["geometry"],
-                row["Thalweg ratio"],
-                samples_per_section=samples_per_section,
-            ),
-            axis=1,
+        cross_sections["Sections"] = self._split_lines_to_nodes(
+            lines=cross_sections.geometry.to_numpy(),
+            thalweg_ratios=cross_sections["Thalweg ratio"].to_numpy(),
+            samples_per_section=samples_per_section,
         )
 
     def thalweg_from_measured_centred_spacing(
@@ -896,78 +1005,88 @@ class InterpolateMeasuredElevations:
         number_samples
             The number of samples along each cross section."""
 
-        # Calculate the normalised thalweg location at each measured section
-        def calculate_normalised_thalweg_location(indices: tuple, sections_exploded):
-            """Tuple of the section index, and the point index along the section"""
-            thalweg_point = sections_exploded[indices]
-            left_bank_distance = thalweg_point.distance(
-                sections_exploded.loc[indices[0]][0]
-            )
-            right_bank_distance = thalweg_point.distance(
-                sections_exploded.loc[indices[0]][
-                    len(sections_exploded.loc[indices[0]]) - 1
-                ]
-            )
-            normalised_thalweg_location = left_bank_distance / (
-                left_bank_distance + right_bank_distance
-            )
-
-            return normalised_thalweg_location
-
+        # The thalweg is the lowest point of each measured section
         thalweg_indices = (
-            measured_sections_exploded.apply(lambda row: row.z)
+            pandas.Series(
+                shapely.get_z(measured_sections_exploded.to_numpy()),
+                index=measured_sections_exploded.index,
+            )
             .groupby(level=0)
             .idxmin()
         )
-        thalweg_points = measured_sections_exploded[thalweg_indices]
+        thalweg_points = measured_sections_exploded[thalweg_indices].to_numpy()
+
+        # Calculate the normalised thalweg location at each measured section
+        sections = measured_sections_exploded.groupby(level=0)
+        left_bank_distance = shapely.distance(
+            thalweg_points, sections.first()[thalweg_indices.index].to_numpy()
+        )
+        right_bank_distance = shapely.distance(
+            thalweg_points, sections.last()[thalweg_indices.index].to_numpy()
+        )
 
         # Linearly interpolate the normalised Thalewg location along the cross sections
+        thalweg_i, cross_section_i = shapely.STRtree(
+            cross_sections["Sections"].to_numpy()
+        ).query_nearest(thalweg_points, all_matches=True)
+        # The first of any equally near cross sections - one per thalweg point
+        nearest_cross_sections = (
+            pandas.Series(cross_section_i).groupby(thalweg_i).min().to_numpy()
+        )
         cross_sections["Thalweg ratio"] = numpy.nan
         cross_sections.loc[
-            thalweg_indices.apply(
-                lambda row: cross_sections["Sections"]
-                .distance(thalweg_points[row])
-                .idxmin()
-            ),
-            "Thalweg ratio",
-        ] = thalweg_indices.apply(
-            lambda row: calculate_normalised_thalweg_location(
-                row, measured_sections_exploded
-            )
-        ).array
-        cross_sections["Thalweg ratio"].interpolate(
-            limit_direction="both", inplace=True
+            cross_sections.index[nearest_cross_sections], "Thalweg ratio"
+        ] = left_bank_distance / (left_bank_distance + right_bank_distance)
+        cross_sections["Thalweg ratio"] = cross_sections["Thalweg ratio"].interpolate(
+            limit_direction="both"
         )
 
         # Define equal sample locations on each side of the Thalweg
-        def split_line_to_nodes(line, thalweg_ratio, samples_per_section):
-            """Split line into n_nodes points half equally spaced on each side of the Thalweg"""
-            normalised_node_locations = numpy.concatenate(
-                [
-                    numpy.arange(samples_per_section)
-                    * thalweg_ratio
-                    / samples_per_section,
-                    numpy.arange(samples_per_section + 1)
-                    * (1 - thalweg_ratio)
-                    / samples_per_section
-                    + thalweg_ratio,
-                ]
-            )
-            return shapely.geometry.MultiPoint(
-                line.interpolate(normalised_node_locations, normalized=True)
-            )
+        cross_sections["Sections"] = self._split_lines_to_nodes(
+            lines=cross_sections["Sections"].to_numpy(),
+            thalweg_ratios=cross_sections["Thalweg ratio"].to_numpy(),
+            samples_per_section=samples_per_section,
+        )
 
-        # Apply the function for sampling along each cross section
-        cross_sections["Sections"] = cross_sections[
-            ["Sections", "Thalweg ratio"]
-        ].apply(
-            lambda row: split_line_to_nodes(
-                row["Sections"],
-                row["Thalweg ratio"],
-                samples_per_section=samples_per_section,
-            ),
+    @staticmethod
+    def _split_lines_to_nodes(
+        lines: numpy.ndarray, thalweg_ratios: numpy.ndarray, samples_per_section: int
+    ) -> numpy.ndarray:
+        """Split each line into points - samples_per_section equally spaced on
+        each side of the Thalweg.
+
+        Parameters
+        ----------
+
+        lines
+            The cross section lines.
+        thalweg_ratios
+            The normalised location of the Thalweg along each line.
+        samples_per_section
+            The number of samples on each side of the Thalweg."""
+
+        thalweg_ratios = numpy.asarray(thalweg_ratios, dtype=float)[:, numpy.newaxis]
+        normalised_node_locations = numpy.concatenate(
+            [
+                numpy.arange(samples_per_section)
+                * thalweg_ratios
+                / samples_per_section,
+                numpy.arange(samples_per_section + 1)
+                * (1 - thalweg_ratios)
+                / samples_per_section
+                + thalweg_ratios,
+            ],
             axis=1,
         )
+        points = shapely.line_interpolate_point(
+            numpy.asarray(lines)[:, numpy.newaxis],
+            normalised_node_locations,
+            normalized=True,
+        )
+        return shapely.multipoints(
+            points.ravel(),
+            indices=numpy.repeat(numpy.arange(len(points)), points.shape[1]),
+        )
 
     def create_cross_sections_from_banks(self):
         # work out number of cross sections
@@ -1211,12 +1330,67 @@ class ChannelCharacteristics:
         cross_sections["valid_threhold"] = cross_sections["threshold"]
         cross_sections.loc[invalid_mask, "valid_threhold"] = numpy.nan
 
+    @staticmethod
+    def _sample_dem(
+        dem: xarray.Dataset,
+        xx: numpy.ndarray,
+        yy: numpy.ndarray,
+        interpolation: str = "nearest",
+    ) -> numpy.ndarray:
+        """Sample the DEM z values at the xx, yy locations by index arithmetic on the
+        regular grid. Locations outside the DEM take the nearest edge value.
+
+        Parameters
+        ----------
+
+        dem
+            The DEM to sample with x and y coordinates and a z layer.
+        xx, yy
+            The x and y locations to sample at - of any (but the same) shape.
+        interpolation
+            Either 'nearest' (the nearest pixel) or 'bilinear'.
+        """
+
+        z = numpy.asarray(dem.z.transpose("y", "x").data)
+        indices = []
+        for coordinates, locations in [(dem.y.data, yy), (dem.x.data, xx)]:
+            spacing = coordinates[1] - coordinates[0] if len(coordinates) > 1 else 1
+            indices.append(
+                numpy.clip(
+                    (locations - coordinates[0]) / spacing, 0, len(coordinates) - 1
+                )
+            )
+        index_y, index_x = indices
+        if interpolation == "nearest":
+            return z[numpy.rint(index_y).astype(int), numpy.rint(index_x).astype(int)]
+        elif interpolation == "bilinear":
+            y0 = numpy.minimum(numpy.floor(index_y).astype(int), max(len(z) - 2, 0))
+            x0 = numpy.minimum(numpy.floor(index_x).astype(int), max(z.shape[1] - 2, 0))
+            y1 = numpy.minimum(y0 + 1, len(z) - 1)
+            x1 = numpy.minimum(x0 + 1, z.shape[1] - 1)
+            wy = index_y - y0
+            wx = index_x - x0
+            return (
+                z[y0, x0] * (1 - wy) * (1 - wx)
+                + z[y0, x1] * (1 - wy) * wx
+                + z[y1, x0] * wy * (1 - wx)
+                + z[y1, x1] * wy * wx
+            )
+        else:
+            raise ValueError(
+                f"Unsupported interpolation {interpolation}. Only 'nearest' and "
+                "'bilinear' are supported."
+            )
+
     def sample_cross_sections(
-        self, cross_sections: geopandas.GeoDataFrame, min_z_search_radius: float
+        self,
+        cross_sections: geopandas.GeoDataFrame,
+        min_z_search_radius: float,
+        interpolation: str = "nearest",
     ):
         """Return the elevations along the cross_section sampled at the
-        sampling resolution. Also add the measured 'min_z_centre' values to
-        the cross_sections.
+        sampling resolution - as (number of cross sections, number of samples)
+        arrays. Also add the measured 'min_z_centre' values to the cross_sections.
 
         Parameters
         ----------
@@ -1225,7 +1399,8 @@ class ChannelCharacteristics:
             The cross_sections with geometry defined as polylines.
         min_z_search_radius
             The distance to search from the centre.
-
+        interpolation
+            How to sample the DEMs - either 'nearest' or 'bilinear'.
         """
 
         # The number of transect samples - ensure odd - defined from the first
@@ -1238,50 +1413,34 @@ class ChannelCharacteristics:
         min_z_start_i = self.calculate_min_z_start_i(min_z_search_radius)
         min_z_stop_i = self.calculate_min_z_stop_i(min_z_search_radius)
 
-        cross_section_elevations = {"gnd_elevations": [], "veg_elevations": []}
-        min_z_centre = []
-
-        # create tree of ground values to sample from
-        grid_x, grid_y = numpy.meshgrid(self.gnd_dem.x, self.gnd_dem.y)
-        xy_in = numpy.concatenate(
-            [[grid_x.flatten()], [grid_y.flatten()]], axis=0
-        ).transpose()
-        gnd_tree = scipy.spatial.KDTree(xy_in)
-
-        # create tree of vegetation values to sample from
-        grid_x, grid_y = numpy.meshgrid(self.veg_dem.x, self.veg_dem.y)
-        xy_in = numpy.concatenate(
-            [[grid_x.flatten()], [grid_y.flatten()]], axis=0
-        ).transpose()
-        veg_tree = scipy.spatial.KDTree(xy_in)
-
-        # cycle through each transect - calculate sample points then look up
-        for index, row in cross_sections.iterrows():
-            # Calculate xx, and yy points to sample at
-            xx = row["mid_x"] + sample_index_array * self.resolution * row["nx"]
-            yy = row["mid_y"] + sample_index_array * self.resolution * row["ny"]
-            xy_points = numpy.concatenate([[xx], [yy]], axis=0).transpose()
-
-            # Sample the vegetation elevations at along the transect
-            distances, indices = veg_tree.query(xy_points)
-            elevations = self.veg_dem.z.data.flatten()[indices]
-            cross_section_elevations["veg_elevations"].append(elevations)
-
-            # Sample the ground elevations at along the transect
-            distances, indices = gnd_tree.query(xy_points)
-            elevations = self.gnd_dem.z.data.flatten()[indices]
-            cross_section_elevations["gnd_elevations"].append(elevations)
-
-            # Find the min elevation along the middle of each cross section
-            if (
-                len(elevations[min_z_start_i:min_z_stop_i])
-                - numpy.sum(numpy.isnan(elevations[min_z_start_i:min_z_stop_i]))
-                > 0
-            ):
-                min_index = numpy.nanargmin(elevations[min_z_start_i:min_z_stop_i])
-                min_z_centre.append(elevations[min_z_start_i + min_index])
-            else:
-                min_z_centre.append(numpy.nan)
+        # Calculate xx, and yy points to sample at for all transects
+        offsets = sample_index_array[numpy.newaxis, :] * self.resolution
+        xx = (
+            cross_sections["mid_x"].to_numpy()[:, numpy.newaxis]
+            + offsets * cross_sections["nx"].to_numpy()[:, numpy.newaxis]
+        )
+        yy = (
+            cross_sections["mid_y"].to_numpy()[:, numpy.newaxis]
+            + offsets * cross_sections["ny"].to_numpy()[:, numpy.newaxis]
+        )
+
+        # Sample the vegetation and ground elevations along the transects
+        cross_section_elevations = {
+            "gnd_elevations": self._sample_dem(
+                self.gnd_dem, xx=xx, yy=yy, interpolation=interpolation
+            ),
+            "veg_elevations": self._sample_dem(
+                self.veg_dem, xx=xx, yy=yy, interpolation=interpolation
+            ),
+        }
+
+        # Find the min elevation along the middle of each cross section
+        centre_elevations = cross_section_elevations["gnd_elevations"][
+            :, min_z_start_i:min_z_stop_i
+        ]
+        has_values = numpy.logical_not(numpy.isnan(centre_elevations)).any(axis=1)
+        min_z_centre = numpy.full(len(cross_sections), numpy.nan)
+        min_z_centre[has_values] = numpy.nanmin(centre_elevations[has_values], axis=1)
         # Set min_z in the cross sections
         cross_sections["min_z_centre"] = min_z_centre
 
@@ -1319,41 +1478,24 @@ class ChannelCharacteristics:
         """
 
         search_radius_index = int(search_radius / self.resolution)
-        widths = {
-            "widths": [],
-            "first_bank_i": [],
-            "last_bank_i": [],
-            "channel_count": [],
-        }
-
-        for j in range(len(cross_section_elevations["gnd_elevations"])):
-            assert (
-                len(cross_section_elevations["gnd_elevations"][j])
-                == self.number_of_samples
-            ), "Expect fixed length"
-
-            gnd_samples = cross_section_elevations["gnd_elevations"][j]
-            veg_samples = cross_section_elevations["veg_elevations"][j]
-            start_index = self.centre_index
-            z_water = cross_sections.iloc[j]["min_z_centre_unimodal"]
-
-            start_i, stop_i, channel_count = self.fixed_threshold_width(
-                gnd_samples=gnd_samples,
-                veg_samples=veg_samples,
-                start_index=start_index,
-                z_water=z_water,
-                threshold=threshold,
-                search_radius_index=search_radius_index,
-                min_channel_width=min_channel_width,
-            )
+        veg_elevations = numpy.asarray(
+            cross_section_elevations["veg_elevations"], dtype=float
+        ).reshape(len(cross_sections), -1)
+        assert veg_elevations.shape[1] == self.number_of_samples, "Expect fixed length"
+
+        start_i, stop_i, channel_count = self.fixed_threshold_widths(
+            veg_elevations=veg_elevations,
+            z_water=cross_sections["min_z_centre_unimodal"].to_numpy(dtype=float),
+            threshold=threshold,
+            search_radius_index=search_radius_index,
+            min_channel_width=min_channel_width,
+        )
 
-            # assign the longest width
-            widths["first_bank_i"].append(start_i)
-            widths["last_bank_i"].append(stop_i)
-            widths["widths"].append((stop_i - start_i) * resolution)
-            widths["channel_count"].append(channel_count)
-        for key in widths.keys():
-            cross_sections[key] = widths[key]
+        # assign the longest width
+        cross_sections["widths"] = (stop_i - start_i) * resolution
+        cross_sections["first_bank_i"] = start_i
+        cross_sections["last_bank_i"] = stop_i
+        cross_sections["channel_count"] = channel_count
         # Record if the width is valid - only one possible channel that starts and ends
         # within the samples
         valid_mask = cross_sections["channel_count"] == 1
@@ -1396,152 +1538,45 @@ class ChannelCharacteristics:
         """
 
         search_radius_index = int(search_radius / self.resolution)
+        gnd_elevations = numpy.asarray(
+            cross_section_elevations["gnd_elevations"], dtype=float
+        ).reshape(len(cross_sections), -1)
+        veg_elevations = numpy.asarray(
+            cross_section_elevations["veg_elevations"], dtype=float
+        ).reshape(len(cross_sections), -1)
+        assert gnd_elevations.shape[1] == self.number_of_samples, "Expect fixed length"
+        z_water = cross_sections["min_z_centre_unimodal"].to_numpy(dtype=float)
+
+        # Get width based on fixed threshold
+        start_i, stop_i, channel_count = self.fixed_threshold_widths(
+            veg_elevations=veg_elevations,
+            z_water=z_water,
+            threshold=threshold,
+            search_radius_index=search_radius_index,
+            min_channel_width=min_channel_width,
+        )
+        cross_sections["flat_widths"] = (stop_i - start_i) * resolution
+        cross_sections["first_flat_bank_i"] = start_i
+        cross_sections["last_flat_bank_i"] = stop_i
+
+        # Iterate out from the fixed threshold width until the banks go
+        # down, or the max threshold is reached
+        start_i, stop_i, dz_bankfull = self.bankfull_widths(
+            gnd_elevations=gnd_elevations,
+            veg_elevations=veg_elevations,
+            z_water=z_water,
+            first_bank_i=start_i,
+            last_bank_i=stop_i,
+            threshold=threshold,
+            maximum_threshold=maximum_threshold,
+        )
 
-        widths = {
-            "widths": [],
-            "first_bank_i": [],
-            "last_bank_i": [],
-            "threshold": [],
-            "channel_count": [],
-            "flat_widths": [],
-            "first_flat_bank_i": [],
-            "last_flat_bank_i": [],
-        }
-
-        for j in range(len(cross_section_elevations["gnd_elevations"])):
-            self.logger.info(
-                f"Variable thresholding cross section {j} out of "
-                f"{len(cross_section_elevations['gnd_elevations'])}"
-            )
-            assert (
-                len(cross_section_elevations["gnd_elevations"][j])
-                == self.number_of_samples
-            ), "Expect fixed length"
-
-            gnd_samples = cross_section_elevations["gnd_elevations"][j]
-            veg_samples = cross_section_elevations["veg_elevations"][j]
-            start_index = self.centre_index
-            z_water = cross_sections.iloc[j]["min_z_centre_unimodal"]
-
-            # Get width based on fixed threshold
-            start_i, stop_i, channel_count = self.fixed_threshold_width(
-                gnd_samples=gnd_samples,
-                veg_samples=veg_samples,
-                start_index=start_index,
-                z_water=z_water,
-                threshold=threshold,
-                search_radius_index=search_radius_index,
-                min_channel_width=min_channel_width,
-            )
-
-            widths["first_flat_bank_i"].append(start_i)
-            widths["last_flat_bank_i"].append(stop_i)
-            widths["flat_widths"].append((stop_i - start_i) * resolution)
-
-            # Iterate out from the fixed threshold width until the banks go
-            # down, or the max threshold is reached
-            if (
-                numpy.isnan(start_i)
-                or numpy.isnan(stop_i)
-                or numpy.isnan([gnd_samples[start_i], veg_samples[start_i]]).all()
-                or numpy.isnan([gnd_samples[stop_i], veg_samples[stop_i]]).all()
-            ):
-                # No valid width or elevations to begin with
-                dz_bankfull = numpy.nan
-            else:
-                # Calculate the threshold elevation (z)
-                maximum_z = z_water + maximum_threshold
-                # The bankfull indices - updated if moving out each iteration
-                start_i_bf = start_i
-                stop_i_bf = stop_i
-                dwidth = 1  # Change in width this iteration
-                # Calculate the initial end elevations - checked above not NaN
-                prev_start_elevation = numpy.nanmin(
-                    [gnd_samples[start_i], veg_samples[start_i]]
-                )
-                prev_stop_elevation = numpy.nanmin(
-                    [gnd_samples[stop_i], veg_samples[stop_i]]
-                )
-
-                while (  # Stop when no move out or at end of section
-                    start_i_bf > 0
-                    and stop_i_bf < self.number_of_samples - 1
-                    and dwidth > 0
-                ):
-                    dwidth = 0
-                    # Get the current start elevation
-                    elevations = [
-                        gnd_samples[start_i_bf - 1],
-                        veg_samples[start_i_bf - 1],
-                    ]
-                    if numpy.isnan(elevations).all():
-                        start_elevation = numpy.nan
-                    else:
-                        start_elevation = numpy.nanmin(elevations)
-                    # Get the current end elevation
-                    elevations = [
-                        gnd_samples[stop_i_bf + 1],
-                        veg_samples[stop_i_bf + 1],
-                    ]
-                    if numpy.isnan(elevations).all():
-                        stop_elevation = numpy.nan
-                    else:
-                        stop_elevation = numpy.nanmin(elevations)
-
-                    # Move outwards if all Nan, or lowest is going up
-                    if numpy.isnan(start_elevation):
-                        # start is all NaN - move out
-                        start_i_bf -= 1
-                        dwidth += 1
-                    elif numpy.isnan(stop_elevation):
-                        # stop is all NaN - move out
-                        stop_i_bf += 1
-                        dwidth += 1
-                    elif (
-                        start_elevation <= stop_elevation
-                        and start_elevation > prev_start_elevation
-                        and start_elevation > z_water + threshold
-                    ):
-                        # Start is lowest and going up and above min threshold
-                        start_i_bf -= 1
-                        dwidth += 1
-                        # update prev elevation
-                        prev_start_elevation = start_elevation
-                    elif (
-                        stop_elevation <= start_elevation
-                        and stop_elevation > prev_stop_elevation
-                        and stop_elevation > z_water + threshold
-                    ):
-                        # stop is lowest and going up  and above min threshold
-                        stop_i_bf += 1
-                        dwidth += 1
-                        # update prev elevation
-                        prev_stop_elevation = stop_elevation
-                    # Break if threshold is reached
-                    if (
-                        not numpy.isnan([start_elevation, stop_elevation]).all()
-                        and numpy.nanmin([start_elevation, stop_elevation]).all()
-                        > maximum_z
-                    ):
-                        break
-
-                # Update with the final bankfull values
-                start_i = start_i_bf
-                stop_i = stop_i_bf
-                z_bankfull = min(
-                    max(prev_start_elevation, prev_stop_elevation), maximum_z
-                )
-                dz_bankfull = z_bankfull - z_water
-
-            # Add section info to the list for all sections
-            widths["first_bank_i"].append(start_i)
-            widths["last_bank_i"].append(stop_i)
-            widths["widths"].append((stop_i - start_i) * resolution)
-            widths["threshold"].append(dz_bankfull)
-            widths["channel_count"].append(channel_count)
         # Add threshold/width information as newcolumns to data frame
-        for key in widths.keys():
-            cross_sections[key] = widths[key]
+        cross_sections["widths"] = (stop_i - start_i) * resolution
+        cross_sections["first_bank_i"] = start_i
+        cross_sections["last_bank_i"] = stop_i
+        cross_sections["threshold"] = dz_bankfull
+        cross_sections["channel_count"] = channel_count
         # Check valid - one channel, start & end within section, non-NaN thres
         valid_mask = cross_sections["channel_count"] == 1
         valid_mask &= cross_sections["first_bank_i"] > 0
@@ -1550,258 +1585,219 @@ class ChannelCharacteristics:
         # valid_mask &= cross_sections["threshold"] < maximum_threshold
         cross_sections["valid"] = valid_mask
 
-    def fixed_threshold_width(
+    def fixed_threshold_widths(
         self,
-        gnd_samples: numpy.ndarray,
-        veg_samples: numpy.ndarray,
-        start_index: int,
-        z_water: float,
+        veg_elevations: numpy.ndarray,
+        z_water: numpy.ndarray,
         threshold: float,
         search_radius_index: int,
         min_channel_width: float,
     ):
-        """Calculate the maximum width for a cross section given a fixed
+        """Calculate the maximum width of each cross section given a fixed
         threshold - checking outwards, forwards and backwards within the
-        search radius.
+        search radius. All cross sections are searched at once, with each
+        channel found outwards from an in-channel sample by looking up the
+        nearest bank samples on either side.
 
         Parameters
         ----------
 
-        gnd_samples
-            The ground elevations for a single cross section.
-        veg_samples
-            The vegrtation elevations for the same cross section.
-        start_index
-            The index to start the outward search from.
+        veg_elevations
+            The vegetation elevations - one row of samples per cross section.
         z_water
-            The elevation of the water.
+            The elevation of the water for each cross section.
         threshold
             The height above the water level to detect as a bank.
         search_radius_index
             The distance in indices to search for the start of a channel away
-            from the start_index
+            from the centre index.
         min_channel_width
             The minimum width of a 'valid' channel.
+
+        Returns the first and last bank indices (NaN where no channel) and the
+        channel count of each cross section.
         """
 
-        start_i_list = []
-        stop_i_list = []
+        number_of_sections, number_of_samples = veg_elevations.shape
+        sections = numpy.arange(number_of_sections)
+        indices = numpy.arange(number_of_samples)
+        centre_index = number_of_samples // 2
+
+        # Banks are above the threshold, and the channel below it or NaN
+        with numpy.errstate(invalid="ignore"):
+            height = veg_elevations - numpy.asarray(z_water, dtype=float)[:, None]
+            bank = height > threshold
+            in_channel = (height < threshold) | numpy.isnan(veg_elevations)
+        # The nearest bank and in-channel index at or before/after each sample
+        previous_bank = numpy.maximum.accumulate(numpy.where(bank, indices, -1), axis=1)
+        next_bank = numpy.minimum.accumulate(
+            numpy.where(bank, indices, number_of_samples)[:, ::-1], axis=1
+        )[:, ::-1]
+        previous_in_channel = numpy.maximum.accumulate(
+            numpy.where(in_channel, indices, -1), axis=1
+        )
+        next_in_channel = numpy.minimum.accumulate(
+            numpy.where(in_channel, indices, number_of_samples)[:, ::-1], axis=1
+        )[:, ::-1]
+
+        def outwards(index: numpy.ndarray):
+            """The channel around in-channel samples - the full cross section if
+            a bank isn't found on both sides."""
+            start_i = previous_bank[sections, index]
+            stop_i = next_bank[sections, index]
+            both = (start_i >= 0) & (stop_i < number_of_samples)
+            return numpy.where(both, start_i, 0), numpy.where(
+                both, stop_i, number_of_samples - 1
+            )
 
-        forwards_index = start_index
-        backwards_index = start_index
+        # Keep the longest width - taking the first if equal
+        first_bank_i = numpy.full(number_of_sections, numpy.nan)
+        last_bank_i = numpy.full(number_of_sections, numpy.nan)
+        longest_width = numpy.zeros(number_of_sections, dtype=int)
+        channel_count = numpy.zeros(number_of_sections, dtype=int)
+
+        def record(found: numpy.ndarray, start_i: numpy.ndarray, stop_i: numpy.ndarray):
+            channel_width = stop_i - start_i
+            longer = found & (channel_width > longest_width)
+            first_bank_i[longer] = start_i[longer]
+            last_bank_i[longer] = stop_i[longer]
+            longest_width[longer] = channel_width[longer]
+            channel_count[found & (channel_width >= min_channel_width)] += 1
 
         # check outwards
-        start_i, stop_i = self.fixed_threshold_width_outwards(
-            gnd_samples=gnd_samples,
-            veg_samples=veg_samples,
-            start_index=start_index,
-            z_water=z_water,
-            threshold=threshold,
-        )
-        if not numpy.isnan(start_i) and not numpy.isnan(stop_i):
-            start_i_list.append(start_i)
-            stop_i_list.append(stop_i)
-            forwards_index = stop_i + 1
-            backwards_index = start_i - 1
+        found = in_channel[:, centre_index]
+        start_i, stop_i = outwards(numpy.full(number_of_sections, centre_index))
+        record(found, start_i, stop_i)
+        forwards_index = numpy.where(found, stop_i + 1, centre_index)
+        backwards_index = numpy.where(found, start_i - 1, centre_index)
         # check forwards
-        while forwards_index - start_index < search_radius_index:
-            start_i, stop_i = self.fixed_threshold_width_forwards(
-                gnd_samples=gnd_samples,
-                veg_samples=veg_samples,
-                start_index=forwards_index,
-                z_water=z_water,
-                threshold=threshold,
-                stop_index=start_index + search_radius_index,
-            )
-            if not numpy.isnan(start_i) and not numpy.isnan(stop_i):
-                start_i_list.append(start_i)
-                stop_i_list.append(stop_i)
-                forwards_index = stop_i + 1
-            else:
-                break
+        stop_index = min(centre_index + search_radius_index, number_of_samples - 1)
+        searching = forwards_index - centre_index < search_radius_index
+        while searching.any():
+            index = next_in_channel[
+                sections, numpy.clip(forwards_index, 0, number_of_samples - 1)
+            ]
+            found = searching & (forwards_index <= stop_index) & (index <= stop_index)
+            start_i, stop_i = outwards(numpy.clip(index, 0, number_of_samples - 1))
+            record(found, start_i, stop_i)
+            forwards_index = numpy.where(found, stop_i + 1, forwards_index)
+            searching = found & (forwards_index - centre_index < search_radius_index)
         # check backwards
-        while start_index - backwards_index < search_radius_index:
-            start_i, stop_i = self.fixed_threshold_width_backwards(
-                gnd_samples=gnd_samples,
-                veg_samples=veg_samples,
-                start_index=backwards_index,
-                z_water=z_water,
-                threshold=threshold,
-                stop_index=start_index - search_radius_index,
-            )
-            if not numpy.isnan(start_i) and not numpy.isnan(stop_i):
-                start_i_list.append(start_i)
-                stop_i_list.append(stop_i)
-                backwards_index = start_i - 1
-            else:
-                break
-        # cycle through getting the longest width
-        start_i = numpy.nan
-        stop_i = numpy.nan
-        longest_width = 0
-        channel_count = 0
-        for i in range(len(start_i_list)):
-            channel_width = stop_i_list[i] - start_i_list[i]
-            if channel_width > longest_width:
-                longest_width = stop_i_list[i] - start_i_list[i]
-                start_i = start_i_list[i]
-                stop_i = stop_i_list[i]
-            if channel_width >= min_channel_width:
-                channel_count += 1
-        return start_i, stop_i, channel_count
-
-    def fixed_threshold_width_outwards(
+        stop_index = max(centre_index - search_radius_index, 0)
+        searching = centre_index - backwards_index < search_radius_index
+        while searching.any():
+            index = previous_in_channel[
+                sections, numpy.clip(backwards_index, 0, number_of_samples - 1)
+            ]
+            found = searching & (backwards_index >= stop_index) & (index >= stop_index)
+            start_i, stop_i = outwards(numpy.clip(index, 0, number_of_samples - 1))
+            record(found, start_i, stop_i)
+            backwards_index = numpy.where(found, start_i - 1, backwards_index)
+            searching = found & (centre_index - backwards_index < search_radius_index)
+        return first_bank_i, last_bank_i, channel_count
+
+    def bankfull_widths(
         self,
-        gnd_samples: numpy.ndarray,
-        veg_samples: numpy.ndarray,
-        start_index: int,
-        z_water: float,
+        gnd_elevations: numpy.ndarray,
+        veg_elevations: numpy.ndarray,
+        z_water: numpy.ndarray,
+        first_bank_i: numpy.ndarray,
+        last_bank_i: numpy.ndarray,
         threshold: float,
+        maximum_threshold: float,
     ):
-        """If the start_index is nan or less than the threshold, then cycle
-        outwards until each side has gone above the threshold.
+        """Move the banks of each cross section outwards from the fixed threshold
+        banks until the banks go down, or the maximum threshold is reached. All
+        cross sections are stepped out together until none are still moving.
 
         Parameters
         ----------
 
-        gnd_samples
-            The ground elevations for a single cross section.
-        veg_samples
-            The vegrtation elevations for the same cross section.
-        start_index
-            The index to start the outward search from.
+        gnd_elevations
+            The ground elevations - one row of samples per cross section.
+        veg_elevations
+            The vegetation elevations for the same cross sections.
         z_water
-            The elevation of the water.
+            The elevation of the water for each cross section.
+        first_bank_i
+            The fixed threshold first bank index of each cross section.
+        last_bank_i
+            The fixed threshold last bank index of each cross section.
         threshold
             The height above the water level to detect as a bank.
+        maximum_threshold
+            The maximum amount to increase the bank height before stopping.
 
+        Returns the bankfull first and last bank indices and the bankfull height
+        above the water (NaN where there is no valid width or elevations).
         """
 
-        start_i = numpy.nan
-        stop_i = numpy.nan
-
-        if veg_samples[start_index] - z_water < threshold or (
-            numpy.isnan(veg_samples[start_index])
-        ):
-            for i in numpy.arange(0, self.number_of_samples + 1, 1):
-                # work forward checking height
-                if start_index + i < self.number_of_samples and numpy.isnan(stop_i):
-                    gnd_elevation_over_minimum = veg_samples[start_index + i] - z_water
-
-                    # Detect banks - either ground above threshold, or no ground with
-                    # vegetation over threshold
-                    if gnd_elevation_over_minimum > threshold:
-                        # Leaving the channel
-                        stop_i = start_index + i
-                # work backward checking height
-                if start_index - i >= 0 and numpy.isnan(start_i):
-                    gnd_elevation_over_minimum = veg_samples[start_index - i] - z_water
-
-                    # Detect bank
-                    if gnd_elevation_over_minimum > threshold:
-                        # Leaving the channel
-                        start_i = start_index - i
-                # break if both edges detected
-                if not numpy.isnan(start_i) and not numpy.isnan(stop_i):
-                    break
-                # break if both ends of the sampled cross section reached
-                if (  # Set to max range
-                    start_index + i >= self.number_of_samples - 1
-                    and start_index - i <= 0
-                ):
-                    start_i = 0
-                    stop_i = self.number_of_samples - 1
-                    break
-        return start_i, stop_i
-
-    def fixed_threshold_width_forwards(
-        self,
-        gnd_samples: numpy.ndarray,
-        veg_samples: numpy.ndarray,
-        start_index: int,
-        z_water: float,
-        threshold: float,
-        stop_index: int,
-    ):
-        """Check for channels approaching forward.
-
-        Parameters
-        ----------
-
-        gnd_samples
-            The ground elevations for a single cross section.
-        veg_samples
-            The vegrtation elevations for the same cross section.
-        start_index
-            The index to start the outward search from.
-        z_water
-            The elevation of the water.
-        threshold
-            The height above the water level to detect as a bank.
-        stop_index
-            The maximum index to search through
-        """
-
-        for i in numpy.arange(start_index, stop_index + 1, 1):
-            # check if in channel
-            start_i, stop_i = self.fixed_threshold_width_outwards(
-                gnd_samples=gnd_samples,
-                veg_samples=veg_samples,
-                start_index=i,
-                z_water=z_water,
-                threshold=threshold,
+        number_of_sections, number_of_samples = gnd_elevations.shape
+        sections = numpy.arange(number_of_sections)
+        z_water = numpy.asarray(z_water, dtype=float)
+        elevations = numpy.fmin(gnd_elevations, veg_elevations)
+
+        # Only cross sections with a valid width and elevations at its ends
+        valid = numpy.logical_not(numpy.isnan(first_bank_i) | numpy.isnan(last_bank_i))
+        start_i = numpy.where(valid, first_bank_i, 0).astype(int)
+        stop_i = numpy.where(valid, last_bank_i, 0).astype(int)
+        prev_start_elevation = elevations[sections, start_i]
+        prev_stop_elevation = elevations[sections, stop_i]
+        valid &= numpy.logical_not(
+            numpy.isnan(prev_start_elevation) | numpy.isnan(prev_stop_elevation)
+        )
+        maximum_z = z_water + maximum_threshold
+        minimum_z = z_water + threshold
+
+        # Stop when no move out or at end of section
+        moving = valid & (start_i > 0) & (stop_i < number_of_samples - 1)
+        while moving.any():
+            start_elevation = elevations[sections, numpy.maximum(start_i - 1, 0)]
+            stop_elevation = elevations[
+                sections, numpy.minimum(stop_i + 1, number_of_samples - 1)
+            ]
+            start_nan = numpy.isnan(start_elevation)
+            stop_nan = numpy.isnan(stop_elevation)
+            # Move outwards if all NaN, or lowest is going up and above min threshold
+            with numpy.errstate(invalid="ignore"):
+                start_up = (
+                    (start_elevation <= stop_elevation)
+                    & (start_elevation > prev_start_elevation)
+                    & (start_elevation > minimum_z)
+                )
+                stop_up = (
+                    (stop_elevation <= start_elevation)
+                    & (stop_elevation > prev_stop_elevation)
+                    & (stop_elevation > minimum_z)
+                )
+            move_start = moving & (start_nan | (~stop_nan & start_up))
+            move_stop = moving & ~start_nan & (stop_nan | (~start_up & stop_up))
+            prev_start_elevation = numpy.where(
+                move_start & ~start_nan, start_elevation, prev_start_elevation
             )
-
-            # break if both edges detected
-            if not numpy.isnan(start_i) and not numpy.isnan(stop_i):
-                break
-        return start_i, stop_i
-
-    def fixed_threshold_width_backwards(
-        self,
-        gnd_samples: numpy.ndarray,
-        veg_samples: numpy.ndarray,
-        start_index: int,
-        z_water: float,
-        threshold: float,
-        stop_index: int,
-    ):
-        """Check for channels approaching backwards.
-
-        Parameters
-        ----------
-
-        gnd_samples
-            The ground elevations for a single cross section.
-        veg_samples
-            The vegrtation elevations for the same cross section.
-        start_index
-            The index to start the outward search from.
-        z_water
-            The elevation of the water.
-        threshold
-            The height above the water level to detect as a bank.
-        stop_index
-            The minimum index to search through
-        """
-
-        start_i = numpy.nan
-        stop_i = numpy.nan
-
-        for i in numpy.arange(start_index, stop_index - 1, -1):
-            # Check if in channel
-            start_i, stop_i = self.fixed_threshold_width_outwards(
-                gnd_samples=gnd_samples,
-                veg_samples=veg_samples,
-                start_index=i,
-                z_water=z_water,
-                threshold=threshold,
+            prev_stop_elevation = numpy.where(
+                move_stop & ~stop_nan, stop_elevation, prev_stop_elevation
             )
-
-            # break if both edges detected
-            if not numpy.isnan(start_i) and not numpy.isnan(stop_i):
-                break
-        return start_i, stop_i
+            start_i -= move_start
+            stop_i += move_stop
+            # Stop if threshold is reached
+            reached = ~(start_nan & stop_nan) & (
+                numpy.fmin(start_elevation, stop_elevation) > maximum_z
+            )
+            moving &= (move_start | move_stop) & ~reached
+            moving &= (start_i > 0) & (stop_i < number_of_samples - 1)
+
+        # Update with the final bankfull values
+        z_bankfull = numpy.where(
+            prev_stop_elevation > prev_start_elevation,
+            prev_stop_elevation,
+            prev_start_elevation,
+        )
+        z_bankfull = numpy.where(maximum_z < z_bankfull, maximum_z, z_bankfull)
+        dz_bankfull = numpy.where(valid, z_bankfull - z_water, numpy.nan)
+        first_bank_i = numpy.where(valid, start_i, first_bank_i)
+        last_bank_i = numpy.where(valid, stop_i, last_bank_i)
+        return first_bank_i, last_bank_i, dz_bankfull
 
     def _plot_results(
         self,
@@ -2037,24 +2033,33 @@ class ChannelCharacteristics:
 
         x = numpy.arange(len(y))
 
-        # Prepare bases (Imat) and penalty
+        # Prepare bases (Imat) and penalty - stored as the upper diagonals of the
+        # symmetric banded system E + la * D3.T @ D3 + D1.T @ Ws @ D1
         dd = 3
         la = 100
         kp = 10000000
-        E = numpy.eye(len(x))
-        D3 = numpy.diff(E, n=dd, axis=0)
-        D1 = numpy.diff(E, n=1, axis=0)
+        D3_penalty = _banded_difference_penalty(
+            coefficients=[-1, 3, -3, 1], length=len(x)
+        )
 
         # Monotone smoothing
         ws = numpy.zeros(len(x) - 1)
         # Iterative process to improve the monotonic fit
         max_iterations = 30
         for it in range(max_iterations):
-            Ws = numpy.diag(ws * kp)
+            D1_penalty = _banded_difference_penalty(
+                coefficients=[-1, 1], length=len(x), weights=ws * kp
+            )
+            banded = numpy.zeros((dd + 1, len(x)))
+            banded[dd] = 1  # E
+            for k in range(dd + 1):
+                banded[dd - k, k:] += la * D3_penalty[k]
+            for k in range(2):
+                banded[dd - k, k:] += D1_penalty[k]
 
             # Polynomial fit, monotonically constrained
-            mon_cof = numpy.linalg.solve(E + la * D3.T @ D3 + D1.T @ Ws @ D1, y)
-            ws_new = (D1 @ mon_cof < 0.0) * 1
+            mon_cof = scipy.linalg.solveh_banded(banded, y, check_finite=False)
+            ws_new = (numpy.diff(mon_cof) < 0.0) * 1
 
             # Break criteria for the monotonic fit - break if no change
             if numpy.sum(ws != ws_new) == 0:
@@ -2062,80 +2067,78 @@ class ChannelCharacteristics:
             ws = ws_new
         return mon_cof
 
-    def _apply_bank_width(
+    def _bank_xy(
+        self, cross_sections: geopandas.GeoDataFrame, bank_i: numpy.ndarray
+    ) -> numpy.ndarray:
+        """Return the x, y location of an index along each transect.
+
+        Parameters
+        ----------
+
+        cross_sections
+            The cross_sections with the transect centre (mid_x, mid_y) and normal
+            (nx, ny) of each.
+        bank_i
+            The index along each transect - e.g. of the first bank.
+        """
+        offset = self.resolution * (
+            numpy.asarray(bank_i, dtype=float) - self.centre_index
+        )
+        mid_xy = cross_sections[["mid_x", "mid_y"]].to_numpy()
+        normal_xy = cross_sections[["nx", "ny"]].to_numpy()
+        return mid_xy + offset[:, numpy.newaxis] * normal_xy
+
+    def _bank_width_lines(
         self,
-        mid_x: float,
-        mid_y: float,
-        nx: float,
-        ny: float,
-        first_bank_i: int,
-        last_bank_i: int,
-    ):
+        cross_sections: geopandas.GeoDataFrame,
+        first_bank_column: str,
+        last_bank_column: str,
+    ) -> numpy.ndarray:
         """Generate a line for each width for visualisation.
 
         Parameters
         ----------
 
-        mid_x
-            The x centre of the transect.
-        mid_x
-            The y centre of the transect.
-        nx
-            Transect normal x-component.
-        ny
-            Transect normal y-component.
-        first_bank_i
-            The index of the first bank along the transect.
-        last_bank_i
-            The index of the last bank along the transect.
+        cross_sections
+            The cross_sections with the transect centre, normal and bank indices.
+        first_bank_column
+            The column of the index of the first bank along each transect.
+        last_bank_column
+            The column of the index of the last bank along each transect.
         """
-        return shapely.geometry.LineString(
-            [
-                [
-                    mid_x + (first_bank_i - self.centre_index) * nx * self.resolution,
-                    mid_y + (first_bank_i - self.centre_index) * ny * self.resolution,
-                ],
+        return shapely.linestrings(
+            numpy.stack(
                 [
-                    mid_x + (last_bank_i - self.centre_index) * nx * self.resolution,
-                    mid_y + (last_bank_i - self.centre_index) * ny * self.resolution,
+                    self._bank_xy(cross_sections, cross_sections[first_bank_column]),
+                    self._bank_xy(cross_sections, cross_sections[last_bank_column]),
                 ],
-            ]
+                axis=1,
+            )
         )
 
-    def _apply_midpoint(
+    def _bank_midpoints(
         self,
-        mid_x: float,
-        mid_y: float,
-        nx: float,
-        ny: float,
-        first_bank_i: int,
-        last_bank_i: int,
-    ):
-        """Generate a line for each width for visualisation.
+        cross_sections: geopandas.GeoDataFrame,
+        first_bank_column: str,
+        last_bank_column: str,
+    ) -> numpy.ndarray:
+        """Generate a point midway between the banks of each width for
+        visualisation.
 
         Parameters
         ----------
 
-        mid_x
-            The x centre of the transect.
-        mid_x
-            The y centre of the transect.
-        nx
-            Transect normal x-component.
-        ny
-            Transect normal y-component.
-        first_bank_i
-            The index of the first bank along the transect.
-        last_bank_i
-            The index of the last bank along the transect.
+        cross_sections
+            The cross_sections with the transect centre, normal and bank indices.
+        first_bank_column
+            The column of the index of the first bank along each transect.
+        last_bank_column
+            The column of the index of the last bank along each transect.
         """
-        mid_i = (first_bank_i + last_bank_i) / 2
-        return shapely.geometry.Point(
-            [
-                mid_x + (mid_i - self.centre_index) * nx * self.resolution,
-                mid_y + (mid_i - self.centre_index) * ny * self.resolution,
-            ]
-        )
+        mid_i = (
+            cross_sections[first_bank_column] + cross_sections[last_bank_column]
+        ) / 2
+        return shapely.points(self._bank_xy(cross_sections, mid_i))
 
     def align_channel(
         self,
@@ -2214,16 +2217,8 @@ class ChannelCharacteristics:
         # Optoinal outputs
         if self.debug:
             # Add width linestring to the cross_sections
-            cross_sections["width_line"] = cross_sections.apply(
-                lambda x: self._apply_bank_width(
-                    x["mid_x"],
-                    x["mid_y"],
-                    x["nx"],
-                    x["ny"],
-                    x["first_bank_i"],
-                    x["last_bank_i"],
-                ),
-                axis=1,
+            cross_sections["width_line"] = self._bank_width_lines(
+                cross_sections, "first_bank_i", "last_bank_i"
             )
             # Plot results
             self._plot_results(
@@ -2304,11 +2299,9 @@ class ChannelCharacteristics:
 
         # Midpoints of the river polygon - buffer slightly to ensure intersection at the
         # start and end
-        cross_sections["river_polygon_midpoint"] = cross_sections.apply(
-            lambda row: row.geometry.intersection(
-                river_polygon.buffer(self.resolution / 10).iloc[0]
-            ).centroid,
-            axis=1,
+        buffered_polygon = river_polygon.buffer(self.resolution / 10).iloc[0]
+        cross_sections["river_polygon_midpoint"] = shapely.centroid(
+            shapely.intersection(cross_sections.geometry.to_numpy(), buffered_polygon)
         )
 
         # Width and threshod smoothing - rolling mean
@@ -2317,29 +2310,13 @@ class ChannelCharacteristics:
         # Optional outputs
         if self.debug:
             # A line defining the extents of the bankfull width at that cross section
-            cross_sections["width_line"] = cross_sections.apply(
-                lambda row: self._apply_bank_width(
-                    row["mid_x"],
-                    row["mid_y"],
-                    row["nx"],
-                    row["ny"],
-                    row["first_bank_i"],
-                    row["last_bank_i"],
-                ),
-                axis=1,
+            cross_sections["width_line"] = self._bank_width_lines(
+                cross_sections, "first_bank_i", "last_bank_i"
             )
 
             # The 'flat water' midpoint
-            cross_sections["flat_midpoint"] = cross_sections.apply(
-                lambda row: self._apply_midpoint(
-                    row["mid_x"],
-                    row["mid_y"],
-                    row["nx"],
-                    row["ny"],
-                    row["first_flat_bank_i"],
-                    row["last_flat_bank_i"],
-                ),
-                axis=1,
+            cross_sections["flat_midpoint"] = self._bank_midpoints(
+                cross_sections, "first_flat_bank_i", "last_flat_bank_i"
             )
             # Plot results
             self._plot_results(
@@ -0,0 +1,485 @@
+# -*- coding: utf-8 -*-
+"""
+A benchmarking harness for running GeoFabrics instruction files across a grid of
+processing parameters (i.e. 'chunk_size' and 'number_of_cores') and recording the
+performance of each processor. Results are saved as JSON and CSV and can be compared
+against a saved baseline to catch performance regressions between releases.
+"""
+from . import runner
+from . import dem
+import argparse
+import itertools
+import json
+import logging
+import os
+import pathlib
+import sys
+import pandas
+
+
+# Top level keys of an instruction file that are run by the runner
+STAGE_KEYS = [
+    "measured",
+    "rivers",
+    "waterways",
+    "stopbanks",
+    "dem",
+    "roughness",
+    "patch",
+    "default",
+]
+# Top level keys of a single processor instruction file (i.e. those used by the
+# tests) - these are under a stage key in a runner instruction file
+PROCESSOR_KEYS = [
+    "output",
+    "data_paths",
+    "datasets",
+    "dataset_mapping",
+    "processing",
+    "general",
+]
+# Processors that rasterise LiDAR points
+LIDAR_PROCESSORS = ["RawLidarDemGenerator", "RoughnessLengthGenerator"]
+# Data paths that are inputs rather than outputs of an earlier stage. The inputs of
+# the bundled tests are created in their setUpClass rather than being committed
+INPUT_PATH_KEYS = [
+    "extents",
+    "land",
+    "lidar_files",
+    "coarse_dems",
+    "ocean_contours",
+    "raw_dem_extents",
+    "patches",
+    "measured_sections",
+    "riverbanks",
+    "thalweg",
+    "stopbanks",
+]
+
+
+def parse_args():
+    """Expect command line arguments of the form:
+    '--instructions path/to/json/instruction/file [...]' and or
+    '--tests path/to/tests/folder'"""
+
+    parser = argparse.ArgumentParser(
+        description="Benchmark GeoFabrics instruction files over a parameter grid."
+    )
+
+    parser.add_argument(
+        "--instructions",
+        metavar="path",
+        nargs="+",
+        default=[],
+        action="store",
+        help="the instruction files to benchmark",
+    )
+    parser.add_argument(
+        "--tests",
+        metavar="path",
+        action="store",
+        help="a tests folder - all '*/instruction.json' files within are benchmarked. "
+        "Tests whose input files haven't been created (i.e. by running the test) are "
+        "skipped",
+    )
+    parser.add_argument(
+        "--grid",
+        metavar="json",
+        default="{}",
+        action="store",
+        help="the parameter grid - either a path or JSON string - mapping processing "
+        'keys to a list of values. e.g. \'{"chunk_size": [100, 200], '
+        '"execution_mode": ["processes", "hybrid"]}\'',
+    )
+    parser.add_argument(
+        "--repeats",
+        type=int,
+        default=1,
+        action="store",
+        help="the number of times to run each combination",
+    )
+    parser.add_argument(
+        "--output",
+        metavar="path",
+        default="geofabrics_benchmark",
+        action="store",
+        help="the path to save the results to - .json and .csv are appended",
+    )
+    parser.add_argument(
+        "--baseline",
+        metavar="path",
+        action="store",
+        help="a JSON results file from an earlier benchmark to compare against",
+    )
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=0.1,
+        action="store",
+        help="the fractional increase in wall time to report as a regression",
+    )
+    parser.add_argument(
+        "--keep_outputs",
+        action="store_true",
+        help="keep the outputs of the last benchmark run rather than removing them. "
+        "Outputs of earlier runs are always removed so they are not reused",
+    )
+    parser.add_argument(
+        "--fail_on_regression",
+        action="store_true",
+        help="exit with a non-zero code if any regressions are found",
+    )
+
+    return parser.parse_args()
+
+
+def load_instructions(instructions_path: pathlib.Path) -> dict:
+    """Load an instruction file. Single processor instruction files (i.e. those
+    used by the tests) have processor keys like 'data_paths' at the top level and
+    are run as the stage whose settings they contain (i.e. 'rivers', 'waterways',
+    'measured', 'stopbanks' or 'patch'), or otherwise as the 'dem' stage."""
+
+    with open(instructions_path, "r") as file_pointer:
+        instructions = json.load(file_pointer)
+    if not any(key in STAGE_KEYS for key in instructions):
+        return {"dem": instructions}
+    if any(key in PROCESSOR_KEYS for key in instructions):
+        stages = [
+            key
+            for key in STAGE_KEYS
+            if key in instructions and key not in ["dem", "default"]
+        ]
+        if len(stages) > 1:
+            raise ValueError(
+                f"The single processor instruction file {instructions_path} "
+                f"contains the settings of several stages: {stages}."
+            )
+        instructions = {stages[0] if len(stages) == 1 else "dem": instructions}
+    return instructions
+
+
+def load_grid(grid: str) -> list:
+    """Return a list of each combination of parameters in the grid. The grid is
+    either a path to a JSON file or a JSON string."""
+
+    if pathlib.Path(grid).is_file():
+        with open(grid, "r") as file_pointer:
+            grid = json.load(file_pointer)
+    else:
+        grid = json.loads(grid)
+    keys = list(grid.keys())
+    return [
+        dict(zip(keys, values))
+        for values in itertools.product(*[grid[key] for key in keys])
+    ]
+
+
+def apply_parameters(instructions: dict, parameters: dict) -> dict:
+    """Set the processing parameters of each stage."""
+
+    for key, stage in instructions.items():
+        if key in STAGE_KEYS and len(parameters) > 0:
+            stage.setdefault("processing", {}).update(parameters)
+    return instructions
+
+
+def results_folders(instructions: dict) -> list:
+    """Return the unique results folders of the stages."""
+
+    folders = []
+    for key, stage in instructions.items():
+        if key not in STAGE_KEYS:
+            continue
+        data_paths = stage.get("data_paths", {})
+        if "default" in instructions:
+            data_paths = {**instructions["default"].get("data_paths", {}), **data_paths}
+        if "local_cache" in data_paths:
+            folder = pathlib.Path(data_paths["local_cache"]) / data_paths.get(
+                "subfolder", "results"
+            )
+            if folder not in folders:
+                folders.append(folder)
+    return folders
+
+
+def missing_inputs(instructions: dict) -> list:
+    """Return the input files of the stages that don't exist. Only paths given as
+    a string or list of strings are checked, as those given as dictionaries (i.e.
+    'rivers' and 'waterways') are the outputs of earlier stages."""
+
+    missing = []
+    for key, stage in instructions.items():
+        if key not in STAGE_KEYS:
+            continue
+        data_paths = stage.get("data_paths", {})
+        if "default" in instructions:
+            data_paths = {**instructions["default"].get("data_paths", {}), **data_paths}
+        if "local_cache" not in data_paths:
+            continue
+        folder = pathlib.Path(data_paths["local_cache"]) / data_paths.get(
+            "subfolder", "results"
+        )
+        for path_key in INPUT_PATH_KEYS:
+            paths = data_paths.get(path_key, [])
+            paths = [paths] if isinstance(paths, str) else paths
+            for path in paths:
+                if not isinstance(path, str):
+                    continue
+                path = pathlib.Path(path)
+                # Normalise lexically as the results folder may not exist yet
+                path = pathlib.Path(
+                    os.path.normpath(path if path.is_absolute() else folder / path)
+                )
+                if not path.exists() and path not in missing:
+                    missing.append(path)
+    return missing
+
+
+def files_in_folders(folders: list) -> set:
+    """Return all files in the folders (and their sub-folders)."""
+
+    files = set()
+    for folder in folders:
+        if folder.exists():
+            files.update(path for path in folder.rglob("*") if path.is_file())
+    return files
+
+
+def lidar_points_in_cache(instructions: dict) -> int:
+    """Return the number of LiDAR points in all LAS/LAZ files in the local caches
+    (including downloaded datasets) - read from the file headers."""
+
+    local_caches = set()
+    for key, stage in instructions.items():
+        if key in STAGE_KEYS and "local_cache" in stage.get("data_paths", {}):
+            local_caches.add(pathlib.Path(stage["data_paths"]["local_cache"]))
+    number_of_points = 0
+    for local_cache in local_caches:
+        for lidar_file in itertools.chain(
+            local_cache.rglob("*.laz"), local_cache.rglob("*.las")
+        ):
+            try:
+                number_of_points += dem.read_las_header(lidar_file)["number_of_points"]
+            except ValueError:
+                continue
+    return number_of_points
+
+
+def peak_memory_per_core(metrics: dict) -> float:
+    """Return the peak memory per core of a processor run for comparing execution
+    modes. In the 'threads' mode the tasks share the memory of this process, and in
+    the 'processes' and 'hybrid' modes each worker process uses 'kdtree_workers'
+    cores."""
+
+    if metrics["execution_mode"] == "threads":
+        if metrics["peak_memory"] is None:
+            return None
+        return metrics["peak_memory"] / metrics["number_of_cores"]
+    if metrics["peak_memory_workers"] is None:
+        return None
+    return metrics["peak_memory_workers"] / metrics["kdtree_workers"]
+
+
+def benchmark_instructions(
+    instructions_path: pathlib.Path,
+    parameter_grid: list,
+    repeats: int,
+    keep_outputs: bool,
+    logger: logging.Logger,
+    skip_missing_inputs: bool = False,
+) -> list:
+    """Run an instruction file for each combination of parameters in the grid and
+    return the performance metrics of each processor run. Any files existing in the
+    results folders before a run are assumed to be inputs, and all others outputs
+    (which are removed after each run). A failed run is recorded with its error. If
+    skip_missing_inputs, an instruction file with missing inputs is recorded as
+    skipped rather than run."""
+
+    if skip_missing_inputs:
+        missing = missing_inputs(load_instructions(instructions_path))
+        if len(missing) > 0:
+            logger.warning(
+                f"Skipping {instructions_path} as its inputs are missing: "
+                f"{[str(path) for path in missing]}"
+            )
+            return [
+                {
+                    "instructions": str(instructions_path),
+                    "parameters": None,
+                    "repeat": None,
+                    "error": None,
+                    "skipped": f"Missing inputs: {[str(path) for path in missing]}",
+                }
+            ]
+    results = []
+    for parameters in parameter_grid:
+        for repeat in range(repeats):
+            instructions = apply_parameters(
+                instructions=load_instructions(instructions_path),
+                parameters=parameters,
+            )
+            # Record existing files (i.e. inputs) so only outputs are removed
+            folders = results_folders(instructions)
+            existing_files = files_in_folders(folders)
+            logger.info(f"Benchmarking {instructions_path} with {parameters}")
+            try:
+                performance = runner.from_instructions_dict(instructions=instructions)
+            except Exception as caught_exception:
+                logger.error(
+                    f"Benchmarking {instructions_path} with {parameters} failed "
+                    f"with {caught_exception!r}."
+                )
+                results.append(
+                    {
+                        "instructions": str(instructions_path),
+                        "parameters": json.dumps(parameters, sort_keys=True),
+                        "repeat": repeat,
+                        "error": repr(caught_exception),
+                    }
+                )
+                performance = []
+            output_files = files_in_folders(folders) - existing_files
+            output_bytes = sum(path.stat().st_size for path in output_files)
+            number_of_points = lidar_points_in_cache(instructions)
+            for metrics in performance:
+                # Only keep the scalar metrics - stages are in the performance report
+                record = {
+                    "instructions": str(instructions_path),
+                    "parameters": json.dumps(parameters, sort_keys=True),
+                    "repeat": repeat,
+                    **{
+                        key: value
+                        for key, value in metrics.items()
+                        if not isinstance(value, (dict, list))
+                    },
+                    "output_bytes": output_bytes,
+                    "peak_memory_per_core": peak_memory_per_core(metrics),
+                    "error": None,
+                }
+                record["points_per_second"] = (
+                    number_of_points / metrics["wall_time"]
+                    if metrics["processor"] in LIDAR_PROCESSORS
+                    and metrics["wall_time"] > 0
+                    else None
+                )
+                results.append(record)
+            # Remove the outputs so they aren't reused by the next run
+            last_run = parameters is parameter_grid[-1] and repeat + 1 == repeats
+            if not (keep_outputs and last_run):
+                for path in output_files:
+                    path.unlink(missing_ok=True)
+    return results
+
+
+def compare_to_baseline(
+    results: pandas.DataFrame, baseline: pandas.DataFrame, tolerance: float
+) -> pandas.DataFrame:
+    """Compare the mean wall time of each processor run against the baseline. A
+    regression is where the wall time has increased by more than the tolerance."""
+
+    keys = ["instructions", "parameters", "processor"]
+    results = results[results["error"].isna()]
+    if "skipped" in results.columns:
+        results = results[results["skipped"].isna()]
+    if "error" in baseline.columns:
+        baseline = baseline[baseline["error"].isna()]
+    if "skipped" in baseline.columns:
+        baseline = baseline[baseline["skipped"].isna()]
+    current = results.groupby(keys)["wall_time"].mean().rename("wall_time")
+    previous = baseline.groupby(keys)["wall_time"].mean().rename("baseline_wall_time")
+    comparison = pandas.concat([current, previous], axis=1, join="inner").reset_index()
+    comparison["ratio"] = comparison["wall_time"] / comparison["baseline_wall_time"]
+    comparison["regression"] = comparison["ratio"] > 1 + tolerance
+    return comparison
+
+
+def benchmark(args) -> tuple:
+    """Benchmark the specified instruction files. Save the results and comparison to
+    any baseline. Return if all runs succeeded and if there were no regressions."""
+
+    logging.basicConfig(stream=sys.stdout, level=logging.INFO)
+    logger = logging.getLogger(__name__)
+
+    # Get the instruction files to run - only tests are skipped if missing inputs
+    instruction_paths = [pathlib.Path(path) for path in args.instructions]
+    test_paths = []
+    if args.tests is not None:
+        test_paths = sorted(pathlib.Path(args.tests).glob("*/instruction.json"))
+        instruction_paths.extend(test_paths)
+    if len(instruction_paths) == 0:
+        raise ValueError("Either --instructions or --tests must be specified.")
+    parameter_grid = load_grid(args.grid)
+    if len(parameter_grid) == 0:
+        parameter_grid = [{}]
+
+    # Run the benchmarks - failing runs are recorded and the others continue
+    results = []
+    for instructions_path in instruction_paths:
+        try:
+            results.extend(
+                benchmark_instructions(
+                    instructions_path=instructions_path,
+                    parameter_grid=parameter_grid,
+                    repeats=args.repeats,
+                    keep_outputs=args.keep_outputs,
+                    logger=logger,
+                    skip_missing_inputs=instructions_path in test_paths,
+                )
+            )
+        except Exception as caught_exception:
+            # i.e. the instruction file can't be loaded
+            results.append(
+                {
+                    "instructions": str(instructions_path),
+                    "parameters": None,
+                    "repeat": None,
+                    "error": repr(caught_exception),
+                }
+            )
+    results = pandas.DataFrame(results)
+    failures = results[results["error"].notna()] if len(results) > 0 else results
+    no_failures = len(failures) == 0
+    for row in failures.itertuples():
+        logger.error(f"Failed: {row.instructions} - {row.error}")
+    if "skipped" in results.columns:
+        for row in results[results["skipped"].notna()].itertuples():
+            logger.warning(f"Skipped: {row.instructions} - {row.skipped}")
+
+    # Save the results and compare against any baseline
+    output = {"results": results.to_dict(orient="records")}
+    no_regressions = True
+    if args.baseline is not None and len(results) > 0:
+        with open(args.baseline, "r") as file_pointer:
+            baseline = pandas.DataFrame(json.load(file_pointer)["results"])
+        comparison = compare_to_baseline(
+            results=results, baseline=baseline, tolerance=args.tolerance
+        )
+        output["comparison"] = comparison.to_dict(orient="records")
+        no_regressions = not comparison["regression"].any()
+        for row in comparison[comparison["regression"]].itertuples():
+            logger.warning(
+                f"Regression: {row.processor} for {row.instructions} with "
+                f"{row.parameters} is {row.ratio:.2f}x the baseline wall time."
+            )
+    output_path = pathlib.Path(args.output)
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    with open(output_path.with_suffix(".json"), "w") as file_pointer:
+        json.dump(output, file_pointer, indent=2)
+    results.to_csv(output_path.with_suffix(".csv"), index=False)
+    logger.info(f"Benchmark results saved to {output_path.with_suffix('.json')}")
+    return no_failures, no_regressions
+
+
+def cli_run_benchmark():
+    """A CLI entry point to the GeoFabrics benchmarking harness. Exit with a
+    non-zero code if any run failed."""
+    args = parse_args()
+    no_failures, no_regressions = benchmark(args)
+    if not no_failures or (args.fail_on_regression and not no_regressions):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    """If called as a script."""
+
+    cli_run_benchmark()
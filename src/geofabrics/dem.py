@@ -10,12 +10,22 @@ import xarray
 import numpy
 import math
 import typing
+import functools
+import hashlib
+import os
+import shutil
+import struct
+import tempfile
+import collections
+import contextlib
+import concurrent.futures
 import pathlib
 import geopandas
 import pandas
 import shapely
 import dask
 import dask.array
+import distributed
 import pdal
 import json
 import abc
@@ -24,9 +34,20 @@ import logging
 import scipy.interpolate
 import scipy.spatial
 from . import geometry
+from . import performance
 
 
 RBF_CACHE_SIZE = 1000
+EXTENTS_SIMPLIFY_TOLERANCE = 0.5  # pixels
+TILE_INDEX_CACHE_SIZE = 8
+TILE_INDEX_THREADS = 8  # threads reading LAS headers when building a tile index
+LAS_HEADER_SIZE = 375  # bytes - the LAS 1.4 public header block
+# Approximate memory used in rasterising a chunk - used to plan the chunk_size
+POINT_MEMORY = 160  # bytes per point - PDAL array, filtered copy and KDTree
+PIXEL_MEMORY = 64  # bytes per pixel - output value and neighbour list
+NEIGHBOUR_MEMORY = 36  # bytes per neighbour index in the neighbour lists
+# The dimensions stored in the point cache - each as a separate .npy file
+POINT_CACHE_DIMENSIONS = ["X", "Y", "Z", "Classification"]
 
 
 def chunk_mask(mask, chunk_size):
@@ -55,6 +76,88 @@ def clip_mask(arr, geometry, chunk_size, invert=False):
     return mask
 
 
+def extents_from_mask(
+    mask: numpy.ndarray, transform, crs, chunk_size: int = None
+) -> geopandas.GeoDataFrame:
+    """Define the spatial extents of the pixels marked True in the mask.
+
+    The mask is polygonised chunk by chunk in image space so the pixel coordinates
+    along chunk seams match exactly and merge cleanly. The result is simplified by
+    EXTENTS_SIMPLIFY_TOLERANCE pixels (preserving topology) to remove the pixel
+    stair-steps before moving into the DEM space with the transform (i.e.
+    data_array.rio.transform()). Holes are removed as these can cause self
+    intersection warnings."""
+
+    if chunk_size is None:
+        chunk_size = max(mask.shape[0], mask.shape[1], 1)
+    dense_extents = []
+    for i in range(0, mask.shape[0], chunk_size):
+        for j in range(0, mask.shape[1], chunk_size):
+            chunk = numpy.asarray(
+                mask[i : i + chunk_size, j : j + chunk_size], dtype=bool
+            )
+            if not chunk.any():
+                continue
+            elif chunk.all():
+                # Skip polygonising when the chunk is fully covered
+                dense_extents.append(
+                    shapely.geometry.box(j, i, j + chunk.shape[1], i + chunk.shape[0])
+                )
+                continue
+            # Polygonise in image space offset to the chunk origin
+            dense_extents.extend(
+                [
+                    shapely.geometry.shape(polygon[0])
+                    for polygon in rasterio.features.shapes(
+                        numpy.uint8(chunk),
+                        mask=chunk,
+                        transform=rasterio.Affine.translation(j, i),
+                    )
+                    if polygon[1] == 1.0
+                ]
+            )
+    # Merge chunks along their seams
+    dense_extents = shapely.ops.unary_union(dense_extents)
+
+    # Remove internal holes for select types as these may cause self-intersections
+    if type(dense_extents) is shapely.geometry.Polygon:
+        dense_extents = shapely.geometry.Polygon(dense_extents.exterior)
+    elif type(dense_extents) is shapely.geometry.MultiPolygon:
+        dense_extents = shapely.geometry.MultiPolygon(
+            [
+                shapely.geometry.Polygon(polygon.exterior)
+                for polygon in dense_extents.geoms
+            ]
+        )
+    # Remove the pixel stair-steps - tolerance is in pixels in image space
+    dense_extents = dense_extents.simplify(
+        EXTENTS_SIMPLIFY_TOLERANCE, preserve_topology=True
+    )
+
+    # Convert into a Geopandas dataframe
+    dense_extents = geopandas.GeoDataFrame(
+        {"geometry": [dense_extents]},
+        crs=crs,
+    )
+
+    # Move from image to the dem space & buffer(0) to reduce self-intersections
+    dense_extents = dense_extents.affine_transform(
+        [
+            transform.a,
+            transform.b,
+            transform.d,
+            transform.e,
+            transform.xoff,
+            transform.yoff,
+        ]
+    ).buffer(0)
+
+    # And make our GeoSeries into a GeoDataFrame
+    dense_extents = geopandas.GeoDataFrame(geometry=dense_extents)
+
+    return dense_extents
+
+
 class CoarseDem:
     """A class to manage coarse or background DEMs in the catchment context
 
@@ -305,11 +408,18 @@ class DemBase(abc.ABC):
         "no data": -1,
     }
 
-    def __init__(self, catchment_geometry: geometry.CatchmentGeometry, chunk_size: int):
-        """Setup base DEM to add future tiles too"""
+    def __init__(
+        self,
+        catchment_geometry: geometry.CatchmentGeometry,
+        chunk_size: int,
+        kdtree_workers: int = 1,
+    ):
+        """Setup base DEM to add future tiles too. kdtree_workers is the number of
+        threads each task uses in KDTree queries."""
 
         self.catchment_geometry = catchment_geometry
         self.chunk_size = chunk_size
+        self.kdtree_workers = kdtree_workers
 
     @property
     def dem(self) -> xarray.Dataset:
@@ -351,13 +461,18 @@ class DemBase(abc.ABC):
         return dem
 
     def save_dem(
-        self, filename: pathlib.Path, dem: xarray.Dataset, compression: dict = None
+        self,
+        filename: pathlib.Path,
+        dem: xarray.Dataset,
+        compression: dict = None,
+        compute: bool = True,
     ):
         """Save the DEM to a netCDF file.
 
         :param filename: .nc or .tif file to save the DEM.
         :param dem: the DEM to save.
         :param compression: the compression instructions if compressing.
+        :param compute: if False return the delayed netCDF write to compute later.
         """
 
         assert not any(
@@ -387,11 +502,19 @@ class DemBase(abc.ABC):
                         if "dtype" not in encoding[key]:
                             encoding[key]["dtype"] = dem[key].dtype
                         encoding[key] = {**encoding[key], **compression}
-                    dem.to_netcdf(
-                        filename, format="NETCDF4", engine="netcdf4", encoding=encoding
+                    delayed = dem.to_netcdf(
+                        filename,
+                        format="NETCDF4",
+                        engine="netcdf4",
+                        encoding=encoding,
+                        compute=compute,
                     )
                 else:
-                    dem.to_netcdf(filename, format="NETCDF4", engine="netcdf4")
+                    delayed = dem.to_netcdf(
+                        filename, format="NETCDF4", engine="netcdf4", compute=compute
+                    )
+                if not compute:
+                    return delayed
             elif filename.suffix.lower() == ".tif":
                 for key, array in dem.data_vars.items():
                     filename_layer = (
@@ -432,6 +555,39 @@ class DemBase(abc.ABC):
         gc.collect()
         self._dem = self._load_dem(filename=filename)
 
+    @staticmethod
+    def save_and_load_dems(dems: list, filenames: list):
+        """Save the DEMs (self._dem) of several DemBase's to netCDF files in one
+        compute and then reload each. Tasks shared between the DEMs (i.e. the LiDAR
+        reads of additional DEMs) are only computed once, and each DEM is still
+        written chunk by chunk rather than held in memory."""
+
+        logger = logging.getLogger(f"{__name__}.DemBase")
+        logger.info(
+            "In DemBase.save_and_load_dems saving _dem's as NetCDF files to "
+            f"{filenames}"
+        )
+        # Don't fuse the tasks of each write or the shared tasks are renamed
+        with dask.config.set({"optimization.fuse.active": False}):
+            writes = [
+                dem.save_dem(filename=filename, dem=dem._dem, compute=False)
+                for dem, filename in zip(dems, filenames)
+            ]
+        try:
+            dask.compute(*writes)
+        except (Exception, KeyboardInterrupt) as caught_exception:
+            for filename in filenames:
+                pathlib.Path(filename).unlink(missing_ok=True)
+            logger.info(
+                f"Caught error {caught_exception} and deleting partially created "
+                f"netCDF outputs {filenames} before re-raising error."
+            )
+            raise caught_exception
+        for dem, filename in zip(dems, filenames):
+            del dem._dem
+            gc.collect()
+            dem._dem = dem._load_dem(filename=filename)
+
     @staticmethod
     def _ensure_positive_indexing(
         dem: xarray.core.dataarray.DataArray,
@@ -478,50 +634,15 @@ class DemBase(abc.ABC):
         (i.e. what are the spatial extents of pixels in the DEM that are marked True in
          the mask).
 
-        transform -> data_array.rio.transform()
-
-         Remove holes as these can cause self intersection warnings."""
+        transform -> data_array.rio.transform()"""
 
-        dense_extents = [
-            shapely.geometry.shape(polygon[0])
-            for polygon in rasterio.features.shapes(numpy.uint8(mask))
-            if polygon[1] == 1.0
-        ]
-        dense_extents = shapely.ops.unary_union(dense_extents)
-
-        # Remove internal holes for select types as these may cause self-intersections
-        if type(dense_extents) is shapely.geometry.Polygon:
-            dense_extents = shapely.geometry.Polygon(dense_extents.exterior)
-        elif type(dense_extents) is shapely.geometry.MultiPolygon:
-            dense_extents = shapely.geometry.MultiPolygon(
-                [
-                    shapely.geometry.Polygon(polygon.exterior)
-                    for polygon in dense_extents.geoms
-                ]
-            )
-        # Convert into a Geopandas dataframe
-        dense_extents = geopandas.GeoDataFrame(
-            {"geometry": [dense_extents]},
+        return extents_from_mask(
+            mask=mask,
+            transform=transform,
             crs=self.catchment_geometry.crs["horizontal"],
+            chunk_size=self.chunk_size,
         )
 
-        # Move from image to the dem space & buffer(0) to reduce self-intersections
-        dense_extents = dense_extents.affine_transform(
-            [
-                transform.a,
-                transform.b,
-                transform.d,
-                transform.e,
-                transform.xoff,
-                transform.yoff,
-            ]
-        ).buffer(0)
-
-        # And make our GeoSeries into a GeoDataFrame
-        dense_extents = geopandas.GeoDataFrame(geometry=dense_extents)
-
-        return dense_extents
-
     def _chunks_from_dem(self, chunk_size, dem: xarray.Dataset) -> tuple[list, list]:
         """Define the chunks to break the catchment into when reading in and
         downsampling LiDAR.
@@ -562,47 +683,82 @@ class DemBase(abc.ABC):
 
         return dim_x, dim_y
 
-    def _define_chunk_region(
+    def _plan_chunk_regions(
         self,
         region_to_rasterise: geopandas.GeoDataFrame,
-        dim_x: numpy.ndarray,
-        dim_y: numpy.ndarray,
+        chunked_dim_x: list,
+        chunked_dim_y: list,
         radius: float,
-    ):
-        """Define the region to rasterise within a single chunk."""
-        # Define the region to tile
-        chunk_geometry = geopandas.GeoDataFrame(
-            {
-                "geometry": [
-                    shapely.geometry.Polygon(
+    ) -> dict:
+        """Define the region to rasterise within all chunks at once. The region is
+        buffered once and intersected with all buffered chunk boxes using a single
+        STRtree query.
+
+        Returns a dictionary keyed by the chunk (i, j) index of the non-empty
+        chunk regions. Chunks not in the dictionary are outside the region."""
+
+        # Return if there is no region to rasterise
+        if region_to_rasterise.area.sum() <= 0:
+            return {}
+
+        # Define the chunk boxes ordered by row (y) then column (x)
+        n_x, n_y = len(chunked_dim_x), len(chunked_dim_y)
+        x_min = numpy.array([dim_x.min() for dim_x in chunked_dim_x])
+        x_max = numpy.array([dim_x.max() for dim_x in chunked_dim_x])
+        y_min = numpy.array([dim_y.min() for dim_y in chunked_dim_y])
+        y_max = numpy.array([dim_y.max() for dim_y in chunked_dim_y])
+        chunk_boxes = shapely.buffer(
+            shapely.box(
+                numpy.tile(x_min, n_y),
+                numpy.repeat(y_min, n_x),
+                numpy.tile(x_max, n_y),
+                numpy.repeat(y_max, n_x),
+            ),
+            radius,
+        )
+
+        # Buffer the region once and find all chunk / region intersections
+        regions = numpy.asarray(region_to_rasterise.buffer(radius).values)
+        tree = shapely.STRtree(regions)
+        chunk_indices, region_indices = tree.query(chunk_boxes, predicate="intersects")
+        order = numpy.lexsort((region_indices, chunk_indices))
+        chunk_indices, region_indices = chunk_indices[order], region_indices[order]
+        clipped = shapely.intersection(
+            chunk_boxes[chunk_indices], regions[region_indices]
+        )
+
+        # Keep only polygon parts of any mixed geometry collections
+        for index in numpy.flatnonzero(
+            shapely.get_type_id(clipped) == shapely.GeometryType.GEOMETRYCOLLECTION
+        ):
+            parts = shapely.get_parts(clipped[index])
+            clipped[index] = shapely.union_all(
+                parts[
+                    numpy.isin(
+                        shapely.get_type_id(parts),
                         [
-                            (dim_x.min(), dim_y.min()),
-                            (dim_x.max(), dim_y.min()),
-                            (dim_x.max(), dim_y.max()),
-                            (dim_x.min(), dim_y.max()),
-                        ]
+                            shapely.GeometryType.POLYGON,
+                            shapely.GeometryType.MULTIPOLYGON,
+                        ],
                     )
                 ]
-            },
-            crs=self.catchment_geometry.crs["horizontal"],
-        )
-
-        # Define region to rasterise inside the chunk area
-        if region_to_rasterise.area.sum() > 0:
-            chunk_region_to_tile = geopandas.GeoDataFrame(
-                geometry=region_to_rasterise.buffer(radius).clip(
-                    chunk_geometry.buffer(radius), keep_geom_type=True
-                )
             )
-        else:
-            chunk_region_to_tile = region_to_rasterise
-        # remove any subpixel polygons
-        chunk_region_to_tile = chunk_region_to_tile[
-            chunk_region_to_tile.area
-            > self.catchment_geometry.resolution * self.catchment_geometry.resolution
-        ]
 
-        return chunk_region_to_tile
+        # remove any subpixel polygons
+        keep = shapely.area(clipped) > self.catchment_geometry.resolution**2
+        chunk_indices, clipped = chunk_indices[keep], clipped[keep]
+
+        # Group into a GeoDataFrame for each chunk
+        chunk_regions = {}
+        unique_indices, starts = numpy.unique(chunk_indices, return_index=True)
+        for chunk_index, geometries in zip(
+            unique_indices, numpy.split(clipped, starts[1:])
+        ):
+            chunk_regions[divmod(int(chunk_index), n_x)] = geopandas.GeoDataFrame(
+                geometry=list(geometries),
+                crs=self.catchment_geometry.crs["horizontal"],
+            )
+        return chunk_regions
 
 
 class HydrologicallyConditionedDem(DemBase):
@@ -624,12 +780,14 @@ class HydrologicallyConditionedDem(DemBase):
         raw_dem_path: str | pathlib.Path,
         interpolation_method: str,
         chunk_size,
+        kdtree_workers: int = 1,
     ):
         """Load in the extents and dense DEM. Ensure the dense DEM is clipped within the
         extents"""
         super(HydrologicallyConditionedDem, self).__init__(
             catchment_geometry=catchment_geometry,
             chunk_size=chunk_size,
+            kdtree_workers=kdtree_workers,
         )
         self.logger = logging.getLogger(f"{__name__}.{self.__class__.__name__}")
 
@@ -816,6 +974,7 @@ class HydrologicallyConditionedDem(DemBase):
             "crs": crs,
             "use_edge": use_edge,
             "strict": True,
+            "workers": self.kdtree_workers,
         }
         if method == "rbf":
             raster_options["kernel"] = "thin_plate_spline"
@@ -895,6 +1054,14 @@ class HydrologicallyConditionedDem(DemBase):
             self._raw_extents
         )
 
+        # Define the region to rasterise within each chunk
+        chunk_regions = self._plan_chunk_regions(
+            region_to_rasterise=region_to_rasterise,
+            chunked_dim_x=chunked_dim_x,
+            chunked_dim_y=chunked_dim_y,
+            radius=0,
+        )
+
         # cycle through index chunks - and collect in a delayed array
         self.logger.info("Running over ocean chunked")
         delayed_chunked_matrix = []
@@ -903,13 +1070,7 @@ class HydrologicallyConditionedDem(DemBase):
             for j, dim_x in enumerate(chunked_dim_x):
                 self.logger.debug(f"\tLiDAR chunk {[i, j]}")
                 # Check ROI to tile
-                chunk_region_to_tile = self._define_chunk_region(
-                    region_to_rasterise=region_to_rasterise,
-                    dim_x=dim_x,
-                    dim_y=dim_y,
-                    radius=0,
-                )
-                if chunk_region_to_tile.area.sum() == 0:
+                if (i, j) not in chunk_regions:
                     self.logger.debug(f"\t\tReturning empty tile as out of RIO")
                     delayed_chunked_x.append(
                         dask.array.full(
@@ -1111,7 +1272,7 @@ class HydrologicallyConditionedDem(DemBase):
         )
         clip_polygon = []
         for path in polygon_paths:
-            clip_polygon.append(geopandas.read_file(path).to_crs(crs["horizontal"]))
+            clip_polygon.append(geometry.read_vector(path).to_crs(crs["horizontal"]))
         clip_polygon = pandas.concat(clip_polygon).dissolve()
         clip_polygon = clip_polygon.clip(dem_bounds)
         if clip_polygon.area.sum() > self.catchment_geometry.resolution**2:
@@ -1164,6 +1325,7 @@ class HydrologicallyConditionedDem(DemBase):
             "radius": elevations.points["width"].max()
             + 2 * self.catchment_geometry.resolution,
             "strict": False,
+            "workers": self.kdtree_workers,
         }
         if method == "rbf":
             raster_options["kernel"] = "linear"
@@ -1227,6 +1389,14 @@ class HydrologicallyConditionedDem(DemBase):
 
         self.logger.info(f"Preparing {[len(chunked_dim_x), len(chunked_dim_y)]} chunks")
 
+        # Define the region to rasterise within each chunk
+        chunk_regions = self._plan_chunk_regions(
+            region_to_rasterise=region_to_rasterise,
+            chunked_dim_x=chunked_dim_x,
+            chunked_dim_y=chunked_dim_y,
+            radius=0,
+        )
+
         # cycle through index chunks - and collect in a delayed array
         self.logger.info(f"Running over {label} chunked")
         delayed_chunked_matrix = []
@@ -1235,13 +1405,7 @@ class HydrologicallyConditionedDem(DemBase):
             for j, dim_x in enumerate(chunked_dim_x):
                 self.logger.debug(f"\tLiDAR chunk {[i, j]}")
                 # Check ROI to tile
-                chunk_region_to_tile = self._define_chunk_region(
-                    region_to_rasterise=region_to_rasterise,
-                    dim_x=dim_x,
-                    dim_y=dim_y,
-                    radius=0,
-                )
-                if chunk_region_to_tile.area.sum() == 0:
+                if (i, j) not in chunk_regions:
                     self.logger.debug(f"\t\tReturning empty tile as out of RIO")
                     delayed_chunked_x.append(
                         dask.array.full(
@@ -1319,6 +1483,7 @@ class HydrologicallyConditionedDem(DemBase):
             "k_nearest_neighbours": k_nearest_neighbours,
             "use_edge": include_edges,
             "strict": False,
+            "workers": self.kdtree_workers,
         }
         if method == "rbf":
             raster_options["kernel"] = "linear"
@@ -1378,6 +1543,7 @@ class HydrologicallyConditionedDem(DemBase):
                     "raster_type": geometry.RASTER_TYPE,
                     "method": "linear",
                     "strict": False,
+                    "workers": self.kdtree_workers,
                 }
                 estimated_edge_z = elevation_from_points(
                     point_cloud=bank_points[bank_nan_mask],
@@ -1448,6 +1614,14 @@ class HydrologicallyConditionedDem(DemBase):
 
         self.logger.info(f"Preparing {[len(chunked_dim_x), len(chunked_dim_y)]} chunks")
 
+        # Define the region to rasterise within each chunk
+        chunk_regions = self._plan_chunk_regions(
+            region_to_rasterise=region_to_rasterise,
+            chunked_dim_x=chunked_dim_x,
+            chunked_dim_y=chunked_dim_y,
+            radius=0,
+        )
+
         # cycle through index chunks - and collect in a delayed array
         self.logger.info(
             "Running over points chunked - nearest of points & edge points"
@@ -1458,13 +1632,7 @@ class HydrologicallyConditionedDem(DemBase):
             for j, dim_x in enumerate(chunked_dim_x):
                 self.logger.debug(f"\tLiDAR chunk {[i, j]}")
                 # Check ROI to tile
-                chunk_region_to_tile = self._define_chunk_region(
-                    region_to_rasterise=region_to_rasterise,
-                    dim_x=dim_x,
-                    dim_y=dim_y,
-                    radius=0,
-                )
-                if chunk_region_to_tile.area.sum() == 0:
+                if (i, j) not in chunk_regions:
                     self.logger.debug(f"\t\tReturning empty tile as out of RIO")
                     delayed_chunked_x.append(
                         dask.array.full(
@@ -1540,6 +1708,9 @@ class LidarBase(DemBase):
         Defines the geometry of the catchment
     elevation_range
         The range of valid LiDAR elevations. i.e. define elevation filtering to apply.
+    point_cache
+        Optionally a dictionary with the 'folder' and 'max_bytes' of an on disk cache
+        of reprojected LiDAR points shared between stages and runs.
     """
 
     def __init__(
@@ -1547,21 +1718,27 @@ class LidarBase(DemBase):
         catchment_geometry: geometry.CatchmentGeometry,
         chunk_size: int,
         elevation_range: list = None,
+        kdtree_workers: int = 1,
+        point_cache: dict = None,
     ):
         """Setup base DEM to add future tiles too"""
 
         super(LidarBase, self).__init__(
             catchment_geometry=catchment_geometry,
             chunk_size=chunk_size,
+            kdtree_workers=kdtree_workers,
         )
         self.logger = logging.getLogger(f"{__name__}.{self.__class__.__name__}")
 
+        self.point_cache = point_cache
         self.elevation_range = elevation_range
         assert elevation_range is None or (
             type(elevation_range) is list and len(elevation_range) == 2
         ), "Error the 'elevation_range' must either be none, or a two entry list"
 
         self._dem = None
+        # The bytes of LAS/LAZ files read - a file is counted once per chunk it's in
+        self.lidar_bytes_read = 0
 
     def __del__(self):
         """Ensure the memory associated with netCDF files is properly freed."""
@@ -1586,13 +1763,13 @@ class LidarBase(DemBase):
     ):
         """Read in LiDAR tile index file and determine the column name of the
         tile geometries"""
-        # Check to see if a extents file was added
-        tile_index_extents = geopandas.read_file(tile_index_file)
-
-        # Remove tiles outside the catchment & get the 'file name' column
-        tile_index_extents = tile_index_extents.to_crs(
-            self.catchment_geometry.crs["horizontal"]
-        )
+        # Read in the tile index - cached as it is used by several stages
+        tile_index_file = pathlib.Path(tile_index_file)
+        tile_index_extents = read_tile_index(
+            tile_index_file=str(tile_index_file),
+            modified_time=tile_index_file.stat().st_mtime,
+            crs=self.catchment_geometry.crs["horizontal"],
+        ).copy()
         # ensure there is no overlap in the name columns
         region_to_rasterise = region_to_rasterise.copy(deep=True)
         if "filename" in region_to_rasterise.columns:
@@ -1681,6 +1858,7 @@ class LidarBase(DemBase):
         chunk_size: int,
         lidar_classifications_to_keep: list,
         metadata: dict,
+        lidar_z_type: str = "float64",
     ):
         """Read in all LiDAR files and use to create a 'raw' DEM.
 
@@ -1699,6 +1877,8 @@ class LidarBase(DemBase):
         meta_data
             Information to include in the created DEM - must include
             `dataset_mapping` key if datasets (not a single LAZ file) included.
+        lidar_z_type
+            The type to read LiDAR elevations as - 'float32' halves their memory.
         """
         raise NotImplementedError("add_lidar must be instantiated in the child class")
 
@@ -1752,6 +1932,9 @@ class RawDem(LidarBase):
         interpolation after the coarse DEM added to ensure a smooth boundary.
     chunk_size
         The chunk size in pixels for parallel/staged processing
+    lidar_classifications_to_keep
+        Optionally the LiDAR classifications to keep when rasterised as an
+        additional DEM of another RawDem. By default those of the other RawDem.
     """
 
     def __init__(
@@ -1763,6 +1946,9 @@ class RawDem(LidarBase):
         buffer_cells: int,
         elevation_range: list | None = None,
         chunk_size: int | None = None,
+        kdtree_workers: int = 1,
+        point_cache: dict = None,
+        lidar_classifications_to_keep: list | None = None,
     ):
         """Setup base DEM to add future tiles too"""
 
@@ -1770,12 +1956,15 @@ class RawDem(LidarBase):
             catchment_geometry=catchment_geometry,
             chunk_size=chunk_size,
             elevation_range=elevation_range,
+            kdtree_workers=kdtree_workers,
+            point_cache=point_cache,
         )
         self.logger = logging.getLogger(f"{__name__}.{self.__class__.__name__}")
 
         self.drop_offshore_lidar = drop_offshore_lidar
         self.zero_positive_foreshore = zero_positive_foreshore
         self.lidar_interpolation_method = lidar_interpolation_method
+        self.lidar_classifications_to_keep = lidar_classifications_to_keep
         self.buffer_cells = buffer_cells
         self._dem = None
 
@@ -1851,8 +2040,12 @@ class RawDem(LidarBase):
         lidar_datasets_info: dict,
         lidar_classifications_to_keep: list,
         metadata: dict,
+        lidar_z_type: str = "float64",
+        additional_dems: list = [],
     ):
-        """Read in all LiDAR files and use to create a 'raw' DEM.
+        """Read in all LiDAR files and use to create a 'raw' DEM. Optionally also
+        create the 'raw' DEMs of additional RawDem's (i.e. at other resolutions, or
+        of other classifications) from the same read of each chunk.
 
         Parameters
         ----------
@@ -1867,6 +2060,13 @@ class RawDem(LidarBase):
         meta_data
             Information to include in the created DEM - must include
             `dataset_mapping` key if datasets (not a single LAZ file) included.
+        lidar_z_type
+            The type to read LiDAR elevations as - 'float32' halves their memory.
+        additional_dems
+            RawDem's of the same catchment (i.e. at other resolutions) to rasterise
+            from the same LiDAR reads. Each uses its own resolution, method and any
+            classifications it specifies. The reads are only shared if the DEMs are
+            saved together with DemBase.save_and_load_dems.
         """
 
         # Check valid inputs
@@ -1881,12 +2081,33 @@ class RawDem(LidarBase):
             "method": self.lidar_interpolation_method,
             "crs": self.catchment_geometry.crs,
             "strict": True,
+            "workers": self.kdtree_workers,
+            "lidar_z_type": lidar_z_type,
         }
         if self.lidar_interpolation_method == "rbf":
             raster_options["kernel"] = "linear"
+        additional_options = [
+            additional_dem._additional_raster_options(raster_options)
+            for additional_dem in additional_dems
+        ]
+        # Read the classifications of all DEMs - each DEM filters its own
+        raster_options["lidar_classifications_to_read"] = sorted(
+            set(lidar_classifications_to_keep).union(
+                *[
+                    options["lidar_classifications_to_keep"]
+                    for options in additional_options
+                ]
+            )
+        )
 
         # Don't use dask delayed if there is no chunking
         if len(lidar_datasets_info) == 0:
+            for additional_dem in additional_dems:
+                additional_dem.add_lidar(
+                    lidar_datasets_info=lidar_datasets_info,
+                    lidar_classifications_to_keep=lidar_classifications_to_keep,
+                    metadata=metadata,
+                )
             # Create an empty dataset as no LiDAR
             self.logger.warning("No LiDAR dataset. Creating an empty raw DEM dataset.")
             bounds = self.catchment_geometry.catchment.geometry.bounds
@@ -1914,16 +2135,65 @@ class RawDem(LidarBase):
                 lidar_datasets_info=lidar_datasets_info,
                 options=raster_options,
                 metadata=metadata,
+                additional_dems=additional_dems,
+                additional_options=additional_options,
             )
         else:
             dem = self._add_tiled_lidar_chunked(
                 lidar_datasets_info=lidar_datasets_info,
                 raster_options=raster_options,
                 metadata=metadata,
+                additional_dems=additional_dems,
+                additional_options=additional_options,
             )
 
         self._dem = dem
 
+    def _additional_raster_options(self, raster_options: dict) -> dict:
+        """Return the raster options of the DEM that shares the LiDAR reads with
+        this DEM as an additional DEM - with this DEMs resolution and method."""
+
+        options = {
+            **raster_options,
+            "radius": self.catchment_geometry.resolution / numpy.sqrt(2),
+            "method": self.lidar_interpolation_method,
+        }
+        if self.lidar_classifications_to_keep is not None:
+            options[
+                "lidar_classifications_to_keep"
+            ] = self.lidar_classifications_to_keep
+        options.pop("kernel", None)
+        if self.lidar_interpolation_method == "rbf":
+            options["kernel"] = "linear"
+        return options
+
+    def _split_into_chunks(
+        self, chunked_dim_x: list, chunked_dim_y: list
+    ) -> tuple[list, list]:
+        """Split the x and y coordinates of this DEM between the chunks of another
+        DEM of the same catchment (i.e. at a different resolution). Each coordinate
+        is in the chunk containing it - so some chunks may have none."""
+
+        bounds = self.catchment_geometry.catchment.geometry.bounds
+        resolution = self.catchment_geometry.resolution
+        x = numpy.arange(
+            numpy.ceil(bounds.minx.min() / resolution) * resolution,
+            numpy.ceil(bounds.maxx.max() / resolution) * resolution + resolution,
+            resolution,
+            dtype=geometry.RASTER_TYPE,
+        )
+        y = numpy.arange(
+            numpy.ceil(bounds.maxy.max() / resolution) * resolution,
+            numpy.ceil(bounds.miny.min() / resolution) * resolution - resolution,
+            -resolution,
+            dtype=geometry.RASTER_TYPE,
+        )
+        x_starts = [dim_x[0] for dim_x in chunked_dim_x[1:]]
+        y_starts = [dim_y[0] for dim_y in chunked_dim_y[1:]]
+        dim_x = numpy.split(x, numpy.searchsorted(x, x_starts, side="left"))
+        dim_y = numpy.split(y, numpy.searchsorted(-y, numpy.negative(y_starts)))
+        return dim_x, dim_y
+
     def clip_lidar(
         self,
     ):
@@ -1983,15 +2253,35 @@ class RawDem(LidarBase):
         lidar_datasets_info: dict,
         metadata: dict,
         raster_options: dict,
+        additional_dems: list = [],
+        additional_options: list = [],
     ) -> xarray.Dataset:
         """Create a 'raw'' DEM from a set of tiled LiDAR files. Read these in over
-        non-overlapping chunks and then combine"""
+        non-overlapping chunks and then combine. Any additional DEMs are rasterised
+        from the same chunk reads over their own coordinates within each chunk."""
 
         assert self.chunk_size is not None, "chunk_size must be defined"
 
         # get chunking information
         chunked_dim_x, chunked_dim_y = self._set_up_chunks()
         elevations = {}
+        additional_dims = [
+            additional_dem._split_into_chunks(chunked_dim_x, chunked_dim_y)
+            for additional_dem in additional_dems
+        ]
+        additional_elevations = [{} for additional_dem in additional_dems]
+        # Read points far enough beyond each chunk for all DEMs
+        chunk_radius = max(
+            [raster_options["radius"]]
+            + [
+                options["radius"]
+                + max(
+                    additional_dem.catchment_geometry.resolution,
+                    self.catchment_geometry.resolution,
+                )
+                for additional_dem, options in zip(additional_dems, additional_options)
+            ]
+        )
 
         self.logger.info(f"Preparing {[len(chunked_dim_x), len(chunked_dim_y)]} chunks")
         for dataset_name, dataset_info in lidar_datasets_info.items():
@@ -2008,9 +2298,7 @@ class RawDem(LidarBase):
             )
 
             # create a map from tile name to tile file name
-            lidar_files_map = {
-                lidar_file.name: lidar_file for lidar_file in lidar_files
-            }
+            lidar_files_map = map_lidar_files(lidar_files)
 
             # remove all tiles entirely outside the region to raserise
             (
@@ -2021,29 +2309,34 @@ class RawDem(LidarBase):
                 region_to_rasterise=self.catchment_geometry.catchment,
             )
 
+            # Define the region to tile and the LiDAR files within each chunk
+            chunk_regions = self._plan_chunk_regions(
+                region_to_rasterise=region_to_rasterise,
+                chunked_dim_x=chunked_dim_x,
+                chunked_dim_y=chunked_dim_y,
+                radius=chunk_radius,
+            )
+            chunks_lidar_files = select_lidar_files_in_chunks(
+                tile_index_extents=tile_index_extents,
+                tile_index_name_column=tile_index_name_column,
+                chunk_regions=chunk_regions,
+                lidar_files_map=lidar_files_map,
+            )
+
             # cycle through index chunks - and collect in a delayed array
             self.logger.info(f"Running over dataset {dataset_name}")
             delayed_chunked_matrix = []
+            additional_matrices = [[] for additional_dem in additional_dems]
             for i, dim_y in enumerate(chunked_dim_y):
                 delayed_chunked_x = []
+                additional_rows = [[] for additional_dem in additional_dems]
                 for j, dim_x in enumerate(chunked_dim_x):
                     self.logger.debug(f"\tLiDAR chunk {[i, j]}")
 
-                    # Define the region to tile
-                    chunk_region_to_tile = self._define_chunk_region(
-                        region_to_rasterise=region_to_rasterise,
-                        dim_x=dim_x,
-                        dim_y=dim_y,
-                        radius=raster_options["radius"],
-                    )
-
-                    # Load in files into tiles
-                    chunk_lidar_files = select_lidar_files(
-                        tile_index_extents=tile_index_extents,
-                        tile_index_name_column=tile_index_name_column,
-                        chunk_region_to_tile=chunk_region_to_tile,
-                        lidar_files_map=lidar_files_map,
-                    )
+                    # Get the region to tile and files within it
+                    chunk_region_to_tile = chunk_regions.get((i, j))
+                    chunk_lidar_files = chunks_lidar_files.get((i, j), [])
+                    self.lidar_bytes_read += lidar_files_size(chunk_lidar_files)
 
                     # Return empty if no files
                     if len(chunk_lidar_files) == 0:
@@ -2057,6 +2350,14 @@ class RawDem(LidarBase):
                                 dtype=raster_options["raster_type"],
                             )
                         )
+                        for k, (dims_x, dims_y) in enumerate(additional_dims):
+                            additional_rows[k].append(
+                                dask.array.full(
+                                    shape=(len(dims_y[i]), len(dims_x[j])),
+                                    fill_value=numpy.nan,
+                                    dtype=raster_options["raster_type"],
+                                )
+                            )
                         continue
 
                     # Get point cloud
@@ -2065,6 +2366,12 @@ class RawDem(LidarBase):
                         source_crs=source_crs,
                         chunk_region_to_tile=chunk_region_to_tile,
                         crs=raster_options["crs"],
+                        classifications=raster_options[
+                            "lidar_classifications_to_read"
+                        ],
+                        elevation_range=raster_options["elevation_range"],
+                        z_type=raster_options["lidar_z_type"],
+                        point_cache=self.point_cache,
                     )
                     # Rasterise tiles
                     delayed_chunked_x.append(
@@ -2079,16 +2386,53 @@ class RawDem(LidarBase):
                             dtype=raster_options["raster_type"],
                         )
                     )
+                    # Rasterise any additional DEMs from the same points
+                    for k, (dims_x, dims_y) in enumerate(additional_dims):
+                        additional_rows[k].append(
+                            dask.array.from_delayed(
+                                delayed_elevation_over_chunk(
+                                    dim_x=dims_x[j],
+                                    dim_y=dims_y[i],
+                                    tile_points=chunk_points,
+                                    options=additional_options[k],
+                                ),
+                                shape=(len(dims_y[i]), len(dims_x[j])),
+                                dtype=raster_options["raster_type"],
+                            )
+                        )
                 delayed_chunked_matrix.append(delayed_chunked_x)
+                for k, (dims_x, dims_y) in enumerate(additional_dims):
+                    # Drop chunks without coordinates in the additional DEM
+                    if len(dims_y[i]) > 0:
+                        additional_matrices[k].append(
+                            [
+                                chunk
+                                for chunk, dim_x in zip(additional_rows[k], dims_x)
+                                if len(dim_x) > 0
+                            ]
+                        )
 
             # Combine chunks into a dataset
             elevations[dataset_name] = dask.array.block(delayed_chunked_matrix)
+            for k, additional_matrix in enumerate(additional_matrices):
+                additional_elevations[k][dataset_name] = dask.array.block(
+                    additional_matrix
+                )
         chunked_dem = self._create_data_set(
             x=numpy.concatenate(chunked_dim_x),
             y=numpy.concatenate(chunked_dim_y),
             elevations=elevations,
             metadata=metadata,
         )
+        for additional_dem, (dims_x, dims_y), elevations in zip(
+            additional_dems, additional_dims, additional_elevations
+        ):
+            additional_dem._dem = additional_dem._create_data_set(
+                x=numpy.concatenate(dims_x),
+                y=numpy.concatenate(dims_y),
+                elevations=elevations,
+                metadata=metadata,
+            )
 
         return chunked_dem
 
@@ -2097,8 +2441,11 @@ class RawDem(LidarBase):
         lidar_datasets_info: dict,
         options: dict,
         metadata: dict,
+        additional_dems: list = [],
+        additional_options: list = [],
     ) -> xarray.Dataset:
-        """Create a 'raw' DEM from a single LiDAR file with no chunking."""
+        """Create a 'raw' DEM from a single LiDAR file with no chunking. Any
+        additional DEMs are rasterised from the same points."""
 
         assert self.chunk_size is None, "chunk_size should not be defined"
 
@@ -2107,6 +2454,7 @@ class RawDem(LidarBase):
         lidar_file = lidar_datasets_info[lidar_name]["file_paths"][0]
         source_crs = lidar_datasets_info[lidar_name]["crs"]
         self.logger.info(f"On LiDAR tile 1 of 1: {lidar_file}")
+        self.lidar_bytes_read += lidar_files_size([lidar_file])
 
         # Define the region to rasterise
         region_to_rasterise = (
@@ -2115,48 +2463,58 @@ class RawDem(LidarBase):
             else self.catchment_geometry.catchment
         )
 
-        # Use PDAL to load in file
-        pdal_pipeline = read_file_with_pdal(
-            lidar_file,
+        # Use PDAL (or the point cache) to load in file
+        tile_points = load_tiles_in_chunk(
+            lidar_files=[lidar_file],
             source_crs=source_crs,
-            region_to_tile=region_to_rasterise,
+            chunk_region_to_tile=region_to_rasterise,
             crs=options["crs"],
+            classifications=options["lidar_classifications_to_read"],
+            elevation_range=options["elevation_range"],
+            z_type=options["lidar_z_type"],
+            point_cache=self.point_cache,
         )
 
-        # Load LiDAR points from pipeline
-        tile_points = pdal_pipeline.arrays[0]
-
-        # Define the raster/DEM dimensions - Align resolution (not BBox)
-        bounds = self.catchment_geometry.catchment.geometry.bounds
-        resolution = self.catchment_geometry.resolution
-        dim_x = numpy.arange(
-            numpy.ceil(bounds.minx.min() / resolution) * resolution,
-            numpy.ceil(bounds.maxx.max() / resolution) * resolution,
-            resolution,
-            dtype=options["raster_type"],
-        )
-        dim_y = numpy.arange(
-            numpy.ceil(bounds.maxy.max() / resolution) * resolution,
-            numpy.ceil(bounds.miny.min() / resolution) * resolution,
-            -resolution,
-            dtype=options["raster_type"],
-        )
-
-        # Create elevation raster
-        raster_values = self._elevation_over_tile(
-            dim_x=dim_x, dim_y=dim_y, tile_points=tile_points, options=options
-        )
-        elevation = raster_values.reshape((len(dim_y), len(dim_x)))
+        # Create this and any additional DEMs from the points
+        dems = []
+        for raw_dem, raw_options in zip(
+            [self] + additional_dems, [options] + additional_options
+        ):
+            # Define the raster/DEM dimensions - Align resolution (not BBox)
+            bounds = raw_dem.catchment_geometry.catchment.geometry.bounds
+            resolution = raw_dem.catchment_geometry.resolution
+            dim_x = numpy.arange(
+                numpy.ceil(bounds.minx.min() / resolution) * resolution,
+                numpy.ceil(bounds.maxx.max() / resolution) * resolution,
+                resolution,
+                dtype=raw_options["raster_type"],
+            )
+            dim_y = numpy.arange(
+                numpy.ceil(bounds.maxy.max() / resolution) * resolution,
+                numpy.ceil(bounds.miny.min() / resolution) * resolution,
+                -resolution,
+                dtype=raw_options["raster_type"],
+            )
 
-        # Create xarray
-        dem = self._create_data_set(
-            x=dim_x,
-            y=dim_y,
-            elevations={lidar_name: elevation},
-            metadata=metadata,
-        )
+            # Create elevation raster
+            raster_values = self._elevation_over_tile(
+                dim_x=dim_x, dim_y=dim_y, tile_points=tile_points, options=raw_options
+            )
+            elevation = raster_values.reshape((len(dim_y), len(dim_x)))
+
+            # Create xarray
+            dems.append(
+                raw_dem._create_data_set(
+                    x=dim_x,
+                    y=dim_y,
+                    elevations={lidar_name: elevation},
+                    metadata=metadata,
+                )
+            )
+        for additional_dem, dem in zip(additional_dems, dems[1:]):
+            additional_dem._dem = dem
 
-        return dem
+        return dems[0]
 
     def _elevation_over_tile(
         self,
@@ -2700,6 +3058,8 @@ class RoughnessDem(LidarBase):
         drop_offshore_lidar: dict,
         chunk_size: int | None = None,
         elevation_range: list = None,
+        kdtree_workers: int = 1,
+        point_cache: dict = None,
     ):
         """Setup base DEM to add future tiles too"""
 
@@ -2707,6 +3067,8 @@ class RoughnessDem(LidarBase):
             catchment_geometry=catchment_geometry,
             elevation_range=elevation_range,
             chunk_size=chunk_size,
+            kdtree_workers=kdtree_workers,
+            point_cache=point_cache,
         )
         self.logger = logging.getLogger(f"{__name__}.{self.__class__.__name__}")
 
@@ -2766,6 +3128,7 @@ class RoughnessDem(LidarBase):
         lidar_classifications_to_keep: list,
         metadata: dict,
         parameters: dict,
+        lidar_z_type: str = "float64",
     ):
         """Read in all LiDAR files and use the point cloud distribution,
         data_source layer, and hydrologiaclly conditioned elevations to
@@ -2786,6 +3149,8 @@ class RoughnessDem(LidarBase):
             `dataset_mapping` key if datasets (not a single LAZ file) included.
         parameters
             The roughness equation parameters.
+        lidar_z_type
+            The type to read LiDAR elevations as - 'float32' halves their memory.
         """
 
         # Check valid inputs
@@ -2799,6 +3164,8 @@ class RoughnessDem(LidarBase):
             "radius": self.catchment_geometry.resolution / numpy.sqrt(2),
             "crs": self.catchment_geometry.crs,
             "parameters": parameters,
+            "workers": self.kdtree_workers,
+            "lidar_z_type": lidar_z_type,
         }
 
         # Calculate roughness from LiDAR
@@ -2930,9 +3297,7 @@ class RoughnessDem(LidarBase):
             source_crs = lidar_datasets_info[dataset_name]["crs"]
 
             # create a map from tile name to tile file name
-            lidar_files_map = {
-                lidar_file.name: lidar_file for lidar_file in lidar_files
-            }
+            lidar_files_map = map_lidar_files(lidar_files)
 
             # Define the region to rasterise
             region_to_rasterise = (
@@ -2949,6 +3314,20 @@ class RoughnessDem(LidarBase):
                 region_to_rasterise=region_to_rasterise,
             )
 
+            # Define the region to tile and the LiDAR files within each chunk
+            chunk_regions = self._plan_chunk_regions(
+                region_to_rasterise=region_to_rasterise,
+                chunked_dim_x=chunked_dim_x,
+                chunked_dim_y=chunked_dim_y,
+                radius=raster_options["radius"],
+            )
+            chunks_lidar_files = select_lidar_files_in_chunks(
+                tile_index_extents=tile_index_extents,
+                tile_index_name_column=tile_index_name_column,
+                chunk_regions=chunk_regions,
+                lidar_files_map=lidar_files_map,
+            )
+
             # cycle through chunks - and collect in a delayed array
             self.logger.info(f"Running over dataset {dataset_name}")
             delayed_chunked_matrix = []
@@ -2957,21 +3336,10 @@ class RoughnessDem(LidarBase):
                 for j, dim_x in enumerate(chunked_dim_x):
                     self.logger.debug(f"\tChunk {[i, j]}")
 
-                    # Define the region to tile
-                    chunk_region_to_tile = self._define_chunk_region(
-                        region_to_rasterise=region_to_rasterise,
-                        dim_x=dim_x,
-                        dim_y=dim_y,
-                        radius=raster_options["radius"],
-                    )
-
-                    # Load in files into tiles
-                    chunk_lidar_files = select_lidar_files(
-                        tile_index_extents=tile_index_extents,
-                        tile_index_name_column=tile_index_name_column,
-                        chunk_region_to_tile=chunk_region_to_tile,
-                        lidar_files_map=lidar_files_map,
-                    )
+                    # Get the region to tile and files within it
+                    chunk_region_to_tile = chunk_regions.get((i, j))
+                    chunk_lidar_files = chunks_lidar_files.get((i, j), [])
+                    self.lidar_bytes_read += lidar_files_size(chunk_lidar_files)
 
                     # Return empty if no files
                     if len(chunk_lidar_files) == 0:
@@ -2992,6 +3360,12 @@ class RoughnessDem(LidarBase):
                         source_crs=source_crs,
                         chunk_region_to_tile=chunk_region_to_tile,
                         crs=raster_options["crs"],
+                        classifications=raster_options[
+                            "lidar_classifications_to_keep"
+                        ],
+                        elevation_range=raster_options["elevation_range"],
+                        z_type=raster_options["lidar_z_type"],
+                        point_cache=self.point_cache,
                     )
                     # Rasterise tiles
                     xy_ground = self._dem.z.sel(
@@ -3036,6 +3410,7 @@ class RoughnessDem(LidarBase):
         lidar_file = lidar_datasets_info[lidar_name]["file_paths"][0]
         source_crs = lidar_datasets_info[lidar_name]["crs"]
         self.logger.info(f"On LiDAR tile 1 of 1: {lidar_file}")
+        self.lidar_bytes_read += lidar_files_size([lidar_file])
 
         # Define the region to rasterise
         region_to_rasterise = (
@@ -3044,17 +3419,18 @@ class RoughnessDem(LidarBase):
             else self.catchment_geometry.catchment
         )
 
-        # Use PDAL to load in file
-        pdal_pipeline = read_file_with_pdal(
-            lidar_file,
+        # Use PDAL (or the point cache) to load in file
+        tile_array = load_tiles_in_chunk(
+            lidar_files=[lidar_file],
             source_crs=source_crs,
-            region_to_tile=region_to_rasterise,
+            chunk_region_to_tile=region_to_rasterise,
             crs=options["crs"],
+            classifications=options["lidar_classifications_to_keep"],
+            elevation_range=options["elevation_range"],
+            z_type=options["lidar_z_type"],
+            point_cache=self.point_cache,
         )
 
-        # Load LiDAR points from pipeline
-        tile_array = pdal_pipeline.arrays[0]
-
         # Get the locations to rasterise
         dim_x = self._dem.x.data
         dim_y = self._dem.y.data
@@ -3191,20 +3567,215 @@ class RoughnessDem(LidarBase):
         return self._dem
 
 
+def read_las_header(lidar_file: str | pathlib.Path) -> dict:
+    """Read the public header block of a LAS or LAZ file (the header of a LAZ file is
+    not compressed). Return the LAS version, point format, number of points and the
+    bounds of the points. Much faster than reading the file with PDAL."""
+
+    with open(lidar_file, "rb") as file_pointer:
+        header = file_pointer.read(LAS_HEADER_SIZE)
+    if len(header) < 227 or header[:4] != b"LASF":
+        raise ValueError(f"{lidar_file} is not a valid LAS/LAZ file.")
+    version_major, version_minor = struct.unpack_from("<BB", header, 24)
+    point_format = struct.unpack_from("<B", header, 104)[0] & 0x3F  # LAZ bits
+    number_of_points = struct.unpack_from("<I", header, 107)[0]
+    if (version_major, version_minor) >= (1, 4) and len(header) >= 255:
+        # Legacy point count is zero for point formats above 5 or 2^32 points
+        number_of_points = max(
+            number_of_points, struct.unpack_from("<Q", header, 247)[0]
+        )
+    max_x, min_x, max_y, min_y, max_z, min_z = struct.unpack_from("<6d", header, 179)
+    return {
+        "version": f"{version_major}.{version_minor}",
+        "point_format": point_format,
+        "number_of_points": number_of_points,
+        "bounds": {
+            "minx": min_x,
+            "miny": min_y,
+            "minz": min_z,
+            "maxx": max_x,
+            "maxy": max_y,
+            "maxz": max_z,
+        },
+    }
+
+
+def estimate_point_density(lidar_files: list) -> float:
+    """Estimate the point density (points per unit area in the LiDAR CRS) of a set of
+    LAS/LAZ files from their headers. Files that can't be read are ignored."""
+
+    logger = logging.getLogger(__name__)
+    number_of_points = 0
+    area = 0
+    for lidar_file in lidar_files:
+        try:
+            header = read_point_cloud_header(lidar_file)
+        except (ValueError, OSError) as caught_exception:
+            logger.warning(
+                f"Ignoring {lidar_file} when estimating the point density: "
+                f"{caught_exception}"
+            )
+            continue
+        bounds = header["bounds"]
+        number_of_points += header["number_of_points"]
+        area += (bounds["maxx"] - bounds["minx"]) * (bounds["maxy"] - bounds["miny"])
+    return number_of_points / area if area > 0 else 0
+
+
+def estimate_chunk_memory(
+    chunk_size: int, resolution: float, radius: float, point_density: float
+) -> int:
+    """Estimate the peak memory in bytes of rasterising a chunk of LiDAR. This
+    includes the points within the chunk and its buffer, the KDTree and the neighbour
+    lists and output values of each pixel."""
+
+    chunk_length = chunk_size * resolution + 2 * radius
+    number_of_points = point_density * chunk_length**2
+    neighbours_per_pixel = point_density * numpy.pi * radius**2
+    pixel_memory = PIXEL_MEMORY + neighbours_per_pixel * NEIGHBOUR_MEMORY
+    return int(number_of_points * POINT_MEMORY + chunk_size**2 * pixel_memory)
+
+
+def read_ept_header(ept_file: str | pathlib.Path) -> dict:
+    """Read the 'ept.json' metadata of an Entwine Point Tile (EPT) dataset. Return
+    the same information as read_las_header."""
+
+    with open(ept_file, "r") as file_pointer:
+        ept = json.load(file_pointer)
+    min_x, min_y, min_z, max_x, max_y, max_z = ept["boundsConformance"]
+    return {
+        "version": ept.get("version", None),
+        "point_format": None,
+        "number_of_points": ept["points"],
+        "bounds": {
+            "minx": min_x,
+            "miny": min_y,
+            "minz": min_z,
+            "maxx": max_x,
+            "maxy": max_y,
+            "maxz": max_z,
+        },
+    }
+
+
+def read_point_cloud_header(lidar_file: str | pathlib.Path) -> dict:
+    """Read the header of a LAS, LAZ, COPC file or an EPT dataset."""
+
+    if is_ept(lidar_file):
+        return read_ept_header(lidar_file)
+    return read_las_header(lidar_file)
+
+
+def is_ept(lidar_file: str | pathlib.Path) -> bool:
+    """Return True if the file is the 'ept.json' of an EPT dataset."""
+
+    return str(lidar_file).endswith("ept.json")
+
+
+def is_copc(lidar_file: str | pathlib.Path) -> bool:
+    """Return True if the file is a Cloud Optimized Point Cloud (COPC)."""
+
+    return str(lidar_file).lower().endswith(".copc.laz")
+
+
+def convert_to_copc(
+    lidar_files: list, output_folder: str | pathlib.Path
+) -> typing.List[pathlib.Path]:
+    """Convert LAS/LAZ files to COPC files in the output folder so only the octree
+    nodes within each chunk are decoded when read. Files already converted (and
+    newer than their source) are not converted again. Return the COPC files."""
+
+    logger = logging.getLogger(__name__)
+    output_folder = pathlib.Path(output_folder)
+    output_folder.mkdir(parents=True, exist_ok=True)
+    copc_files = []
+    for lidar_file in lidar_files:
+        lidar_file = pathlib.Path(lidar_file)
+        if is_copc(lidar_file):
+            copc_files.append(lidar_file)
+            continue
+        copc_file = output_folder / f"{lidar_file.stem}.copc.laz"
+        if (
+            not copc_file.exists()
+            or copc_file.stat().st_mtime < lidar_file.stat().st_mtime
+        ):
+            logger.info(f"Converting {lidar_file} to COPC {copc_file}")
+            pdal_pipeline = pdal.Pipeline(
+                json.dumps(
+                    [
+                        {"type": "readers.las", "filename": str(lidar_file)},
+                        {"type": "writers.copc", "filename": str(copc_file)},
+                    ]
+                )
+            )
+            pdal_pipeline.execute()
+        copc_files.append(copc_file)
+    return copc_files
+
+
+def lidar_files_size(lidar_files: list) -> int:
+    """Return the total size in bytes of the LiDAR files that exist locally."""
+
+    return sum(
+        pathlib.Path(lidar_file).stat().st_size
+        for lidar_file in lidar_files
+        if pathlib.Path(lidar_file).is_file()
+    )
+
+
 def read_file_with_pdal(
     lidar_file: str | pathlib.Path,
     region_to_tile: geopandas.GeoDataFrame,
     crs: dict,
     source_crs: dict = None,
+    classifications: list = None,
+    elevation_range: list = None,
 ):
-    """Read a tile file in using PDAL with input and output CRS specified."""
+    """Read a tile file in using PDAL with input and output CRS specified.
+
+    COPC files and EPT datasets are spatially indexed - only the points within the
+    bounds of the region_to_tile are decoded. Other LAS/LAZ files are read in full
+    before cropping.
+
+    Points are optionally filtered by classification before reprojection so
+    dropped points are never reprojected. The elevation range is in the output
+    vertical datum so is applied after any reprojection. Reprojection is skipped
+    if the source CRS is specified and matches the output CRS."""
 
     # Define instructions for loading in LiDAR
-    pdal_pipeline_instructions = [{"type": "readers.las", "filename": str(lidar_file)}]
+    if is_ept(lidar_file):
+        reader = {"type": "readers.ept", "filename": str(lidar_file)}
+    elif is_copc(lidar_file):
+        reader = {"type": "readers.copc", "filename": str(lidar_file)}
+    else:
+        reader = {"type": "readers.las", "filename": str(lidar_file)}
+    if reader["type"] != "readers.las" and region_to_tile is not None:
+        # Only read the octree nodes within the region - reprojected by PDAL
+        minx, miny, maxx, maxy = region_to_tile.total_bounds
+        bounds = f"([{minx}, {maxx}], [{miny}, {maxy}])"
+        reader["bounds"] = f"{bounds}/EPSG:{crs['horizontal']}"
+    pdal_pipeline_instructions = [reader]
+
+    # Drop unwanted classes before reprojection
+    if classifications is not None:
+        pdal_pipeline_instructions.append(
+            {
+                "type": "filters.range",
+                "limits": ",".join(
+                    f"Classification[{classification}:{classification}]"
+                    for classification in classifications
+                ),
+            }
+        )
 
     # Specify reprojection - if a source_crs is specified use this to define the
     # 'in_srs'
-    if source_crs is None:
+    if source_crs is not None and (
+        source_crs["horizontal"] == crs["horizontal"]
+        and source_crs["vertical"] == crs["vertical"]
+    ):
+        pass  # Already in the output CRS
+    elif source_crs is None:
         pdal_pipeline_instructions.append(
             {
                 "type": "filters.reprojection",
@@ -3220,6 +3791,14 @@ def read_file_with_pdal(
                 "out_srs": f"EPSG:{crs['horizontal']}+" f"{crs['vertical']}",
             }
         )
+    # Optionally filter to within the elevation range
+    if elevation_range is not None:
+        pdal_pipeline_instructions.append(
+            {
+                "type": "filters.range",
+                "limits": f"Z[{elevation_range[0]}:{elevation_range[1]}]",
+            }
+        )
     # Add instructions for clip within either the catchment, or the land and foreshore
     if region_to_tile is not None:
         pdal_pipeline_instructions.append(
@@ -3257,7 +3836,9 @@ def roughness_from_points(
     xy_in[:, 1] = point_cloud["Y"]
 
     tree = scipy.spatial.KDTree(xy_in, leafsize=leaf_size)  # build the tree
-    tree_index_list = tree.query_ball_point(xy_out, r=options["radius"], eps=eps)
+    tree_index_list = tree.query_ball_point(
+        xy_out, r=options["radius"], eps=eps, workers=options["workers"]
+    )
     z_out = numpy.zeros(len(xy_out), dtype=options["raster_type"])
 
     for i, (near_indicies, ground) in enumerate(zip(tree_index_list, xy_ground)):
@@ -3291,10 +3872,11 @@ def elevation_from_points(
 
     tree = scipy.spatial.KDTree(xy_in, leafsize=leaf_size)  # build the tree
     tree_index_list = tree.query_ball_point(
-        xy_out, r=options["radius"], eps=eps
-    )  # , eps=0.2)
+        xy_out, r=options["radius"], eps=eps, workers=options["workers"]
+    )
     z_out = numpy.zeros(len(xy_out), dtype=options["raster_type"])
 
+    warning_counts = collections.Counter()
     for i, (near_indices, point) in enumerate(zip(tree_index_list, xy_out)):
         near_points = tree.data[near_indices]
         near_z = point_cloud["Z"][near_indices]
@@ -3304,7 +3886,13 @@ def elevation_from_points(
             near_points=near_points,
             point=point,
             options=options,
+            warning_counts=warning_counts,
         )
+    log_warning_counts(
+        warning_counts=warning_counts,
+        logger=logging.getLogger(__name__),
+        description=f"elevation_from_points over {len(xy_out)} pixels",
+    )
     return z_out
 
 
@@ -3340,7 +3928,9 @@ def elevation_from_nearest_points(
     xy_in[:, 0] = point_cloud["X"]
     xy_in[:, 1] = point_cloud["Y"]
     tree = scipy.spatial.KDTree(xy_in, leafsize=leaf_size)  # build the tree
-    (tree_distance_list, tree_index_list) = tree.query(xy_out, k=k, eps=eps)
+    (tree_distance_list, tree_index_list) = tree.query(
+        xy_out, k=k, eps=eps, workers=options["workers"]
+    )
 
     if options["use_edge"]:
         xy_in = numpy.empty((len(edge_point_cloud), 2))
@@ -3348,11 +3938,12 @@ def elevation_from_nearest_points(
         xy_in[:, 1] = edge_point_cloud["Y"]
         edge_tree = scipy.spatial.KDTree(xy_in, leafsize=leaf_size)  # build the tree
         (edge_tree_distance_list, edge_tree_index_list) = edge_tree.query(
-            xy_out, k=k, eps=eps
+            xy_out, k=k, eps=eps, workers=options["workers"]
         )
 
     z_out = numpy.zeros(len(xy_out), dtype=options["raster_type"])
 
+    warning_counts = collections.Counter()
     for i, point in enumerate(xy_out):
         near_indices = tree_index_list[i]
         near_z = point_cloud["Z"][near_indices]
@@ -3372,7 +3963,13 @@ def elevation_from_nearest_points(
             near_points=near_points,
             point=point,
             options=options,
+            warning_counts=warning_counts,
         )
+    log_warning_counts(
+        warning_counts=warning_counts,
+        logger=logger,
+        description=f"elevation_from_nearest_points over {len(xy_out)} pixels",
+    )
 
     return z_out
 
@@ -3382,13 +3979,13 @@ def point_elevation(
     near_points: numpy.ndarray,
     point: numpy.ndarray,
     options: dict,
+    warning_counts: collections.Counter = None,
 ) -> float:
     """Calculate DEM elevation values at the specified locations using the selected
     approach. Options include: mean, median, and inverse distance weighing (IDW). This
-    implementation is based on the scipy.spatial.KDTree"""
+    implementation is based on the scipy.spatial.KDTree
 
-    logger = logging.getLogger(__name__)
-    logger.setLevel(logging.DEBUG)
+    Any warnings are counted in warning_counts if specified rather than logged."""
 
     if len(near_z) == 0:  # Set NaN if no values in search region
         z_out = numpy.nan
@@ -3410,6 +4007,7 @@ def point_elevation(
                 point=point,
                 strict=options["strict"],
                 method=options["method"],
+                warning_counts=warning_counts,
             )
         elif options["method"] == "rbf":
             z_out = calculate_rbf(
@@ -3417,6 +4015,7 @@ def point_elevation(
                 near_z=near_z,
                 point=point,
                 kernel=options["kernel"],
+                warning_counts=warning_counts,
             )
         elif options["method"] == "min":
             z_out = numpy.min(near_z)
@@ -3464,11 +4063,12 @@ def calculate_interpolate_griddata(
     point: numpy.ndarray,
     strict: bool,
     method: str,
+    warning_counts: collections.Counter = None,
 ):
     """Calculate linear interpolation of the 'near_indices' points. Take the straight
-    mean if the points are co-linear or too few for linear interpolation."""
-    logger = logging.getLogger(__name__)
-    logger.setLevel(logging.DEBUG)
+    mean if the points are co-linear or too few for linear interpolation.
+
+    Any warnings are counted in warning_counts if specified rather than logged."""
     if len(near_z) >= 3:  # There are enough points for a linear interpolation
         try:
             value = scipy.interpolate.griddata(
@@ -3478,9 +4078,10 @@ def calculate_interpolate_griddata(
                 method=method,
             )[0]
         except (scipy.spatial.QhullError, Exception) as caught_exception:
-            logger.warning(
-                f"Exception {caught_exception} during "
-                "linear interpolation. Set to NaN."
+            warn(
+                f"{type(caught_exception).__name__} during {method} interpolation. "
+                "Set to NaN.",
+                warning_counts,
             )
             value = numpy.nan
 
@@ -3494,11 +4095,12 @@ def calculate_interpolate_griddata(
     else:
         value = numpy.nan
     if numpy.isnan(value) and len(near_z) > 0 and strict:
-        logger.warning(
-            "NaN - this will occur if colinear points or outside convex hull"
+        warn(
+            "NaN - this will occur if colinear points or outside convex hull",
+            warning_counts,
         )
     elif numpy.isnan(value) and len(near_z) > 0 and not strict:
-        logger.warning("Was NaN - will estimate as distance weighted mean")
+        warn("Was NaN - will estimate as distance weighted mean", warning_counts)
         distance_vectors = point - near_points
         distances = numpy.sqrt((distance_vectors**2).sum(axis=1))
         value = (near_z / distances).sum(axis=0) / (1 / distances).sum(axis=0)
@@ -3506,15 +4108,22 @@ def calculate_interpolate_griddata(
 
 
 def calculate_rbf(
-    near_points: numpy.ndarray, near_z: numpy.ndarray, point: numpy.ndarray, kernel: str
+    near_points: numpy.ndarray,
+    near_z: numpy.ndarray,
+    point: numpy.ndarray,
+    kernel: str,
+    warning_counts: collections.Counter = None,
 ):
-    logger = logging.getLogger(__name__)
-    logger.setLevel(logging.DEBUG)
+    """Calculate the RBF interpolation of the 'near_indices' points. Fall back to
+    cubic interpolation if there are too few points or the RBF fails.
+
+    Any warnings are counted in warning_counts if specified rather than logged."""
     if len(near_z) >= 3:
         if len(near_z) < RBF_CACHE_SIZE:
-            logging.warning(
-                "Using RBFInterpolator 'neighbors' option "
-                f"as {len(near_z)} points nearby"
+            warn(
+                "Using RBFInterpolator 'neighbors' option as fewer than "
+                f"{RBF_CACHE_SIZE} points nearby",
+                warning_counts,
             )
         try:
             rbf_function = scipy.interpolate.RBFInterpolator(
@@ -3526,9 +4135,10 @@ def calculate_rbf(
             )
             value = rbf_function([point])
         except (ValueError, Exception) as caught_exception:
-            logger.warning(
-                f"Exception {caught_exception} during "
-                "RBF interpolation. Apply cubic."
+            warn(
+                f"{type(caught_exception).__name__} during RBF interpolation. "
+                "Apply cubic.",
+                warning_counts,
             )
             value = calculate_interpolate_griddata(
                 near_points=near_points,
@@ -3536,12 +4146,13 @@ def calculate_rbf(
                 point=point,
                 strict=True,
                 method="cubic",
+                warning_counts=warning_counts,
             )
     else:
-        logger.warning(
-            "Too many or few points for RBF "
-            f"interpolation: {len(near_z)}. "
-            "Instead applying cubic interpolation."
+        warn(
+            "Too few points for RBF interpolation. Instead applying cubic "
+            "interpolation.",
+            warning_counts,
         )
         value = calculate_interpolate_griddata(
             near_points=near_points,
@@ -3549,30 +4160,375 @@ def calculate_rbf(
             point=point,
             strict=True,
             method="cubic",
+            warning_counts=warning_counts,
         )
     return value
 
 
-def select_lidar_files(
+def warn(message: str, warning_counts: collections.Counter = None):
+    """Count the warning message if warning_counts is specified, otherwise log it.
+    Used on the per pixel hot path where warnings are aggregated per chunk."""
+
+    if warning_counts is not None:
+        warning_counts[message] += 1
+    else:
+        logging.getLogger(__name__).warning(message)
+
+
+def log_warning_counts(
+    warning_counts: collections.Counter,
+    logger: logging.Logger,
+    description: str,
+):
+    """Log the aggregated warnings of a chunk as a single message. If running on a
+    Dask worker also log the counts as an event so they can be summarised by stage
+    on the client."""
+
+    if len(warning_counts) == 0:
+        return
+    summary = "; ".join(
+        f"{count} x {message}" for message, count in warning_counts.most_common()
+    )
+    logger.warning(f"Warnings in {description}: {summary}")
+    try:
+        worker = distributed.get_worker()
+    except ValueError:  # Not running on a Dask worker
+        return
+    worker.log_event(performance.WARNING_EVENT_TOPIC, dict(warning_counts))
+
+
+@functools.lru_cache(maxsize=TILE_INDEX_CACHE_SIZE)
+def read_tile_index(
+    tile_index_file: str, modified_time: float, crs: int
+) -> geopandas.GeoDataFrame:
+    """Read in a LiDAR tile index file and project it into the specified CRS. The
+    result is cached by file name and modification time so the (often zipped)
+    tile index is only parsed once. Copy before modifying the returned value."""
+    tile_index_extents = geopandas.read_file(tile_index_file)
+    return tile_index_extents.to_crs(crs)
+
+
+def build_tile_index(
+    lidar_files: list, tile_index_file: str | pathlib.Path, crs: int
+) -> pathlib.Path:
+    """Build a tile index from the bounds in the LAS/LAZ file headers and save it to
+    the tile_index_file (e.g. a GeoPackage) with a 'filename' column of the resolved
+    file paths. The headers are read in parallel. The tile index is cached - and
+    only rebuilt if the LiDAR files or CRS change. Files that can't be read are left
+    out.
+
+    Parameters
+    ----------
+
+    lidar_files
+        The LAS/LAZ files to index.
+    tile_index_file
+        The file to save the tile index to.
+    crs
+        The horizontal CRS of the LiDAR files - this isn't read from the headers.
+    """
+
+    logger = logging.getLogger(__name__)
+    lidar_files = [pathlib.Path(lidar_file).resolve() for lidar_file in lidar_files]
+    tile_index_file = pathlib.Path(tile_index_file)
+
+    # Reuse the cached tile index if it's up to date with the same files and CRS
+    if tile_index_file.exists():
+        cached_tile_index = geopandas.read_file(tile_index_file)
+        if (
+            set(cached_tile_index["filename"])
+            == {str(lidar_file) for lidar_file in lidar_files}
+            and cached_tile_index.crs == crs
+            and tile_index_file.stat().st_mtime
+            >= max(lidar_file.stat().st_mtime for lidar_file in lidar_files)
+        ):
+            logger.info(f"Using the cached tile index {tile_index_file}")
+            return tile_index_file
+
+    def read_bounds(lidar_file: pathlib.Path):
+        try:
+            return read_point_cloud_header(lidar_file)["bounds"]
+        except (ValueError, OSError) as caught_exception:
+            logger.warning(
+                f"Leaving {lidar_file} out of the tile index: {caught_exception}"
+            )
+            return None
+
+    logger.info(f"Building a tile index of {len(lidar_files)} LiDAR files.")
+    with concurrent.futures.ThreadPoolExecutor(
+        max_workers=TILE_INDEX_THREADS
+    ) as executor:
+        file_bounds = list(executor.map(read_bounds, lidar_files))
+    tile_bounds = [bounds for bounds in file_bounds if bounds is not None]
+    tile_index = geopandas.GeoDataFrame(
+        {
+            "filename": [
+                str(lidar_file)
+                for lidar_file, bounds in zip(lidar_files, file_bounds)
+                if bounds is not None
+            ]
+        },
+        geometry=shapely.box(
+            [bounds["minx"] for bounds in tile_bounds],
+            [bounds["miny"] for bounds in tile_bounds],
+            [bounds["maxx"] for bounds in tile_bounds],
+            [bounds["maxy"] for bounds in tile_bounds],
+        ),
+        crs=crs,
+    )
+    tile_index_file.parent.mkdir(parents=True, exist_ok=True)
+    tile_index.to_file(tile_index_file)
+    return tile_index_file
+
+
+def map_lidar_files(lidar_files: list) -> typing.Dict[str, pathlib.Path]:
+    """Return a map from the names in a tile index to the LiDAR files. Tile indexes
+    built from the file headers name files by their resolved path, so files with the
+    same name in different folders are distinct. Others name files by file name."""
+
+    lidar_files_map = {}
+    for lidar_file in lidar_files:
+        lidar_file = pathlib.Path(lidar_file)
+        lidar_files_map[lidar_file.name] = lidar_file
+        lidar_files_map[str(lidar_file.resolve())] = lidar_file
+    return lidar_files_map
+
+
+def select_lidar_files_in_chunks(
     tile_index_extents: geopandas.GeoDataFrame,
     tile_index_name_column: str,
-    chunk_region_to_tile: geopandas.GeoDataFrame,
+    chunk_regions: typing.Dict[tuple, geopandas.GeoDataFrame],
     lidar_files_map: typing.Dict[str, pathlib.Path],
-) -> typing.List[pathlib.Path]:
-    if chunk_region_to_tile.empty:
-        return []
-    # clip the tile indices to only include those within the chunk region
-    chunk_tile_index_extents = geopandas.sjoin(
-        chunk_region_to_tile, tile_index_extents.drop(columns=["index_right"])
+) -> typing.Dict[tuple, typing.List[pathlib.Path]]:
+    """Select the LiDAR files within each chunk region using a single STRtree query
+    of the tile index. Returns a dictionary keyed by chunk index of the LiDAR files
+    intersecting that chunk."""
+    if len(chunk_regions) == 0 or len(tile_index_extents) == 0:
+        return {}
+
+    # Flatten the chunk regions recording which chunk each geometry belongs to
+    chunk_keys = list(chunk_regions.keys())
+    geometries = numpy.concatenate(
+        [numpy.asarray(chunk_regions[key].geometry.values) for key in chunk_keys]
+    )
+    geometry_chunks = numpy.repeat(
+        numpy.arange(len(chunk_keys)), [len(chunk_regions[key]) for key in chunk_keys]
     )
 
-    # get the LiDAR file with the tile_index_name
-    filtered_lidar_files = [
-        lidar_files_map[tile_index_name]
-        for tile_index_name in chunk_tile_index_extents[tile_index_name_column]
+    # Query all chunk regions against the tile index at once
+    tree = shapely.STRtree(numpy.asarray(tile_index_extents.geometry.values))
+    geometry_indices, tile_indices = tree.query(geometries, predicate="intersects")
+    tile_names = tile_index_extents[tile_index_name_column].to_numpy()
+
+    # Group the unique tiles by chunk
+    pair_chunks = geometry_chunks[geometry_indices]
+    order = numpy.lexsort((tile_indices, pair_chunks))
+    pair_chunks, tile_indices = pair_chunks[order], tile_indices[order]
+    unique_chunks, starts = numpy.unique(pair_chunks, return_index=True)
+    chunks_lidar_files = {}
+    for chunk_index, chunk_tiles in zip(
+        unique_chunks, numpy.split(tile_indices, starts[1:])
+    ):
+        chunks_lidar_files[chunk_keys[chunk_index]] = [
+            lidar_files_map[tile_name]
+            for tile_name in tile_names[numpy.unique(chunk_tiles)]
+        ]
+    return chunks_lidar_files
+
+
+def select_point_dimensions(points: numpy.ndarray, z_type: str = None) -> numpy.ndarray:
+    """Return only the X, Y, Z and Classification dimensions of a PDAL point array
+    so other dimensions (i.e. intensity, GPS time, RGB) aren't kept in memory or
+    passed between Dask workers. Optionally change the type of Z."""
+
+    dtype = [
+        ("X", points.dtype["X"]),
+        ("Y", points.dtype["Y"]),
+        ("Z", z_type if z_type is not None else points.dtype["Z"]),
+        ("Classification", points.dtype["Classification"]),
     ]
+    selected_points = numpy.empty(len(points), dtype=dtype)
+    for name, _ in dtype:
+        selected_points[name] = points[name]
+    return selected_points
+
+
+def point_cache_folder(
+    lidar_file: str | pathlib.Path, source_crs: dict, crs: dict, point_cache: dict
+) -> pathlib.Path:
+    """Return the point cache folder of a LiDAR file. The cache is keyed by the
+    file path, its modified time and the source and output CRS."""
+
+    lidar_file = pathlib.Path(lidar_file).resolve()
+    key = (
+        f"{lidar_file}|{lidar_file.stat().st_mtime_ns}|"
+        f"{source_crs}|{crs['horizontal']}+{crs['vertical']}"
+    )
+    name = f"{lidar_file.stem}_{hashlib.sha1(key.encode()).hexdigest()[:16]}"
+    return pathlib.Path(point_cache["folder"]) / name
+
+
+def cache_points(
+    lidar_file: str | pathlib.Path, source_crs: dict, crs: dict, point_cache: dict
+) -> pathlib.Path:
+    """Read, reproject and store all points of a LiDAR file in the point cache if
+    not already cached. Points are sorted by Y and stored as one .npy file per
+    dimension so they can be memory mapped and sliced by Y. Return the cache folder.
+    """
+
+    logger = logging.getLogger(__name__)
+    cache_folder = point_cache_folder(
+        lidar_file=lidar_file, source_crs=source_crs, crs=crs, point_cache=point_cache
+    )
+    if touch_point_cache_folder(cache_folder):
+        return cache_folder
+    # Only one task at a time reads a file into the cache - others then reuse it
+    with point_cache_lock(cache_folder):
+        if touch_point_cache_folder(cache_folder):
+            return cache_folder
+        logger.debug(f"Adding {lidar_file} to the point cache {cache_folder}")
+        pdal_pipeline = read_file_with_pdal(
+            lidar_file=lidar_file, region_to_tile=None, crs=crs, source_crs=source_crs
+        )
+        points = select_point_dimensions(pdal_pipeline.arrays[0])
+        points = points[numpy.argsort(points["Y"], kind="stable")]
+        # Write to a temporary folder then rename so other workers never see part
+        cache_folder.parent.mkdir(parents=True, exist_ok=True)
+        temporary_folder = pathlib.Path(
+            tempfile.mkdtemp(dir=cache_folder.parent, suffix=".tmp")
+        )
+        for name in POINT_CACHE_DIMENSIONS:
+            numpy.save(temporary_folder / f"{name}.npy", points[name])
+        try:
+            temporary_folder.rename(cache_folder)
+        except OSError:  # Cached by another process in the meantime
+            shutil.rmtree(temporary_folder, ignore_errors=True)
+    return cache_folder
+
+
+def touch_point_cache_folder(cache_folder: pathlib.Path) -> bool:
+    """Mark a point cache folder as recently used for eviction. Return False if it
+    isn't (or is no longer) in the cache."""
 
-    return filtered_lidar_files
+    try:
+        os.utime(cache_folder)
+    except FileNotFoundError:
+        return False
+    return True
+
+
+def point_cache_lock(cache_folder: pathlib.Path):
+    """Return a lock on filling a point cache folder that is shared by all tasks of
+    the Dask cluster. Without a Dask client there is nothing to lock against."""
+
+    try:
+        distributed.get_client()
+    except ValueError:  # Not running with a Dask client
+        return contextlib.nullcontext()
+    return distributed.Lock(f"point_cache-{cache_folder.name}")
+
+
+def evict_from_point_cache(point_cache: dict):
+    """Remove the least recently used files from the point cache until it is no
+    larger than its 'max_bytes'. Run once at the end of each stage on the client.
+    Folders removed in the meantime (i.e. by another run) are ignored."""
+
+    logger = logging.getLogger(__name__)
+    try:
+        cache_folders = [
+            folder
+            for folder in pathlib.Path(point_cache["folder"]).iterdir()
+            if folder.is_dir() and folder.suffix != ".tmp"
+        ]
+    except FileNotFoundError:  # Nothing cached yet
+        return
+    sizes, modified_times = {}, {}
+    for folder in cache_folders:
+        try:
+            sizes[folder] = sum(file.stat().st_size for file in folder.iterdir())
+            modified_times[folder] = folder.stat().st_mtime
+        except FileNotFoundError:  # Already evicted
+            sizes.pop(folder, None)
+    total_size = sum(sizes.values())
+    for folder in sorted(modified_times, key=modified_times.get):
+        if total_size <= point_cache["max_bytes"]:
+            break
+        logger.debug(f"Evicting {folder} from the point cache")
+        shutil.rmtree(folder, ignore_errors=True)
+        total_size -= sizes[folder]
+
+
+def load_cached_points(
+    lidar_file: str | pathlib.Path, source_crs: dict, crs: dict, point_cache: dict
+) -> typing.Dict[str, numpy.ndarray]:
+    """Return the memory mapped dimensions of a LiDAR file in the point cache -
+    caching the file first if needed."""
+
+    cache_folder = cache_points(
+        lidar_file=lidar_file, source_crs=source_crs, crs=crs, point_cache=point_cache
+    )
+    return {
+        name: numpy.load(cache_folder / f"{name}.npy", mmap_mode="r")
+        for name in POINT_CACHE_DIMENSIONS
+    }
+
+
+def read_cached_points(
+    lidar_file: str | pathlib.Path,
+    source_crs: dict,
+    region_to_tile: geopandas.GeoDataFrame,
+    crs: dict,
+    point_cache: dict,
+    classifications: list = None,
+    elevation_range: list = None,
+    z_type: str = None,
+) -> numpy.ndarray:
+    """Read the points of a LiDAR file within a region from the point cache -
+    caching the file first if needed. Only the Y range of the region is read from
+    the memory mapped arrays before the points are clipped and filtered."""
+
+    try:
+        columns = load_cached_points(
+            lidar_file=lidar_file,
+            source_crs=source_crs,
+            crs=crs,
+            point_cache=point_cache,
+        )
+    except FileNotFoundError:  # Evicted while loading - cache again
+        columns = load_cached_points(
+            lidar_file=lidar_file,
+            source_crs=source_crs,
+            crs=crs,
+            point_cache=point_cache,
+        )
+    start, end = 0, len(columns["Y"])
+    if region_to_tile is not None:
+        minx, miny, maxx, maxy = region_to_tile.total_bounds
+        start = numpy.searchsorted(columns["Y"], miny, side="left")
+        end = numpy.searchsorted(columns["Y"], maxy, side="right")
+    columns = {
+        name: numpy.asarray(column[start:end]) for name, column in columns.items()
+    }
+    mask = numpy.ones(len(columns["Y"]), dtype=bool)
+    if region_to_tile is not None:
+        mask &= (columns["X"] >= minx) & (columns["X"] <= maxx)
+        mask[mask] = shapely.intersects_xy(
+            region_to_tile.loc[0].geometry, columns["X"][mask], columns["Y"][mask]
+        )
+    if classifications is not None:
+        mask &= numpy.isin(columns["Classification"], classifications)
+    if elevation_range is not None:
+        mask &= (columns["Z"] >= elevation_range[0]) & (
+            columns["Z"] <= elevation_range[1]
+        )
+    dtype = [
+        (name, z_type if name == "Z" and z_type is not None else column.dtype)
+        for name, column in columns.items()
+    ]
+    points = numpy.empty(int(mask.sum()), dtype=dtype)
+    for name, column in columns.items():
+        points[name] = column[mask]
+    return points
 
 
 def load_tiles_in_chunk(
@@ -3580,9 +4536,16 @@ def load_tiles_in_chunk(
     source_crs: dict,
     chunk_region_to_tile: geopandas.GeoDataFrame,
     crs: dict,
+    classifications: list = None,
+    elevation_range: list = None,
+    z_type: str = None,
+    point_cache: dict = None,
 ):
     """Read in all LiDAR files within the chunked region - clipped to within
-    the region within which to rasterise."""
+    the region within which to rasterise. Optionally only keep the specified
+    classifications and elevation range, and only the X, Y, Z and Classification
+    dimensions (with Z as z_type). If a point_cache is specified LAS/LAZ/COPC files
+    are read through it."""
 
     logger = logging.getLogger(__name__)
     logger.setLevel(logging.DEBUG)
@@ -3600,14 +4563,32 @@ def load_tiles_in_chunk(
         for lidar_file in lidar_files:
             logger.debug(f"Loading in file {lidar_file}")
 
-            # read in the LiDAR file
+            # read in the LiDAR file - EPT datasets are too large to cache
+            if point_cache is not None and not is_ept(lidar_file):
+                lidar_points.append(
+                    read_cached_points(
+                        lidar_file=lidar_file,
+                        source_crs=source_crs,
+                        region_to_tile=chunk_region_to_tile,
+                        crs=crs,
+                        point_cache=point_cache,
+                        classifications=classifications,
+                        elevation_range=elevation_range,
+                        z_type=z_type,
+                    )
+                )
+                continue
             pdal_pipeline = read_file_with_pdal(
                 lidar_file=lidar_file,
                 region_to_tile=chunk_region_to_tile,
                 source_crs=source_crs,
                 crs=crs,
+                classifications=classifications,
+                elevation_range=elevation_range,
+            )
+            lidar_points.append(
+                select_point_dimensions(pdal_pipeline.arrays[0], z_type=z_type)
             )
-            lidar_points.append(pdal_pipeline.arrays[0])
     if len(lidar_points) > 0:
         lidar_points = numpy.concatenate(lidar_points)
     return lidar_points
@@ -9,8 +9,135 @@ import numpy
 import pathlib
 import typing
 import logging
+import hashlib
+import json
 
 RASTER_TYPE = numpy.float32
+# Read vectors with the pyogrio engine using Arrow
+READ_ENGINE_OPTIONS = {"engine": "pyogrio", "use_arrow": True}
+
+# The file suffix of each format intermediate vector products can be written in
+VECTOR_FORMATS = {"parquet": ".parquet", "geojson": ".geojson"}
+DEFAULT_VECTOR_FORMAT = "parquet"
+
+
+def existing_vector_file(file: typing.Union[str, pathlib.Path]) -> pathlib.Path:
+    """Return the most recently written of the file and the file with the suffix of
+    each other intermediate vector format, so instructions naming the outputs of an
+    earlier stage don't depend on the format they were written in, and a stale
+    output in another format isn't read. Return the file if none exist."""
+
+    file = pathlib.Path(file)
+    if file.suffix not in VECTOR_FORMATS.values():
+        return file
+    candidates = [
+        file.with_suffix(suffix)
+        for suffix in VECTOR_FORMATS.values()
+        if file.with_suffix(suffix).is_file()
+    ]
+    if len(candidates) == 0:
+        return file
+    return max(candidates, key=lambda candidate: candidate.stat().st_mtime_ns)
+
+
+def write_vector(
+    vector: typing.Union[geopandas.GeoDataFrame, geopandas.GeoSeries],
+    file: typing.Union[str, pathlib.Path],
+):
+    """Write a vector as GeoParquet if the file has a '.parquet' suffix, otherwise
+    with the driver matching the file suffix (i.e. GeoJSON). As with `to_file` the
+    index is written as columns if it is named or not integer."""
+
+    file = pathlib.Path(file)
+    if file.suffix != VECTOR_FORMATS["parquet"]:
+        vector.to_file(file)
+        return
+    if isinstance(vector, geopandas.GeoSeries):
+        vector = geopandas.GeoDataFrame(geometry=vector)
+    if list(vector.index.names) != [None] or not pandas.api.types.is_integer_dtype(
+        vector.index.dtype
+    ):
+        vector = vector.reset_index()
+    vector.to_parquet(file, index=False)
+
+
+def read_vector(
+    file: typing.Union[str, pathlib.Path],
+    extent: geopandas.GeoDataFrame = None,
+    cache_folder: pathlib.Path = None,
+) -> geopandas.GeoDataFrame:
+    """Read a vector file. If an extent is specified only the features within its
+    bounding box (converted to the file CRS) are read, and if a cache folder is
+    also specified these are saved there and reused while the file is unchanged.
+    GeoParquet files are read directly as they are already fast to read.
+
+    Parameters
+    ----------
+
+    file
+        The vector file to read.
+    extent
+        The region to read features within.
+    cache_folder
+        The folder to cache the features read within the extent.
+    """
+
+    file = existing_vector_file(file)
+    if file.suffix == VECTOR_FORMATS["parquet"]:
+        vector = geopandas.read_parquet(file)
+        if extent is None:
+            return vector
+        if vector.crs is not None:
+            extent = extent.to_crs(vector.crs)
+        xmin, ymin, xmax, ymax = extent.total_bounds
+        return vector.cx[xmin:xmax, ymin:ymax]
+    if extent is None:
+        return geopandas.read_file(file, **READ_ENGINE_OPTIONS)
+    file_crs = geopandas.read_file(file, rows=1, **READ_ENGINE_OPTIONS).crs
+    if file_crs is not None:
+        extent = extent.to_crs(file_crs)
+    bbox = tuple(float(value) for value in extent.total_bounds)
+
+    cache_file = None
+    if cache_folder is not None:
+        stat = file.stat()
+        key = json.dumps(
+            [str(file.absolute()), stat.st_size, stat.st_mtime_ns, bbox]
+        ).encode()
+        cache_file = (
+            pathlib.Path(cache_folder)
+            / f"{file.stem}_{hashlib.sha256(key).hexdigest()[:16]}.gpkg"
+        )
+        if cache_file.is_file():
+            return geopandas.read_file(cache_file, **READ_ENGINE_OPTIONS)
+    vector = geopandas.read_file(file, bbox=bbox, **READ_ENGINE_OPTIONS)
+    if cache_file is not None and len(vector) > 0:
+        cache_file.parent.mkdir(parents=True, exist_ok=True)
+        vector.to_file(cache_file)
+    return vector
+
+
+def sample_lines(lines: numpy.ndarray, resolution: float) -> tuple:
+    """Return points sampled along each line at the resolution - starting at the
+    beginning of each line - and the index of the line each point is from.
+
+    Parameters
+    ----------
+
+    lines
+        An array of LineStrings or MultiLineStrings.
+    resolution
+        The spacing between samples along each line.
+    """
+
+    lines = numpy.asarray(lines)
+    counts = numpy.ceil(shapely.length(lines) / resolution).astype(int)
+    line_indices = numpy.repeat(numpy.arange(len(lines)), counts)
+    # The distance along each line - restarting at zero for each line
+    starts = numpy.repeat(numpy.cumsum(counts) - counts, counts)
+    distances = (numpy.arange(len(line_indices)) - starts) * resolution
+    points = shapely.line_interpolate_point(lines[line_indices], distances)
+    return points, line_indices
 
 
 class CatchmentGeometry:
@@ -44,12 +171,14 @@ class CatchmentGeometry:
         crs: dict,
         resolution: float,
         foreshore_buffer: int = 2,
+        vector_cache: pathlib.Path = None,
     ):
         self.logger = logging.getLogger(f"{__name__}.{self.__class__.__name__}")
-        self._catchment = geopandas.read_file(catchment_file)
+        self._catchment = read_vector(catchment_file)
         self.crs = crs
         self.resolution = resolution
         self.foreshore_buffer = foreshore_buffer
+        self.vector_cache = vector_cache
 
         # set catchment CRS
         self._catchment = self._catchment.to_crs(self.crs["horizontal"])
@@ -137,7 +266,14 @@ class CatchmentGeometry:
     def land(self, land_file: typing.Union[str, pathlib.Path]):
         """Set the land region and finish setup."""
 
-        self._full_land = geopandas.read_file(land_file)
+        # Only read the land near the catchment - including the buffered foreshore
+        # and the diagonal of a pixel as the foreshore is buffered by pixels
+        buffer = self.resolution * max(self.foreshore_buffer + 1, numpy.sqrt(2))
+        self._full_land = read_vector(
+            land_file,
+            extent=self._catchment.buffer(buffer).to_frame("geometry"),
+            cache_folder=self.vector_cache,
+        )
 
         self._set_up()
 
@@ -320,9 +456,17 @@ class BathymetryContours:
         exclusion_extent=None,
     ):
         self.logger = logging.getLogger(f"{__name__}.{self.__class__.__name__}")
-        self._contour = geopandas.read_file(contour_file)
         self.catchment_geometry = catchment_geometry
         self.z_label = z_label
+        # Only read contours within the buffered offshore area kept in _set_up
+        offshore = self.catchment_geometry.offshore
+        self._contour = read_vector(
+            contour_file,
+            extent=self.catchment_geometry.catchment.buffer(
+                numpy.sqrt(offshore.area.sum())
+            ).to_frame("geometry"),
+            cache_folder=self.catchment_geometry.vector_cache,
+        )
 
         self._extent = None
 
@@ -385,51 +529,27 @@ class BathymetryContours:
             resolution > 0
         ), f"The sampling resolution must be greater than 0, but is {resolution}."
 
-        points_df = self._contour.geometry.apply(
-            lambda row: shapely.geometry.MultiPoint(
-                [
-                    row.interpolate(i * resolution)
-                    for i in range(int(numpy.ceil(row.length / resolution)))
-                ]
-            )
-        )
-        if len(points_df) == 0:
+        if len(self._contour) == 0:
             # No data, return an empty array
             return []
+        samples, line_indices = sample_lines(
+            self._contour.geometry.to_numpy(), resolution=resolution
+        )
+        xyz = shapely.get_coordinates(samples, include_z=True)
 
         points = numpy.empty(
-            [points_df.apply(lambda row: len(row.geoms)).sum()],
+            [len(xyz)],
             dtype=[("X", RASTER_TYPE), ("Y", RASTER_TYPE), ("Z", RASTER_TYPE)],
         )
 
-        # Extract the x, y and z values from the Shapely MultiPoints and possibly a
-        # depth column
-        points["X"] = numpy.concatenate(
-            points_df.apply(lambda row: [row_i.x for row_i in row.geoms]).to_list()
-        )
-        points["Y"] = numpy.concatenate(
-            points_df.apply(lambda row: [row_i.y for row_i in row.geoms]).to_list()
-        )
+        # Extract the x, y and z values from the sampled points and possibly a depth
+        # column
+        points["X"] = xyz[:, 0]
+        points["Y"] = xyz[:, 1]
         if self.z_label is None:
-            points["Z"] = (
-                numpy.concatenate(
-                    points_df.apply(
-                        lambda row: [row_i.z for row_i in row.geoms]
-                    ).to_list()
-                )
-                * -1
-            )
+            points["Z"] = xyz[:, 2] * -1
         else:
-            points["Z"] = (
-                numpy.concatenate(
-                    [
-                        numpy.ones(len(points_df.loc[i].geoms))
-                        * self._contour[self.z_label].loc[i]
-                        for i in range(len(points_df))
-                    ]
-                )
-                * -1
-            )
+            points["Z"] = self._contour[self.z_label].to_numpy()[line_indices] * -1
         return points
 
 
@@ -445,10 +565,18 @@ class OceanPoints:
         z_label: str = None,
     ):
         self.logger = logging.getLogger(f"{__name__}.{self.__class__.__name__}")
-        self._points = geopandas.read_file(points_file)
         self.catchment_geometry = catchment_geometry
+        # Only read points within the buffered catchment kept in _set_up
+        self._points = read_vector(
+            points_file,
+            extent=self._buffered_catchment().to_frame("geometry"),
+            cache_folder=self.catchment_geometry.vector_cache,
+        )
         self.is_depth = is_depth
         self.z_label = z_label
+        self._x = None
+        self._y = None
+        self._z = None
 
         self._set_up()
 
@@ -457,10 +585,13 @@ class OceanPoints:
 
         self._points = self._points.to_crs(self.catchment_geometry.crs["horizontal"])
         self._points = self._points.explode(ignore_index=True)
-        self._points = self._points.clip(
-            self.catchment_geometry.catchment.buffer(
-                numpy.sqrt(self.catchment_geometry.catchment.area.max())
-            )
+        self._points = self._points.clip(self._buffered_catchment())
+
+    def _buffered_catchment(self) -> geopandas.GeoSeries:
+        """The catchment buffered by the square root of its area."""
+
+        return self.catchment_geometry.catchment.buffer(
+            numpy.sqrt(self.catchment_geometry.catchment.area.max())
         )
 
     @property
@@ -494,9 +625,7 @@ class OceanPoints:
         """The x values"""
 
         if self._x is None:
-            self._x = self._points.apply(
-                lambda row: row["geometry"].x, axis=1
-            ).to_numpy()
+            self._x = shapely.get_coordinates(self._points.geometry.to_numpy())[:, 0]
         return self._x
 
     @property
@@ -504,9 +633,7 @@ class OceanPoints:
         """The y values"""
 
         if self._y is None:
-            self._y = self._points.apply(
-                lambda row: row["geometry"].y, axis=1
-            ).to_numpy()
+            self._y = shapely.get_coordinates(self._points.geometry.to_numpy())[:, 1]
         return self._y
 
     @property
@@ -518,7 +645,9 @@ class OceanPoints:
             multiplier = 1 if not self.is_depth else -1
             if self.z_label is None:
                 self._z = (
-                    self._points.apply(lambda row: row["geometry"].z, axis=1).to_numpy()
+                    shapely.get_coordinates(
+                        self._points.geometry.to_numpy(), include_z=True
+                    )[:, 2]
                     * multiplier
                 )
             else:
@@ -532,23 +661,14 @@ class OceanPoints:
             dtype=[("X", RASTER_TYPE), ("Y", RASTER_TYPE), ("Z", RASTER_TYPE)],
         )
 
-        # Extract the x, y and z values from the Shapely MultiPoints and possibly a
-        # depth column
-        points["X"] = self._points.apply(
-            lambda row: row["geometry"].x, axis=1
-        ).to_numpy()
-        points["Y"] = self._points.apply(
-            lambda row: row["geometry"].y, axis=1
-        ).to_numpy()
+        # Extract the x, y and z values from the Shapely Points
+        xyz = shapely.get_coordinates(self._points.geometry.to_numpy(), include_z=True)
+        points["X"] = xyz[:, 0]
+        points["Y"] = xyz[:, 1]
         if self.is_depth:
-            points["Z"] = (
-                self._points.apply(lambda row: row["geometry"].z, axis=1).to_numpy()
-                * -1
-            )
+            points["Z"] = xyz[:, 2] * -1
         else:
-            points["Z"] = self._points.apply(
-                lambda row: row["geometry"].z, axis=1
-            ).to_numpy()
+            points["Z"] = xyz[:, 2]
 
         return points
 
@@ -578,6 +698,8 @@ class ElevationPoints:
         self.z_label = z_labels is not None
         self._points = None
         self._polygon = None
+        self._x = None
+        self._y = None
 
         self._set_up(points_files, polygon_files, z_labels, filter_osm_ids)
 
@@ -611,7 +733,9 @@ class ElevationPoints:
         polygon_list = []
         for i in range(0, len(points_files)):
             # Points - rename depth labels to standard if  specified
-            points_i = geopandas.read_file(points_files[i])
+            points_i = read_vector(
+                points_files[i], extent=self.catchment_geometry.catchment
+            )
             if z_labels is not None and z_labels[i] != self.Z_LABEL:
                 points_i = points_i.rename(columns={z_labels[i]: self.Z_LABEL})
             columns_i = [self.Z_LABEL, "geometry"]
@@ -626,7 +750,9 @@ class ElevationPoints:
                 points_i = points_i[columns_i]
                 points_list.append(points_i)
                 # Polygon where the points are relevent
-                polygon_i = geopandas.read_file(polygon_files[i])
+                polygon_i = read_vector(
+                    polygon_files[i], extent=self.catchment_geometry.catchment
+                )
                 polygon_list.append(polygon_i)
         # Set CRS, clip to size and reset index
         if len(points_list) == 0:
@@ -677,18 +803,15 @@ class ElevationPoints:
 
         if len(points_array) == 0:
             return points_array
-        # Extract the x, y and z values from the Shapely MultiPoints and possibly a
+        # Extract the x, y and z values from the Shapely Points and possibly a
         # depth column
-        points_array["X"] = points.apply(lambda row: row.geometry.x, axis=1).to_list()
-        points_array["Y"] = points.apply(lambda row: row.geometry.y, axis=1).to_list()
+        xyz = shapely.get_coordinates(points.geometry.to_numpy(), include_z=True)
+        points_array["X"] = xyz[:, 0]
+        points_array["Y"] = xyz[:, 1]
         if self.z_label:
-            points_array["Z"] = points.apply(
-                lambda row: row[self.Z_LABEL], axis=1
-            ).to_list()
+            points_array["Z"] = points[self.Z_LABEL].to_numpy()
         else:
-            points_array["Z"] = points.apply(
-                lambda row: row.geometry.z, axis=1
-            ).to_list()
+            points_array["Z"] = xyz[:, 2]
         return points_array
 
     @property
@@ -715,15 +838,13 @@ class ElevationPoints:
             dtype=[("X", RASTER_TYPE), ("Y", RASTER_TYPE), ("Z", RASTER_TYPE)],
         )
 
-        # Extract the x, y and z values from the Shapely MultiPoints and possibly a
-        # depth column
-        points_array["X"] = points.apply(lambda row: row.geometry.x, axis=1).to_list()
-        points_array["Y"] = points.apply(lambda row: row.geometry.y, axis=1).to_list()
+        # Extract the x and y values from the Shapely Points
+        xy = shapely.get_coordinates(points.geometry.to_numpy())
+        points_array["X"] = xy[:, 0]
+        points_array["Y"] = xy[:, 1]
 
         # Pull out the bank heights
-        points_array["Z"] = points.apply(
-            lambda row: row[self.BANK_HEIGHT_LABEL], axis=1
-        ).to_list()
+        points_array["Z"] = points[self.BANK_HEIGHT_LABEL].to_numpy()
         return points_array
 
     @property
@@ -731,9 +852,7 @@ class ElevationPoints:
         """The x values"""
 
         if self._x is None:
-            self._x = self._points.points.apply(
-                lambda row: row["geometry"][0].x, axis=1
-            ).to_numpy()
+            self._x = shapely.get_coordinates(self._points.geometry.to_numpy())[:, 0]
         return self._x
 
     @property
@@ -741,9 +860,7 @@ class ElevationPoints:
         """The y values"""
 
         if self._y is None:
-            self._y = self._points.points.apply(
-                lambda row: row["geometry"][0].y, axis=1
-            ).to_numpy()
+            self._y = shapely.get_coordinates(self._points.geometry.to_numpy())[:, 1]
         return self._y
 
     @property
@@ -751,11 +868,11 @@ class ElevationPoints:
         """The z values"""
 
         if self.z_label:
-            self._z = self._points.apply(
-                lambda row: row[self.Z_LABEL], axis=1
-            ).to_list()
+            self._z = self._points[self.Z_LABEL].to_list()
         else:
-            self._z = self._points.apply(lambda row: row.geometry.z, axis=1).to_list()
+            self._z = shapely.get_coordinates(
+                self._points.geometry.to_numpy(), include_z=True
+            )[:, 2].tolist()
         return self._z
 
 
@@ -784,16 +901,17 @@ class ElevationContours(ElevationPoints):
     def sample_contours(self, resolution: float) -> numpy.ndarray:
         """Sample the contours at the specified resolution."""
 
-        # convert contours to multipoints
-        self._points.loc[:, "geometry"] = self._points.geometry.apply(
-            lambda row: shapely.geometry.MultiPoint(
-                [
-                    row.interpolate(i * resolution)
-                    for i in range(int(numpy.ceil(row.length / resolution)))
-                ]
-            )
+        # convert contours to points - keeping the values of each contour
+        samples, line_indices = sample_lines(
+            self._points.geometry.to_numpy(), resolution=resolution
+        )
+        self._points = geopandas.GeoDataFrame(
+            self._points.drop(columns="geometry")
+            .iloc[line_indices]
+            .reset_index(drop=True),
+            geometry=samples,
+            crs=self._points.crs,
         )
-        self._points = self._points.explode(index_parts=True, ignore_index=True)
 
 
 class TileInfo:
@@ -862,6 +980,7 @@ class RiverMouthFan:
         ocean_contour_file  The file name for the ocean contours. Depths are positive
         ocean_points_file The file name for the ocean points. Elevations are negative.
         ocean_contour_depth_label  The column label for the depth values.
+        vector_cache  The folder to cache the ocean points read within the fan.
     """
 
     FAN_ANGLE = 30
@@ -878,6 +997,7 @@ class RiverMouthFan:
         cross_section_spacing: float,
         elevation_labels: list,
         ocean_contour_depth_label: str = None,
+        vector_cache: pathlib.Path = None,
     ):
         self.logger = logging.getLogger(f"{__name__}.{self.__class__.__name__}")
         self.crs = crs
@@ -889,13 +1009,14 @@ class RiverMouthFan:
         self.ocean_contour_depth_label = ocean_contour_depth_label
         self.elevation_labels = elevation_labels
         self.ocean_points_file = ocean_points_file
+        self.vector_cache = vector_cache
 
     def _get_mouth_alignment(self):
         """Get the location and alignment of the river mouth."""
 
         # Get the river alignment and clip to the river polygon
-        aligned_channel = geopandas.read_file(self.aligned_channel_file)
-        river_polygon = geopandas.read_file(self.river_polygon_file).make_valid()
+        aligned_channel = read_vector(self.aligned_channel_file)
+        river_polygon = read_vector(self.river_polygon_file).make_valid()
         aligned_channel = aligned_channel.clip(river_polygon)
         # Explode incase the aligned channel is clipped into a MultiPolyLine
         (x, y) = aligned_channel.explode().iloc[0].geometry.xy
@@ -910,7 +1031,7 @@ class RiverMouthFan:
         mouth_normal = shapely.geometry.Point([-mouth_tangent.y, mouth_tangent.x])
 
         # Get the midpoint of the river mouth from the river bathymetry
-        river_bathymetry = geopandas.read_file(self.river_bathymetry_file)
+        river_bathymetry = read_vector(self.river_bathymetry_file)
         river_bathymetry = river_bathymetry.clip(
             river_polygon.buffer(self.cross_section_spacing / 2)
         ).sort_index(ascending=True)
@@ -922,8 +1043,8 @@ class RiverMouthFan:
         """Get the width and depth at the river mouth."""
 
         # Get river bathymetry values and clip to the river polygon
-        river_bathymetry = geopandas.read_file(self.river_bathymetry_file)
-        river_polygon = geopandas.read_file(self.river_polygon_file)
+        river_bathymetry = read_vector(self.river_bathymetry_file)
+        river_polygon = read_vector(self.river_polygon_file)
         river_bathymetry = river_bathymetry.clip(
             river_polygon.buffer(self.cross_section_spacing / 2)
         ).sort_index(ascending=True)
@@ -987,8 +1108,12 @@ class RiverMouthFan:
                 than the river mouth
         """
 
-        # Load in the ocean contours and find the contours to terminate against
-        ocean_points = geopandas.read_file(self.ocean_points_file).to_crs(self.crs)
+        # Load in the ocean points within the fan
+        ocean_points = read_vector(
+            self.ocean_points_file,
+            extent=geopandas.GeoDataFrame(geometry=[fan], crs=self.crs),
+            cache_folder=self.vector_cache,
+        ).to_crs(self.crs)
 
         # Determine the end depth and filter the contours to include only these contours
         ocean_points = ocean_points.clip(fan).reset_index(drop=True)
@@ -0,0 +1,592 @@
+# -*- coding: utf-8 -*-
+"""
+A micro-benchmark suite for the rasterisation and geometry kernels that dominate
+GeoFabrics run times. Each kernel is run against fixed seeded synthetic inputs so
+timings are comparable between machines and releases, and results are saved as JSON.
+The kernel outputs can be saved as reference values and later checked for numerical
+equivalence - so optimisations to a kernel can be shown to leave its results
+unchanged.
+"""
+from . import dem
+from . import bathymetry_estimation
+from . import geometry
+import argparse
+import collections
+import json
+import logging
+import pathlib
+import platform
+import sys
+import time
+import geopandas
+import numpy
+import scipy
+import shapely
+import xarray
+import rioxarray  # noqa: F401 - registers the rio accessor
+
+# The horizontal CRS of the synthetic inputs
+CRS = 2193
+# The extent in metres of the synthetic square region
+EXTENT = 200
+# The synthetic raster resolution in metres
+RESOLUTION = 1
+# The elevation_from_points methods to benchmark
+ELEVATION_METHODS = [
+    "mean",
+    "median",
+    "idw",
+    "linear",
+    "nearest",
+    "cubic",
+    "rbf",
+    "min",
+    "max",
+    "std",
+]
+
+
+def synthetic_elevation(x: numpy.ndarray, y: numpy.ndarray) -> numpy.ndarray:
+    """A smooth surface with a V-shaped channel running along the x-axis."""
+
+    slope = 0.02 * x
+    hills = 2 * numpy.sin(x / 25) * numpy.cos(y / 30)
+    channel = numpy.abs(y - EXTENT / 2) / 10
+    return slope + hills + channel
+
+
+def synthetic_point_cloud(rng: numpy.random.Generator, size: int) -> numpy.ndarray:
+    """Return a structured LiDAR like point cloud with X, Y, Z and Classification
+    fields. 'size' is the number of points."""
+
+    point_cloud = numpy.empty(
+        size,
+        dtype=[("X", "f8"), ("Y", "f8"), ("Z", "f8"), ("Classification", "u1")],
+    )
+    point_cloud["X"] = rng.uniform(0, EXTENT, size)
+    point_cloud["Y"] = rng.uniform(0, EXTENT, size)
+    point_cloud["Z"] = synthetic_elevation(
+        point_cloud["X"], point_cloud["Y"]
+    ) + rng.normal(0, 0.05, size)
+    point_cloud["Classification"] = rng.choice([2, 3, 4, 5], size=size)
+    return point_cloud
+
+
+def synthetic_grid(size: int) -> numpy.ndarray:
+    """Return the xy centres of a square grid with 'size' pixels a side covering the
+    synthetic region."""
+
+    spacing = EXTENT / size
+    centres = numpy.arange(spacing / 2, EXTENT, spacing)
+    grid_x, grid_y = numpy.meshgrid(centres, centres)
+    return numpy.stack([grid_x.flatten(), grid_y.flatten()], axis=1)
+
+
+def synthetic_dem(rng: numpy.random.Generator, size: int) -> xarray.Dataset:
+    """Return a DEM dataset with a 'z' layer of 'size' pixels a side at the
+    synthetic RESOLUTION. Some pixels are NaN to represent gaps."""
+
+    x = numpy.arange(size) * RESOLUTION + RESOLUTION / 2
+    y = numpy.arange(size)[::-1] * RESOLUTION + RESOLUTION / 2
+    grid_x, grid_y = numpy.meshgrid(x, y)
+    z = synthetic_elevation(grid_x, grid_y) + rng.normal(0, 0.05, grid_x.shape)
+    z[rng.uniform(size=z.shape) < 0.01] = numpy.nan
+    dem = xarray.Dataset(
+        data_vars={"z": (["y", "x"], z.astype(geometry.RASTER_TYPE))},
+        coords={"x": x, "y": y},
+    )
+    dem = dem.rio.write_crs(CRS)
+    dem.z.rio.write_crs(CRS, inplace=True)
+    return dem
+
+
+def synthetic_polygon(rng: numpy.random.Generator, size: int) -> shapely.Polygon:
+    """Return an irregular star shaped polygon within a region 'size' pixels a
+    side."""
+
+    number_of_vertices = 64
+    angles = numpy.linspace(0, 2 * numpy.pi, number_of_vertices, endpoint=False)
+    radii = size * RESOLUTION / 2 * rng.uniform(0.5, 0.95, number_of_vertices)
+    centre = size * RESOLUTION / 2
+    return shapely.Polygon(
+        numpy.stack(
+            [centre + radii * numpy.cos(angles), centre + radii * numpy.sin(angles)],
+            axis=1,
+        )
+    )
+
+
+def raster_options(method: str = "idw") -> dict:
+    """Return the options passed to the rasterisation kernels."""
+
+    return {
+        "radius": 2 * RESOLUTION,
+        "raster_type": geometry.RASTER_TYPE,
+        "method": method,
+        "strict": False,
+        "kernel": "linear",
+        "k_nearest_neighbours": 10,
+        "use_edge": True,
+        "parameters": {"std": 0.1, "mean": 0.1},
+        "workers": 1,
+    }
+
+
+def setup_elevation_from_points(method: str):
+    """Return a setup function for the elevation_from_points kernel using the
+    specified method."""
+
+    def setup(rng: numpy.random.Generator, scale: float):
+        # RBF fits per pixel so use fewer
+        size = int(numpy.sqrt(scale) * (10 if method == "rbf" else 40))
+        point_cloud = synthetic_point_cloud(rng, int(20000 * scale))
+        xy_out = synthetic_grid(size)
+        options = raster_options(method)
+        return lambda: dem.elevation_from_points(
+            point_cloud=point_cloud, xy_out=xy_out, options=options
+        )
+
+    return setup
+
+
+def setup_elevation_from_nearest_points(rng: numpy.random.Generator, scale: float):
+    """Return the elevation_from_nearest_points kernel with edge points."""
+
+    point_cloud = synthetic_point_cloud(rng, int(5000 * scale))
+    edge_point_cloud = synthetic_point_cloud(rng, int(1000 * scale))
+    xy_out = synthetic_grid(int(40 * numpy.sqrt(scale)))
+    options = raster_options("idw")
+    return lambda: dem.elevation_from_nearest_points(
+        point_cloud=point_cloud,
+        edge_point_cloud=edge_point_cloud,
+        xy_out=xy_out,
+        options=options,
+    )
+
+
+def setup_roughness_from_points(rng: numpy.random.Generator, scale: float):
+    """Return the roughness_from_points kernel."""
+
+    point_cloud = synthetic_point_cloud(rng, int(20000 * scale))
+    xy_out = synthetic_grid(int(40 * numpy.sqrt(scale)))
+    xy_ground = synthetic_elevation(xy_out[:, 0], xy_out[:, 1])
+    options = raster_options()
+    return lambda: dem.roughness_from_points(
+        point_cloud=point_cloud, xy_out=xy_out, xy_ground=xy_ground, options=options
+    )
+
+
+def setup_calculate_idw(rng: numpy.random.Generator, scale: float):
+    """Return a loop of calculate_idw calls - one per pixel - as in rasterisation."""
+
+    number_of_calls = int(1000 * scale)
+    near_points = rng.uniform(-2, 2, (number_of_calls, 12, 2))
+    near_z = synthetic_elevation(near_points[..., 0], near_points[..., 1])
+    points = rng.uniform(-1, 1, (number_of_calls, 2))
+
+    def kernel():
+        return numpy.array(
+            [
+                dem.calculate_idw(
+                    near_points=near_points[i], near_z=near_z[i], point=points[i]
+                )
+                for i in range(number_of_calls)
+            ]
+        )
+
+    return kernel
+
+
+def setup_calculate_rbf(rng: numpy.random.Generator, scale: float):
+    """Return a loop of calculate_rbf calls - one per pixel - as in rasterisation."""
+
+    number_of_calls = int(50 * scale)
+    near_points = rng.uniform(-2, 2, (number_of_calls, 30, 2))
+    near_z = synthetic_elevation(near_points[..., 0], near_points[..., 1])
+    points = rng.uniform(-1, 1, (number_of_calls, 2))
+
+    def kernel():
+        # Count rather than log warnings as in rasterisation
+        warning_counts = collections.Counter()
+        return numpy.array(
+            [
+                dem.calculate_rbf(
+                    near_points=near_points[i],
+                    near_z=near_z[i],
+                    point=points[i],
+                    kernel="linear",
+                    warning_counts=warning_counts,
+                )
+                for i in range(number_of_calls)
+            ]
+        ).flatten()
+
+    return kernel
+
+
+def setup_clip_mask(rng: numpy.random.Generator, scale: float):
+    """Return the clip_mask kernel for a chunked raster and irregular polygon."""
+
+    size = int(500 * numpy.sqrt(scale))
+    data_array = synthetic_dem(rng, size).z
+    polygon = geopandas.GeoSeries([synthetic_polygon(rng, size)], crs=CRS)
+    return lambda: dem.clip_mask(
+        arr=data_array, geometry=polygon, chunk_size=100
+    ).data.astype(bool)
+
+
+def setup_extents_from_mask(rng: numpy.random.Generator, scale: float):
+    """Return the extents_from_mask kernel (as used by DemBase._extents_from_mask)
+    for an irregular mask. The output is the area and bounds of the extents."""
+
+    size = int(500 * numpy.sqrt(scale))
+    data_array = synthetic_dem(rng, size).z
+    polygon = geopandas.GeoSeries([synthetic_polygon(rng, size)], crs=CRS)
+    mask = dem.clip_mask(arr=data_array, geometry=polygon, chunk_size=None).data
+    # Add some holes and islands
+    mask = mask & (rng.uniform(size=mask.shape) > 0.001)
+    transform = data_array.rio.transform()
+
+    def kernel():
+        extents = dem.extents_from_mask(
+            mask=mask, transform=transform, crs=CRS, chunk_size=100
+        )
+        return numpy.concatenate([[extents.area.sum()], extents.total_bounds])
+
+    return kernel
+
+
+def synthetic_cross_sections(
+    rng: numpy.random.Generator, number_of_sections: int
+) -> geopandas.GeoDataFrame:
+    """Return cross sections perpendicular to the synthetic channel, which runs
+    along the x-axis."""
+
+    mid_x = numpy.linspace(20, EXTENT - 20, number_of_sections)
+    mid_y = EXTENT / 2 + rng.normal(0, 1, number_of_sections)
+    angles = numpy.pi / 2 + rng.normal(0, 0.1, number_of_sections)
+    return geopandas.GeoDataFrame(
+        {
+            "mid_x": mid_x,
+            "mid_y": mid_y,
+            "nx": numpy.cos(angles),
+            "ny": numpy.sin(angles),
+        },
+        geometry=geopandas.points_from_xy(mid_x, mid_y),
+        crs=CRS,
+    )
+
+
+def setup_sample_cross_sections(rng: numpy.random.Generator, scale: float):
+    """Return the ChannelCharacteristics.sample_cross_sections kernel."""
+
+    gnd_dem = synthetic_dem(rng, EXTENT)
+    veg_dem = gnd_dem.copy(deep=True)
+    veg_dem["z"] = veg_dem.z + numpy.abs(rng.normal(0, 1, veg_dem.z.shape))
+    channel = bathymetry_estimation.ChannelCharacteristics(
+        gnd_dem=gnd_dem,
+        veg_dem=veg_dem,
+        cross_section_spacing=RESOLUTION,
+        resolution=RESOLUTION,
+    )
+    channel.transect_radius = 40
+    cross_sections = synthetic_cross_sections(rng, int(200 * scale))
+
+    def kernel():
+        elevations = channel.sample_cross_sections(
+            cross_sections=cross_sections.copy(), min_z_search_radius=10
+        )
+        return numpy.concatenate(
+            [
+                numpy.array(elevations["gnd_elevations"]).flatten(),
+                numpy.array(elevations["veg_elevations"]).flatten(),
+            ]
+        )
+
+    return kernel
+
+
+def synthetic_channel_profiles(rng: numpy.random.Generator, scale: float) -> tuple:
+    """Return the vegetation elevations of noisy V-shaped cross section profiles
+    with occasional secondary channels, and a ChannelCharacteristics to sample."""
+
+    number_of_sections = int(500 * scale)
+    number_of_samples = 101
+    offsets = numpy.abs(numpy.arange(number_of_samples) - number_of_samples // 2)
+    widths = rng.uniform(1, 5, (number_of_sections, 1))
+    gnd_samples = offsets / widths + rng.normal(
+        0, 0.2, (number_of_sections, number_of_samples)
+    )
+    # Add a secondary channel to some cross sections
+    secondary = rng.uniform(size=number_of_sections) < 0.3
+    gnd_samples[secondary, 65:75] = 0
+    veg_samples = gnd_samples + numpy.abs(
+        rng.normal(0, 0.5, (number_of_sections, number_of_samples))
+    )
+    channel = bathymetry_estimation.ChannelCharacteristics(
+        gnd_dem=None,
+        veg_dem=None,
+        cross_section_spacing=RESOLUTION,
+        resolution=RESOLUTION,
+    )
+    return veg_samples, channel
+
+
+def setup_fixed_threshold_width(rng: numpy.random.Generator, scale: float):
+    """Return a loop of fixed threshold width calls - one per cross section - on
+    noisy V-shaped profiles with occasional secondary channels. Each call is a
+    ChannelCharacteristics.fixed_threshold_widths call on a single cross section,
+    which replaced the per cross section fixed_threshold_width."""
+
+    veg_samples, channel = synthetic_channel_profiles(rng, scale)
+
+    def kernel():
+        return numpy.array(
+            [
+                numpy.column_stack(
+                    channel.fixed_threshold_widths(
+                        veg_elevations=veg_samples[i : i + 1],
+                        z_water=numpy.array([0.5]),
+                        threshold=1,
+                        search_radius_index=20,
+                        min_channel_width=2,
+                    )
+                )[0]
+                for i in range(len(veg_samples))
+            ],
+            dtype=float,
+        )
+
+    return kernel
+
+
+def setup_fixed_threshold_widths(rng: numpy.random.Generator, scale: float):
+    """Return a ChannelCharacteristics.fixed_threshold_widths call over all the
+    cross sections of the fixed_threshold_width kernel."""
+
+    veg_samples, channel = synthetic_channel_profiles(rng, scale)
+
+    def kernel():
+        return numpy.column_stack(
+            channel.fixed_threshold_widths(
+                veg_elevations=veg_samples,
+                z_water=numpy.full(len(veg_samples), 0.5),
+                threshold=1,
+                search_radius_index=20,
+                min_channel_width=2,
+            )
+        ).astype(float)
+
+    return kernel
+
+
+# The kernels to benchmark mapped to a function taking a random generator and scale
+# and returning a callable that runs the kernel and returns its output
+KERNELS = {
+    **{
+        f"elevation_from_points_{method}": setup_elevation_from_points(method)
+        for method in ELEVATION_METHODS
+    },
+    "elevation_from_nearest_points": setup_elevation_from_nearest_points,
+    "roughness_from_points": setup_roughness_from_points,
+    "calculate_idw": setup_calculate_idw,
+    "calculate_rbf": setup_calculate_rbf,
+    "clip_mask": setup_clip_mask,
+    "extents_from_mask": setup_extents_from_mask,
+    "sample_cross_sections": setup_sample_cross_sections,
+    "fixed_threshold_width": setup_fixed_threshold_width,
+    "fixed_threshold_widths": setup_fixed_threshold_widths,
+}
+
+
+def run_kernel(name: str, seed: int, scale: float, repeats: int) -> tuple:
+    """Run a kernel 'repeats' times. Return the timings and the output of the last
+    run. The inputs are regenerated from the seed for each kernel so the kernels are
+    independent of the order they are run in."""
+
+    rng = numpy.random.default_rng(seed)
+    kernel = KERNELS[name](rng, scale)
+    times = []
+    for repeat in range(repeats):
+        start_time = time.perf_counter()
+        output = kernel()
+        times.append(time.perf_counter() - start_time)
+    output = numpy.asarray(output, dtype=float).flatten()
+    record = {
+        "kernel": name,
+        "seed": seed,
+        "scale": scale,
+        "repeats": repeats,
+        "output_size": len(output),
+        "min_time": min(times),
+        "median_time": float(numpy.median(times)),
+        "mean_time": float(numpy.mean(times)),
+        "times": times,
+    }
+    return record, output
+
+
+def compare_to_reference(
+    output: numpy.ndarray, reference: numpy.ndarray, rtol: float, atol: float
+) -> dict:
+    """Check an output is numerically equivalent to the reference - NaN values must
+    match."""
+
+    if output.shape != reference.shape:
+        return {"equivalent": False, "max_abs_difference": None}
+    equivalent = numpy.allclose(output, reference, rtol=rtol, atol=atol, equal_nan=True)
+    nan_match = numpy.isnan(output) == numpy.isnan(reference)
+    difference = numpy.abs(output - reference)[nan_match & ~numpy.isnan(output)]
+    return {
+        "equivalent": bool(equivalent),
+        "max_abs_difference": float(difference.max()) if len(difference) else 0.0,
+    }
+
+
+def parse_args():
+    """Expect command line arguments of the form:
+    '--kernels name [...] --output path/to/results'"""
+
+    parser = argparse.ArgumentParser(
+        description="Benchmark the GeoFabrics rasterisation and geometry kernels."
+    )
+
+    parser.add_argument(
+        "--kernels",
+        metavar="name",
+        nargs="+",
+        default=list(KERNELS.keys()),
+        choices=list(KERNELS.keys()),
+        action="store",
+        help="the kernels to benchmark - all by default",
+    )
+    parser.add_argument(
+        "--seed",
+        type=int,
+        default=0,
+        action="store",
+        help="the random seed used to generate the kernel inputs",
+    )
+    parser.add_argument(
+        "--scale",
+        type=float,
+        default=1,
+        action="store",
+        help="scale the size of the kernel inputs",
+    )
+    parser.add_argument(
+        "--repeats",
+        type=int,
+        default=5,
+        action="store",
+        help="the number of times to run each kernel",
+    )
+    parser.add_argument(
+        "--output",
+        metavar="path",
+        default="geofabrics_kernel_benchmark.json",
+        action="store",
+        help="the JSON file to save the results to",
+    )
+    parser.add_argument(
+        "--save_reference",
+        metavar="path",
+        action="store",
+        help="save the kernel outputs to this .npz file as reference values",
+    )
+    parser.add_argument(
+        "--reference",
+        metavar="path",
+        action="store",
+        help="check the kernel outputs against the reference values in this file",
+    )
+    parser.add_argument(
+        "--rtol",
+        type=float,
+        default=1e-5,
+        action="store",
+        help="the relative tolerance when checking against the reference values",
+    )
+    parser.add_argument(
+        "--atol",
+        type=float,
+        default=1e-6,
+        action="store",
+        help="the absolute tolerance when checking against the reference values",
+    )
+
+    return parser.parse_args()
+
+
+def run_kernel_benchmarks(args) -> bool:
+    """Benchmark the specified kernels and save the results. Return True if all
+    kernel outputs match any reference values."""
+
+    logging.basicConfig(stream=sys.stdout, level=logging.INFO)
+    logger = logging.getLogger(__name__)
+
+    references = None
+    if args.reference is not None:
+        references = numpy.load(args.reference)
+    results = []
+    outputs = {}
+    all_equivalent = True
+    for name in args.kernels:
+        logger.info(f"Benchmarking kernel {name}")
+        record, output = run_kernel(
+            name=name, seed=args.seed, scale=args.scale, repeats=args.repeats
+        )
+        outputs[name] = output
+        if references is not None:
+            if name in references:
+                record.update(
+                    compare_to_reference(
+                        output=output,
+                        reference=references[name],
+                        rtol=args.rtol,
+                        atol=args.atol,
+                    )
+                )
+                if not record["equivalent"]:
+                    all_equivalent = False
+                    logger.warning(
+                        f"Kernel {name} output differs from the reference: max "
+                        f"absolute difference {record['max_abs_difference']}"
+                    )
+            else:
+                logger.warning(f"No reference values for kernel {name}.")
+        logger.info(f"Kernel {name} median time {record['median_time']:.4f}s")
+        results.append(record)
+
+    if args.save_reference is not None:
+        numpy.savez_compressed(args.save_reference, **outputs)
+    output = {
+        "environment": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "numpy": numpy.__version__,
+            "scipy": scipy.__version__,
+            "shapely": shapely.__version__,
+        },
+        "results": results,
+    }
+    output_path = pathlib.Path(args.output)
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    with open(output_path, "w") as file_pointer:
+        json.dump(output, file_pointer, indent=2)
+    logger.info(f"Kernel benchmark results saved to {output_path}")
+    return all_equivalent
+
+
+def cli_run_kernel_benchmarks():
+    """A CLI entry point to the GeoFabrics kernel micro-benchmarks."""
+    args = parse_args()
+    all_equivalent = run_kernel_benchmarks(args)
+    if not all_equivalent:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    """If called as a script."""
+
+    cli_run_kernel_benchmarks()
@@ -0,0 +1,247 @@
+# -*- coding: utf-8 -*-
+"""
+This module contains functions and classes for recording the performance (i.e. wall
+time, CPU time, memory, IO and Dask task statistics) of the processors and the
+stages within them. The runner collates these into a performance report.
+"""
+import collections
+import copy
+import logging
+import sys
+import time
+import pathlib
+import xarray
+import distributed
+
+try:
+    import resource
+except ImportError:  # Not available on Windows
+    resource = None
+
+
+# The Dask event topic the dem module logs per chunk warning counts to
+WARNING_EVENT_TOPIC = "geofabrics-warnings"
+# Statistics of the tasks completed by any Dask schedulers started in this process.
+# Task durations are the compute time in seconds - in total and by task prefix.
+TASK_STATS = {"tasks": 0, "erred": 0, "duration": 0.0, "prefixes": {}}
+
+
+class TaskCounter(distributed.diagnostics.plugin.SchedulerPlugin):
+    """A Dask scheduler plugin counting the tasks completed (or erred) by each
+    scheduler and their compute durations. Added to schedulers through the
+    'distributed.scheduler.preload' configuration so the processor classes don't
+    need to know about it."""
+
+    name = "geofabrics-task-counter"
+
+    def transition(self, key, start, finish, *args, **kwargs):
+        if start == "processing" and finish == "memory":
+            duration = sum(
+                startstop["stop"] - startstop["start"]
+                for startstop in kwargs.get("startstops", [])
+                if startstop.get("action") == "compute"
+            )
+            prefix = TASK_STATS["prefixes"].setdefault(
+                distributed.utils.key_split(key), {"tasks": 0, "duration": 0.0}
+            )
+            prefix["tasks"] += 1
+            prefix["duration"] += duration
+            TASK_STATS["tasks"] += 1
+            TASK_STATS["duration"] += duration
+        elif finish == "erred":
+            TASK_STATS["erred"] += 1
+
+
+def dask_setup(scheduler):
+    """Called by Dask on scheduler start when this module is preloaded."""
+    scheduler.add_plugin(TaskCounter(), idempotent=True)
+
+
+def resource_usage() -> dict:
+    """Return the resource usage of this process combined with any finished child
+    processes (i.e. the Dask workers of closed clusters). Memory and IO are in
+    bytes, and IO is only that which reached the disk. Peak memory is the peak of
+    this process to date. Only the CPU time is available if the resource module is
+    unavailable."""
+
+    usage = {
+        "cpu_time": time.process_time(),
+        "peak_memory": None,
+        "bytes_read": None,
+        "bytes_written": None,
+    }
+    if resource is None:
+        return usage
+    self_usage = resource.getrusage(resource.RUSAGE_SELF)
+    child_usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    memory_scale = 1 if sys.platform == "darwin" else 1024  # bytes or KiB
+    block_size = 512
+    usage["cpu_time"] = (
+        self_usage.ru_utime
+        + self_usage.ru_stime
+        + child_usage.ru_utime
+        + child_usage.ru_stime
+    )
+    usage["peak_memory"] = self_usage.ru_maxrss * memory_scale
+    usage["bytes_read"] = (self_usage.ru_inblock + child_usage.ru_inblock) * block_size
+    usage["bytes_written"] = (
+        self_usage.ru_oublock + child_usage.ru_oublock
+    ) * block_size
+    return usage
+
+
+def peak_memory() -> int:
+    """Return the peak memory in bytes of this process to date. Run on the Dask
+    workers to get their peak memory."""
+
+    memory_scale = 1 if sys.platform == "darwin" else 1024  # bytes or KiB
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * memory_scale
+
+
+def worker_peak_memory() -> int:
+    """Return the largest peak memory in bytes of the workers of the current Dask
+    client. The workers are started with each processor's cluster, so this is the
+    peak of the processor's workers to date. None if there is no Dask client or the
+    resource module is unavailable."""
+
+    if resource is None:
+        return None
+    try:
+        client = distributed.default_client()
+    except ValueError:  # No Dask client
+        return None
+    peaks = client.run(peak_memory)
+    return max(peaks.values()) if len(peaks) > 0 else None
+
+
+def snapshot() -> dict:
+    """Return the current time, resource usage and Dask task statistics."""
+
+    return {
+        "time": time.perf_counter(),
+        "timestamp": time.time(),
+        **resource_usage(),
+        "task_stats": copy.deepcopy(TASK_STATS),
+    }
+
+
+def metrics_between(start: dict, end: dict) -> dict:
+    """Return the performance metrics between two snapshots. Peak memory is the
+    peak to the end snapshot."""
+
+    start_tasks = start["task_stats"]
+    end_tasks = end["task_stats"]
+    metrics = {
+        "wall_time": end["time"] - start["time"],
+        "cpu_time": end["cpu_time"] - start["cpu_time"],
+        "peak_memory": end["peak_memory"],
+        "dask_tasks": end_tasks["tasks"] - start_tasks["tasks"],
+        "dask_tasks_erred": end_tasks["erred"] - start_tasks["erred"],
+        "dask_task_duration": end_tasks["duration"] - start_tasks["duration"],
+    }
+    for key in ["bytes_read", "bytes_written"]:
+        metrics[key] = end[key] - start[key] if end[key] is not None else None
+    # Task counts and durations by prefix (i.e. the delayed function name)
+    prefixes = {}
+    for prefix, stats in end_tasks["prefixes"].items():
+        start_stats = start_tasks["prefixes"].get(prefix, {"tasks": 0, "duration": 0})
+        if stats["tasks"] > start_stats["tasks"]:
+            prefixes[prefix] = {
+                "tasks": stats["tasks"] - start_stats["tasks"],
+                "duration": stats["duration"] - start_stats["duration"],
+            }
+    metrics["dask_task_prefixes"] = prefixes
+    return metrics
+
+
+class PerformanceRecorder:
+    """A class to record the performance of consecutive stages within a processor.
+    Each stage runs from the end of the previous stage (or creation of the
+    recorder) until it is recorded.
+
+    The `PerformanceRecorder` class contains several important class members:
+     * stages - A list of the performance metrics of each recorded stage
+     * logger - logging within this class
+    """
+
+    def __init__(self):
+        self.logger = logging.getLogger(f"{__name__}.{self.__class__.__name__}")
+        self.stages = []
+        self._start = snapshot()
+
+    def _chunk_warnings(self, since: float) -> collections.Counter:
+        """Return the counts of the warnings logged as Dask events by chunks since
+        the specified timestamp. Empty if there is no Dask client."""
+
+        warning_counts = collections.Counter()
+        try:
+            events = distributed.default_client().get_events(WARNING_EVENT_TOPIC)
+        except ValueError:  # No Dask client
+            return warning_counts
+        for timestamp, counts in events:
+            if timestamp >= since:
+                warning_counts.update(counts)
+        return warning_counts
+
+    @property
+    def peak_memory_workers(self) -> int:
+        """Return the largest worker peak memory of the recorded stages."""
+
+        peaks = [
+            stage["peak_memory_workers"]
+            for stage in self.stages
+            if stage["peak_memory_workers"] is not None
+        ]
+        return max(peaks) if len(peaks) > 0 else None
+
+    def record_stage(
+        self,
+        name: str,
+        files: list = None,
+        dataset: xarray.Dataset = None,
+        lidar_bytes_read: int = None,
+    ) -> dict:
+        """Record the performance of a stage ending now. Peak memory is to the end
+        of the stage - for this process and for the workers of the processor's
+        Dask cluster.
+
+        Parameters
+        ----------
+
+        name
+            The name of the stage - e.g. 'lidar rasterise'
+        files
+            Any netCDF or GeoTiff files written in the stage.
+        dataset
+            The DEM produced by the stage - used to record the pixels produced.
+        lidar_bytes_read
+            The bytes of LAS/LAZ files read in the stage.
+        """
+
+        end = snapshot()
+        files = files if files is not None else []
+        warning_counts = self._chunk_warnings(since=self._start["timestamp"])
+        if len(warning_counts) > 0:
+            summary = "; ".join(
+                f"{count} x {message}"
+                for message, count in warning_counts.most_common()
+            )
+            self.logger.warning(f"Chunk warnings during the {name} stage: {summary}")
+        metrics = {
+            "stage": name,
+            **metrics_between(self._start, end),
+            "peak_memory_workers": worker_peak_memory(),
+            "lidar_bytes_read": lidar_bytes_read,
+            "raster_bytes_written": sum(
+                pathlib.Path(file).stat().st_size
+                for file in files
+                if pathlib.Path(file).is_file()
+            ),
+            "pixels": (
+                dataset.sizes["x"] * dataset.sizes["y"] if dataset is not None else None
+            ),
+            "warnings": dict(warning_counts),
+        }
+        self.stages.append(metrics)
+        self._start = snapshot()
+        return metrics
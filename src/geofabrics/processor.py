@@ -7,6 +7,8 @@ GeoFabric layers include hydrologically conditioned DEMs.
 """
 import numpy
 import json
+import math
+import os
 import pathlib
 import abc
 import gc
@@ -25,6 +27,7 @@ import OSMPythonTools.overpass
 from . import geometry
 from . import bathymetry_estimation
 from . import version
+from . import performance
 import geoapis.lidar
 import geoapis.vector
 import geoapis.raster
@@ -45,12 +48,21 @@ class BaseProcessor(abc.ABC):
     """
 
     OSM_CRS = "EPSG:4326"
+    # Limits and step of the chunk_size when planned automatically
+    MIN_AUTO_CHUNK_SIZE = 100
+    MAX_AUTO_CHUNK_SIZE = 4000
+    # chunk_size used for 'auto' when there is no LiDAR to plan from
+    DEFAULT_AUTO_CHUNK_SIZE = 1000
+    # Fraction of a workers memory_limit a rasterisation task should use
+    TASK_MEMORY_FRACTION = 0.5
 
     def __init__(self, json_instructions: json):
         self.logger = logging.getLogger(f"{__name__}.{self.__class__.__name__}")
         self.instructions = copy.deepcopy(json_instructions)
 
         self.catchment_geometry = None
+        self.processing_plan = None
+        self.performance = performance.PerformanceRecorder()
 
     def create_metadata(self) -> dict:
         """A clase to create metadata to be added as netCDF attributes."""
@@ -176,7 +188,8 @@ class BaseProcessor(abc.ABC):
         generator: dem.DemBase,
         compression: int,
     ):
-        """Save out the dem/geofabrics labelled array.
+        """Save out the dem/geofabrics labelled array. Record this as the 'save'
+        stage.
 
         Parameters
         ----------
@@ -213,6 +226,14 @@ class BaseProcessor(abc.ABC):
             dem=dataset,
             compression=compression,
         )
+        if filename.suffix.lower() == ".tif":
+            files = [
+                filename.parent / f"{filename.stem}_{key}{filename.suffix}"
+                for key in dataset.data_vars
+            ]
+        else:
+            files = [filename]
+        self.performance.record_stage(name="save", files=files, dataset=dataset)
 
     def get_resolution(self) -> float:
         """Return the resolution from the instruction file. Raise an error if
@@ -228,6 +249,14 @@ class BaseProcessor(abc.ABC):
         ), "'resolution' is not a key-word in the instructions"
         return self.instructions["output"]["grid_params"]["resolution"]
 
+    def get_additional_resolutions(self) -> list:
+        """Return any additional resolutions to produce DEMs at from the same LiDAR
+        reads. An empty list if none are specified in the instructions."""
+
+        return self.instructions["output"]["grid_params"].get(
+            "additional_resolutions", []
+        )
+
     def get_crs(self) -> dict:
         """Return the CRS projection information (horiztonal and vertical) from
         the instruction file. Raise an error if 'output' is not in the instructions. If
@@ -285,6 +314,7 @@ class BaseProcessor(abc.ABC):
             "zero_positive_foreshore": True,
             "lidar_classifications_to_keep": [2],
             "elevation_range": None,
+            "lidar_z_type": "float64",
             "download_limit_gbytes": 100,
             "lidar_buffer": 0,
             "interpolation": {
@@ -318,6 +348,8 @@ class BaseProcessor(abc.ABC):
             },
             "filter_waterways_by_osm_ids": [],
             "compression": 1,
+            "additional_lidar_layers": {},
+            "vector_format": geometry.DEFAULT_VECTOR_FORMAT,
         }
 
         if key not in defaults and key not in self.instructions["general"]:
@@ -341,6 +373,22 @@ class BaseProcessor(abc.ABC):
                 self.instructions["general"][key][subkey] = defaults[key][subkey]
             return self.instructions["general"][key][subkey]
 
+    def get_vector_file_name(self, name: str) -> str:
+        """Return the name of an intermediate vector product with the file suffix of
+        the 'vector_format' general instruction (i.e. 'parquet' or 'geojson')."""
+
+        vector_format = self.get_instruction_general("vector_format")
+        if vector_format not in geometry.VECTOR_FORMATS:
+            message = (
+                f"Unsupported 'vector_format': {vector_format}. Supported formats "
+                f"are: {list(geometry.VECTOR_FORMATS.keys())}."
+            )
+            self.logger.error(message)
+            raise ValueError(message)
+        return str(
+            pathlib.Path(name).with_suffix(geometry.VECTOR_FORMATS[vector_format])
+        )
+
     def get_processing_instructions(self, key: str):
         """Return the processing instruction from the instruction file or
         return the default value if not specified in the instruction file. If
@@ -357,6 +405,9 @@ class BaseProcessor(abc.ABC):
             "number_of_cores": 1,
             "chunk_size": None,
             "memory_limit": "10GiB",
+            "execution_mode": "processes",
+            "threads_per_worker": 2,
+            "point_cache_gbytes": None,
         }
 
         assert key in defaults or key in self.instructions["processing"], (
@@ -364,13 +415,259 @@ class BaseProcessor(abc.ABC):
             + "from the general instructions, and does not have a default value"
         )
         if "processing" in self.instructions and key in self.instructions["processing"]:
-            return self.instructions["processing"][key]
+            value = self.instructions["processing"][key]
+            if value == "auto" and key in ["chunk_size", "number_of_cores"]:
+                if self.processing_plan is None:
+                    self.plan_processing()
+                value = self.processing_plan[key]
+            return value
         else:
             if "processing" not in self.instructions:
                 self.instructions["processing"] = {}
             self.instructions["processing"][key] = defaults[key]
             return defaults[key]
 
+    def get_point_cache(self) -> dict:
+        """Return the folder and maximum size of the on disk cache of reprojected
+        LiDAR points, or None if 'point_cache_gbytes' isn't specified. The cache is
+        in the local_cache so it is shared by all stages and runs."""
+
+        point_cache_gbytes = self.get_processing_instructions("point_cache_gbytes")
+        if point_cache_gbytes is None:
+            return None
+        if not self.check_instruction_path("local_cache"):
+            self.logger.warning(
+                "A 'local_cache' must be specified to use the point cache. "
+                "Continuing without it."
+            )
+            return None
+        return {
+            "folder": self.get_instruction_path("local_cache") / "point_cache",
+            "max_bytes": int(point_cache_gbytes * 1e9),
+        }
+
+    def evict_from_point_cache(self):
+        """Evict the least recently used LiDAR files from the point cache once a
+        stage has finished reading LiDAR."""
+
+        point_cache = self.get_point_cache()
+        if point_cache is not None:
+            dem.evict_from_point_cache(point_cache=point_cache)
+
+    def get_kdtree_workers(self) -> int:
+        """Return the number of threads each task uses for KDTree queries. Only
+        more than one in the 'hybrid' execution_mode."""
+
+        if self.get_processing_instructions("execution_mode") == "hybrid":
+            return max(1, int(self.get_processing_instructions("threads_per_worker")))
+        return 1
+
+    def get_cluster_kwargs(self, number_of_cores: int = None) -> dict:
+        """Return the Dask LocalCluster arguments for the execution_mode:
+        * processes - a single threaded worker process per core.
+        * threads - a single worker process with a thread per core. Memory is
+          shared between tasks so the memory_limit is scaled by the cores.
+        * hybrid - a worker process per 'threads_per_worker' cores, each running
+          one task at a time with 'threads_per_worker' threads in the GIL
+          releasing KDTree queries.
+
+        Parameters
+        ----------
+
+        number_of_cores
+            The number of cores to use - if None the 'number_of_cores' processing
+            instruction is used.
+        """
+
+        execution_mode = self.get_processing_instructions("execution_mode")
+        if number_of_cores is None:
+            number_of_cores = self.get_processing_instructions("number_of_cores")
+        memory_limit = self.get_processing_instructions("memory_limit")
+        if execution_mode == "processes":
+            return {
+                "n_workers": number_of_cores,
+                "threads_per_worker": 1,
+                "processes": True,
+                "memory_limit": memory_limit,
+            }
+        elif execution_mode == "threads":
+            return {
+                "n_workers": 1,
+                "threads_per_worker": number_of_cores,
+                "processes": False,
+                "memory_limit": (
+                    memory_limit
+                    if memory_limit == "auto"
+                    else self.get_memory_limit() * number_of_cores
+                ),
+            }
+        elif execution_mode == "hybrid":
+            return {
+                "n_workers": max(1, number_of_cores // self.get_kdtree_workers()),
+                "threads_per_worker": 1,
+                "processes": True,
+                "memory_limit": memory_limit,
+            }
+        else:
+            raise ValueError(
+                f"Invalid 'execution_mode' of {execution_mode}. Valid options are "
+                "'processes', 'threads' or 'hybrid'."
+            )
+
+    def get_memory_limit(self) -> int:
+        """Return the memory limit of each worker in bytes."""
+
+        memory_limit = self.get_processing_instructions("memory_limit")
+        if memory_limit == "auto":
+            return int(distributed.system.MEMORY_LIMIT / (os.cpu_count() or 1))
+        return dask.utils.parse_bytes(memory_limit)
+
+    def get_task_memory_limit(self, number_of_cores: int) -> int:
+        """Return the memory in bytes available to each concurrently running task of
+        the Dask cluster the execution_mode creates for the number_of_cores. This is
+        the worker memory_limit shared between the threads of each worker."""
+
+        cluster_kwargs = self.get_cluster_kwargs(number_of_cores=number_of_cores)
+        threads_per_worker = cluster_kwargs["threads_per_worker"]
+        memory_limit = cluster_kwargs["memory_limit"]
+        if memory_limit == "auto":
+            # As in distributed - the system memory shared evenly between the cores
+            memory_limit = distributed.system.MEMORY_LIMIT * min(
+                1, threads_per_worker / (os.cpu_count() or 1)
+            )
+        elif isinstance(memory_limit, str):
+            memory_limit = dask.utils.parse_bytes(memory_limit)
+        return int(memory_limit / threads_per_worker)
+
+    def plan_processing(self, lidar_datasets_info: dict = None) -> dict:
+        """Plan the 'chunk_size' and 'number_of_cores' where either are specified as
+        'auto'. Explicitly specified values are used as is.
+
+        The chunk_size is the largest for which the estimated memory of rasterising a
+        chunk fits within TASK_MEMORY_FRACTION of the memory available to each task
+        of the Dask cluster of the execution_mode. The point density is estimated
+        from the headers of the LiDAR files. The number_of_cores is limited by the
+        CPUs, the system memory divided by the task memory, and the number of chunks.
+
+        Without LiDAR to plan from a chunk_size of DEFAULT_AUTO_CHUNK_SIZE is used
+        and a warning logged.
+
+        Parameters
+        ----------
+
+        lidar_datasets_info
+            A dictionary of information for each specified LIDAR dataset - if None
+            the DEFAULT_AUTO_CHUNK_SIZE is used.
+        """
+
+        processing = self.instructions.get("processing", {})
+        if "auto" not in [
+            processing.get("chunk_size"),
+            processing.get("number_of_cores"),
+        ]:
+            # Nothing to plan - use the specified values
+            self.processing_plan = {
+                "chunk_size": self.get_processing_instructions("chunk_size"),
+                "number_of_cores": self.get_processing_instructions("number_of_cores"),
+            }
+            return self.processing_plan
+        resolution = self.get_resolution()
+        radius = resolution / numpy.sqrt(2)
+
+        # The memory of each task for the specified or the maximum number of cores
+        number_of_cores = processing.get("number_of_cores", 1)
+        task_memory_limit = self.get_task_memory_limit(
+            number_of_cores=(
+                (os.cpu_count() or 1) if number_of_cores == "auto" else number_of_cores
+            )
+        )
+
+        # Estimate the worst point density of any dataset from the LAS headers
+        point_density = 0
+        if lidar_datasets_info is not None:
+            for dataset_name, dataset_info in lidar_datasets_info.items():
+                point_density = max(
+                    point_density,
+                    dem.estimate_point_density(dataset_info["file_paths"]),
+                )
+
+        # Plan the chunk size
+        chunk_size = processing.get("chunk_size", None)
+        if chunk_size == "auto":
+            if not lidar_datasets_info:
+                self.logger.warning(
+                    "No LiDAR to plan the 'auto' chunk_size from. Using a chunk_size "
+                    f"of {self.DEFAULT_AUTO_CHUNK_SIZE}."
+                )
+                chunk_size = self.DEFAULT_AUTO_CHUNK_SIZE
+            elif any(
+                dataset_info["tile_index_file"] is None
+                for dataset_info in lidar_datasets_info.values()
+            ):
+                self.logger.info(
+                    "Not chunking as a LiDAR dataset has no tile index file."
+                )
+                chunk_size = None
+            else:
+                chunk_size = self.MIN_AUTO_CHUNK_SIZE
+                for candidate in range(
+                    self.MAX_AUTO_CHUNK_SIZE,
+                    self.MIN_AUTO_CHUNK_SIZE - 1,
+                    -self.MIN_AUTO_CHUNK_SIZE,
+                ):
+                    task_memory = dem.estimate_chunk_memory(
+                        chunk_size=candidate,
+                        resolution=resolution,
+                        radius=radius,
+                        point_density=point_density,
+                    )
+                    if task_memory <= task_memory_limit * self.TASK_MEMORY_FRACTION:
+                        chunk_size = candidate
+                        break
+        task_memory = dem.estimate_chunk_memory(
+            chunk_size=chunk_size if chunk_size is not None else 0,
+            resolution=resolution,
+            radius=radius,
+            point_density=point_density,
+        )
+        if task_memory > task_memory_limit * self.TASK_MEMORY_FRACTION:
+            self.logger.warning(
+                f"The estimated memory of {task_memory / 2**30:.2f}GiB per chunk "
+                f"exceeds {self.TASK_MEMORY_FRACTION} of the memory of each task. "
+                "Consider increasing the memory_limit or reducing the chunk_size."
+            )
+
+        # Plan the number of cores
+        if number_of_cores == "auto":
+            # Each task in hybrid mode uses several cores
+            number_of_cores = min(
+                os.cpu_count() or 1,
+                max(1, int(distributed.system.MEMORY_LIMIT // task_memory_limit))
+                * self.get_kdtree_workers(),
+            )
+            if chunk_size is not None and self.catchment_geometry is not None:
+                bounds = self.catchment_geometry.catchment.total_bounds
+                number_of_chunks = math.ceil(
+                    (bounds[2] - bounds[0]) / (chunk_size * resolution)
+                ) * math.ceil((bounds[3] - bounds[1]) / (chunk_size * resolution))
+                number_of_cores = min(
+                    number_of_cores,
+                    max(1, number_of_chunks) * self.get_kdtree_workers(),
+                )
+            elif chunk_size is None:
+                number_of_cores = self.get_kdtree_workers()
+
+        self.processing_plan = {
+            "chunk_size": chunk_size,
+            "number_of_cores": number_of_cores,
+        }
+        self.logger.info(
+            f"Processing plan: {self.processing_plan} with an estimated point density "
+            f"of {point_density:.2f}, and {task_memory / 2**20:.0f}MiB per chunk of "
+            f"{task_memory_limit / 2**20:.0f}MiB memory per task."
+        )
+        return self.processing_plan
+
     def check_datasets(self, key: str, data_type: str) -> bool:
         """Check to see if the dataset is included in the instructions:
         key = dataservice (i.e. local, opentogaphy, linxz, lris)
@@ -657,8 +954,14 @@ class BaseProcessor(abc.ABC):
 
         The 'tile_index_file' is also optional (if unset the value is None).
         The 'tile_index_file' should be given if a tile index file exists for
-        the LiDAR files specifying the extents of each tile. This is currently
-        only supported for OpenTopography files.
+        the LiDAR files specifying the extents of each tile. If a local dataset
+        (or more than one `lidar_files`) has no tile index file one is built from
+        the LAS/LAZ file headers so the LiDAR can be processed in chunks.
+
+        Local datasets can be COPC files, an EPT dataset (a 'folder_path' containing
+        an 'ept.json'), or LAS/LAZ files converted once to COPC in the local_cache
+        if 'convert_to_copc' is true. COPC and EPT data are read by chunk bounds so
+        chunks don't need to align with the tiles.
 
         If a LiDAR dataset (either through an API or locally) is specified this
         is checked and all files within the catchment area are downloaded and
@@ -724,7 +1027,16 @@ class BaseProcessor(abc.ABC):
             )
             for dataset_name, dataset in local_datasets.items():
                 # Ensure the file_paths (LAZ, and LAS files) are specified
-                if "file_paths" not in dataset and "folder_path" in dataset:
+                if (
+                    "file_paths" not in dataset
+                    and "folder_path" in dataset
+                    and (pathlib.Path(dataset["folder_path"]) / "ept.json").exists()
+                ):
+                    # An EPT dataset - read through its metadata not its LAZ nodes
+                    dataset["file_paths"] = [
+                        pathlib.Path(dataset["folder_path"]) / "ept.json"
+                    ]
+                elif "file_paths" not in dataset and "folder_path" in dataset:
                     # Compressed or uncomplressed file type
                     dataset["file_paths"] = sorted(
                         pathlib.Path(dataset["folder_path"]).rglob("*.la[zs]")
@@ -735,25 +1047,43 @@ class BaseProcessor(abc.ABC):
                         "file_paths specified. Both are missing for dataset:"
                         f"{dataset_name}."
                     )
-                # Ensure the tile_index file is specified
+                # Optionally convert to COPC once so chunks are read by bounds
+                if dataset.get("convert_to_copc", False):
+                    dataset["file_paths"] = dem.convert_to_copc(
+                        lidar_files=dataset["file_paths"],
+                        output_folder=self.get_instruction_path("local_cache")
+                        / "copc"
+                        / dataset_name,
+                    )
+                    # Any existing tile index is of the unconverted file names
+                    dataset["tile_index_file"] = self.build_tile_index(
+                        dataset_name=dataset_name,
+                        lidar_files=dataset["file_paths"],
+                        crs=dataset.get("crs", None),
+                    )
+                # Ensure the tile_index file is specified - build if missing
                 if "tile_index_file" not in dataset and "folder_path" in dataset:
                     dataset["tile_index_file"] = (
                         pathlib.Path(dataset["folder_path"])
                         / f"{dataset_name}_TileIndex.zip"
                     )
                     if not dataset["tile_index_file"].exists():
-                        raise Exception(
-                            f"{dataset['tile_index_file']} does not exist. If "
-                            "the tile index file has a different name it must "
-                            "be specified with the key `tile_index_file`. If "
-                            "there is not tile index file the lidar files "
-                            "need to be included as `cache_path:lidar_files`."
+                        self.logger.info(
+                            f"{dataset['tile_index_file']} does not exist. "
+                            "Building a tile index from the LiDAR file headers."
                         )
-                elif "tile_index_file" not in dataset and "folder_path" not in dataset:
-                    raise Exception(
-                        "Local datasets must have either a `folder_path` or "
-                        "file_paths specified. Both are missing for dataset:"
-                        f"{dataset_name}."
+                        dataset["tile_index_file"] = self.build_tile_index(
+                            dataset_name=dataset_name,
+                            lidar_files=dataset["file_paths"],
+                            crs=dataset.get("crs", None),
+                        )
+                elif (
+                    "tile_index_file" not in dataset and len(dataset["file_paths"]) > 0
+                ):
+                    dataset["tile_index_file"] = self.build_tile_index(
+                        dataset_name=dataset_name,
+                        lidar_files=dataset["file_paths"],
+                        crs=dataset.get("crs", None),
                     )
             # Check no overlap between local and remote (API) keys
             if len(lidar_datasets_info.keys() & local_datasets.keys()) > 0:
@@ -774,6 +1104,15 @@ class BaseProcessor(abc.ABC):
             ] = self.get_instruction_path("lidar_files")
             lidar_datasets_info["local_files"]["crs"] = None
             lidar_datasets_info["local_files"]["tile_index_file"] = None
+            # Build a tile index so multiple files can be chunked
+            lidar_files = lidar_datasets_info["local_files"]["file_paths"]
+            chunk_size = self.instructions.get("processing", {}).get("chunk_size")
+            if len(lidar_files) > 1 or (len(lidar_files) == 1 and chunk_size):
+                lidar_datasets_info["local_files"][
+                    "tile_index_file"
+                ] = self.build_tile_index(
+                    dataset_name="local_files", lidar_files=lidar_files, crs=None
+                )
             # Ensure this is added to the LiDAR mapping - add if missing
             if (
                 "dataset_mapping" not in self.instructions
@@ -856,8 +1195,27 @@ class BaseProcessor(abc.ABC):
 
         return lidar_datasets_info
 
-    def create_catchment(self) -> geometry.CatchmentGeometry:
-        # create the catchment geometry object
+    def build_tile_index(
+        self, dataset_name: str, lidar_files: list, crs: dict = None
+    ) -> pathlib.Path:
+        """Build (or reuse the cached) tile index of a LiDAR dataset from the LAS/LAZ
+        file headers. The tile index is cached in the local_cache. If no CRS is
+        specified the LiDAR is assumed to be in the output CRS."""
+
+        tile_index_file = (
+            self.get_instruction_path("local_cache")
+            / "tile_indexes"
+            / f"{dataset_name}_TileIndex.gpkg"
+        )
+        horizontal_crs = (
+            crs["horizontal"] if crs is not None else self.get_crs()["horizontal"]
+        )
+        return dem.build_tile_index(
+            lidar_files=lidar_files, tile_index_file=tile_index_file, crs=horizontal_crs
+        )
+
+    def create_catchment(self, resolution: float = None) -> geometry.CatchmentGeometry:
+        # create the catchment geometry object - at the output resolution by default
         catchment_dirs = self.get_instruction_path("extents")
         assert type(catchment_dirs) is not list, (
             f"A list of `extents`s is provided: {catchment_dirs}, "
@@ -866,8 +1224,9 @@ class BaseProcessor(abc.ABC):
         catchment_geometry = geometry.CatchmentGeometry(
             catchment_dirs,
             self.get_crs(),
-            self.get_resolution(),
+            resolution if resolution is not None else self.get_resolution(),
             foreshore_buffer=2,
+            vector_cache=self.get_instruction_path("local_cache") / "vector_cache",
         )
         land_dirs = self.get_vector_or_raster_paths(
             key="land", data_type="vector", required=False
@@ -940,7 +1299,14 @@ class BaseProcessor(abc.ABC):
 class RawLidarDemGenerator(BaseProcessor):
     """RawLidarDemGenerator executes a pipeline for creating a DEM from LiDAR and
     optionally a coarse DEM. The data sources and pipeline logic is defined in the
-    json_instructions file.
+    json_instructions file. DEMs at any 'additional_resolutions' in the
+    'grid_params' are created from the same LiDAR reads and saved alongside the raw
+    DEM with the resolution appended to their name (e.g. raw_dem_2m.nc).
+
+    Similarly any 'additional_lidar_layers' in the 'general' instructions are
+    created from the same LiDAR reads. Each is keyed by name and specifies the
+    'file' to save to, the 'lidar_classifications_to_keep' and optionally the
+    'interpolation' method.
 
     See the GitHub repository wiki or GeoFabrics/tests/ for usage examples and
     other documentation.
@@ -969,6 +1335,7 @@ class RawLidarDemGenerator(BaseProcessor):
 
         # Get LiDAR data file-list - this may involve downloading lidar files
         lidar_datasets_info = self.get_lidar_datasets_info()
+        self.plan_processing(lidar_datasets_info=lidar_datasets_info)
 
         # Get the drop_offshore_lidar selection for each dataset
         drop_offshore_lidar = self.get_instruction_general("drop_offshore_lidar")
@@ -989,32 +1356,48 @@ class RawLidarDemGenerator(BaseProcessor):
         # Create folder for caching raw DEM files during DEM generation
         temp_folder = self.setup_temp_folder()
 
-        # setup the raw DEM generator
-        raw_dem = dem.RawDem(
+        # setup the raw DEM generator - and any at additional resolutions or layers
+        raw_dem = self.create_raw_dem(
             catchment_geometry=self.catchment_geometry,
             drop_offshore_lidar=drop_offshore_lidar,
             zero_positive_foreshore=zero_positive_foreshore,
-            lidar_interpolation_method=self.get_instruction_general(
-                key="interpolation", subkey="lidar"
-            ),
-            elevation_range=self.get_instruction_general("elevation_range"),
-            chunk_size=self.get_processing_instructions("chunk_size"),
-            buffer_cells=self.get_instruction_general("lidar_buffer"),
         )
+        raw_dem_path = pathlib.Path(self.get_instruction_path("raw_dem"))
+        additional_dems = {}
+        for resolution in self.get_additional_resolutions():
+            additional_dems[f"{resolution}m"] = (
+                self.create_raw_dem(
+                    catchment_geometry=self.create_catchment(resolution=resolution),
+                    drop_offshore_lidar=drop_offshore_lidar,
+                    zero_positive_foreshore=zero_positive_foreshore,
+                ),
+                raw_dem_path.with_name(
+                    f"{raw_dem_path.stem}_{resolution}m{raw_dem_path.suffix}"
+                ),
+            )
+        layers = self.get_instruction_general("additional_lidar_layers")
+        for name, layer in layers.items():
+            additional_dems[name] = (
+                self.create_raw_dem(
+                    catchment_geometry=self.catchment_geometry,
+                    drop_offshore_lidar=drop_offshore_lidar,
+                    zero_positive_foreshore=zero_positive_foreshore,
+                    lidar_interpolation_method=layer.get("interpolation", None),
+                    lidar_classifications_to_keep=layer[
+                        "lidar_classifications_to_keep"
+                    ],
+                ),
+                self.get_instruction_path("subfolder") / layer["file"],
+            )
 
         # Setup Dask cluster and client - LAZY SAVE LIDAR DEM
         dask.config.set({"distributed.comm.timeouts.connect": "120s"})
-        cluster_kwargs = {
-            "n_workers": self.get_processing_instructions("number_of_cores"),
-            "threads_per_worker": 1,
-            "processes": True,
-            "memory_limit": self.get_processing_instructions("memory_limit"),
-        }
-        cluster = distributed.LocalCluster(**cluster_kwargs)
+        cluster = distributed.LocalCluster(**self.get_cluster_kwargs())
         with cluster, distributed.Client(cluster) as client:
             client.forward_logging()  # Ensure root logging configuration is used
             self.logger.info(f"Dask client: {client}")
             self.logger.info(f"Dask dashboard: {client.dashboard_link}")
+            self.performance.record_stage(name="setup")
 
             # Load in LiDAR tiles
             raw_dem.add_lidar(
@@ -1023,90 +1406,180 @@ class RawLidarDemGenerator(BaseProcessor):
                     "lidar_classifications_to_keep"
                 ),
                 metadata=self.create_metadata(),
+                lidar_z_type=self.get_instruction_general("lidar_z_type"),
+                additional_dems=[
+                    additional_dem for additional_dem, _ in additional_dems.values()
+                ],
             )
 
-            # Save a cached copy of DEM to temporary memory cache
-            cached_file = temp_folder / "raw_lidar.nc"
-            self.logger.info(f"Save temp raw DEM to netCDF: {cached_file}")
-            raw_dem.save_and_load_dem(cached_file)
-
-            # Clip LiDAR - ensure within bounds/foreshore
-            if not self.get_instruction_general("ignore_clipping"):
-                raw_dem.clip_lidar()
-
-                # Save a cached copy of DEM to temporary memory cache
-                temp_file = temp_folder / "raw_lidar_clipped.nc"
-                self.logger.info(f"Save temp raw DEM to netCDF: {temp_file}")
-                raw_dem.save_and_load_dem(temp_file)
-
-                # Remove previous cached file and replace with new one
-                self.clean_cached_file(cached_file)
-                cached_file = temp_file
+            # Save a cached copy of each DEM - in one compute to share the reads
+            for name in additional_dems:
+                (temp_folder / name).mkdir(parents=True, exist_ok=True)
+            cached_files = [temp_folder / "raw_lidar.nc"] + [
+                temp_folder / name / "raw_lidar.nc" for name in additional_dems
+            ]
+            self.logger.info(f"Save temp raw DEMs to netCDF: {cached_files}")
+            dem.DemBase.save_and_load_dems(
+                dems=[raw_dem]
+                + [additional_dem for additional_dem, _ in additional_dems.values()],
+                filenames=cached_files,
+            )
+            self.performance.record_stage(
+                name="lidar rasterise",
+                files=cached_files,
+                dataset=raw_dem.dem,
+                lidar_bytes_read=raw_dem.lidar_bytes_read,
+            )
 
-            # Add a coarse DEM if significant area without LiDAR and a coarse DEM
-            coarse_dem_paths = self.get_vector_or_raster_paths(
-                key="coarse_dems", data_type="raster", required=False
+            # Clip, add any coarse DEMs and save each raw DEM
+            self.finish_raw_dem(
+                raw_dem=raw_dem,
+                temp_folder=temp_folder,
+                cached_file=cached_files[0],
+                raw_dem_path=raw_dem_path,
+                zero_positive_foreshore=zero_positive_foreshore,
             )
-            if (
-                self.check_vector_or_raster(key="coarse_dems", api_type="raster")
-                and len(coarse_dem_paths) == 0
+            del raw_dem
+            for (name, (additional_dem, additional_path)), cached_file in zip(
+                additional_dems.items(), cached_files[1:]
             ):
-                logging.warning(
-                    "The coarse dem keyword specified in the instructions file, "
-                    "but no paths recovered - empty list. Please check the "
-                    "instruction file contents."
-                )
-            elif len(coarse_dem_paths) > 0:
-                self.logger.info(f"Incorporating coarse DEMs: {coarse_dem_paths}")
-                del raw_dem
-                raw_dem = dem.PatchDem(
-                    catchment_geometry=self.catchment_geometry,
-                    patch_on_top=False,
-                    drop_patch_offshore=True,
+                self.finish_raw_dem(
+                    raw_dem=additional_dem,
+                    temp_folder=temp_folder / name,
+                    cached_file=cached_file,
+                    raw_dem_path=additional_path,
                     zero_positive_foreshore=zero_positive_foreshore,
-                    initial_dem_path=cached_file,
-                    elevation_range=self.get_instruction_general("elevation_range"),
-                    chunk_size=self.get_processing_instructions("chunk_size"),
-                    buffer_cells=self.get_instruction_general("lidar_buffer"),
+                    label=f" {name}",
                 )
-
-                # Add coarse DEMs if there are any and if area
-                for coarse_dem_path in coarse_dem_paths:
-                    # Stop if no areas (on land and foreshore) still without values
-                    if not raw_dem.no_values_mask.any():
-                        self.logger.info(
-                            "No land and foreshore areas without elevation "
-                            "values. Ignoring all remaining coarse DEMs."
-                        )
-                        break
-
-                    status = raw_dem.add_patch(
-                        patch_path=coarse_dem_path, label="coarse DEM", layer="z"
-                    )
-                    if status:  # Only update if patch sucessfully added
-                        temp_file = temp_folder / f"raw_dem_{coarse_dem_path.stem}.nc"
-                        self.logger.info(f"Save temp raw DEM to netCDF: {temp_file}")
-                        raw_dem.save_and_load_dem(temp_file)
-
-                        # Remove previous cached file and replace with new one
-                        self.clean_cached_file(cached_file)
-                        cached_file = temp_file
-
-            # Save raw DEM and clean temp folder
-            self.save_dem(
-                filename=pathlib.Path(self.get_instruction_path("raw_dem")),
-                dataset=raw_dem.dem,
-                generator=raw_dem,
-                compression=self.get_instruction_general("compression"),
-            )
-            del raw_dem
+            del additional_dems
             self.clean_temp_folder(temp_folder)
+            self.evict_from_point_cache()
         if self.debug:
             # Record the parameter used during execution - append to existing
             subfolder = self.get_instruction_path("subfolder")
             with open(subfolder / "dem_instructions.json", "a") as file_pointer:
                 json.dump(self.instructions, file_pointer, sort_keys=True, indent=2)
 
+    def create_raw_dem(
+        self,
+        catchment_geometry: geometry.CatchmentGeometry,
+        drop_offshore_lidar: dict,
+        zero_positive_foreshore: bool,
+        lidar_interpolation_method: str = None,
+        lidar_classifications_to_keep: list = None,
+    ) -> dem.RawDem:
+        """Create a raw DEM generator for the catchment geometry. The LiDAR
+        interpolation method defaults to that in the instructions."""
+
+        if lidar_interpolation_method is None:
+            lidar_interpolation_method = self.get_instruction_general(
+                key="interpolation", subkey="lidar"
+            )
+        return dem.RawDem(
+            catchment_geometry=catchment_geometry,
+            drop_offshore_lidar=drop_offshore_lidar,
+            zero_positive_foreshore=zero_positive_foreshore,
+            lidar_interpolation_method=lidar_interpolation_method,
+            lidar_classifications_to_keep=lidar_classifications_to_keep,
+            elevation_range=self.get_instruction_general("elevation_range"),
+            chunk_size=self.get_processing_instructions("chunk_size"),
+            buffer_cells=self.get_instruction_general("lidar_buffer"),
+            kdtree_workers=self.get_kdtree_workers(),
+            point_cache=self.get_point_cache(),
+        )
+
+    def finish_raw_dem(
+        self,
+        raw_dem: dem.RawDem,
+        temp_folder: pathlib.Path,
+        cached_file: pathlib.Path,
+        raw_dem_path: pathlib.Path,
+        zero_positive_foreshore: bool,
+        label: str = "",
+    ):
+        """Clip and add any coarse DEMs to a raw DEM with LiDAR added and cached
+        to the cached_file, and then save it. The label is appended to the recorded
+        stage names."""
+
+        # Clip LiDAR - ensure within bounds/foreshore
+        if not self.get_instruction_general("ignore_clipping"):
+            raw_dem.clip_lidar()
+
+            # Save a cached copy of DEM to temporary memory cache
+            temp_file = temp_folder / "raw_lidar_clipped.nc"
+            self.logger.info(f"Save temp raw DEM to netCDF: {temp_file}")
+            raw_dem.save_and_load_dem(temp_file)
+            self.performance.record_stage(
+                name=f"clip{label}", files=[temp_file], dataset=raw_dem.dem
+            )
+
+            # Remove previous cached file and replace with new one
+            self.clean_cached_file(cached_file)
+            cached_file = temp_file
+
+        # Add a coarse DEM if significant area without LiDAR and a coarse DEM
+        coarse_dem_paths = self.get_vector_or_raster_paths(
+            key="coarse_dems", data_type="raster", required=False
+        )
+        if (
+            self.check_vector_or_raster(key="coarse_dems", api_type="raster")
+            and len(coarse_dem_paths) == 0
+        ):
+            logging.warning(
+                "The coarse dem keyword specified in the instructions file, "
+                "but no paths recovered - empty list. Please check the "
+                "instruction file contents."
+            )
+        elif len(coarse_dem_paths) > 0:
+            self.logger.info(f"Incorporating coarse DEMs: {coarse_dem_paths}")
+            catchment_geometry = raw_dem.catchment_geometry
+            del raw_dem
+            raw_dem = dem.PatchDem(
+                catchment_geometry=catchment_geometry,
+                patch_on_top=False,
+                drop_patch_offshore=True,
+                zero_positive_foreshore=zero_positive_foreshore,
+                initial_dem_path=cached_file,
+                elevation_range=self.get_instruction_general("elevation_range"),
+                chunk_size=self.get_processing_instructions("chunk_size"),
+                buffer_cells=self.get_instruction_general("lidar_buffer"),
+            )
+
+            # Add coarse DEMs if there are any and if area
+            for coarse_dem_path in coarse_dem_paths:
+                # Stop if no areas (on land and foreshore) still without values
+                if not raw_dem.no_values_mask.any():
+                    self.logger.info(
+                        "No land and foreshore areas without elevation "
+                        "values. Ignoring all remaining coarse DEMs."
+                    )
+                    break
+
+                status = raw_dem.add_patch(
+                    patch_path=coarse_dem_path, label="coarse DEM", layer="z"
+                )
+                if status:  # Only update if patch sucessfully added
+                    temp_file = temp_folder / f"raw_dem_{coarse_dem_path.stem}.nc"
+                    self.logger.info(f"Save temp raw DEM to netCDF: {temp_file}")
+                    raw_dem.save_and_load_dem(temp_file)
+                    self.performance.record_stage(
+                        name=f"coarse DEM {coarse_dem_path.stem}{label}",
+                        files=[temp_file],
+                        dataset=raw_dem.dem,
+                    )
+
+                    # Remove previous cached file and replace with new one
+                    self.clean_cached_file(cached_file)
+                    cached_file = temp_file
+
+        # Save raw DEM
+        self.save_dem(
+            filename=raw_dem_path,
+            dataset=raw_dem.dem,
+            generator=raw_dem,
+            compression=self.get_instruction_general("compression"),
+        )
+
 
 class HydrologicDemGenerator(BaseProcessor):
     """HydrologicDemGenerator executes a pipeline for loading in a DEM then
@@ -1206,6 +1679,9 @@ class HydrologicDemGenerator(BaseProcessor):
                 temp_file = temp_folder / "dem_added_ocean.nc"
                 self.logger.info(f"Save DEM with ocean to netCDF: {temp_file}")
                 hydrologic_dem.save_and_load_dem(temp_file)
+                self.performance.record_stage(
+                    name="ocean", files=[temp_file], dataset=hydrologic_dem.dem
+                )
                 cached_file = temp_file
             elif len(ocean_data_dirs) > 0 and ocean_data_key == "ocean_contours":
                 ocean_data = geometry.BathymetryContours(
@@ -1221,6 +1697,9 @@ class HydrologicDemGenerator(BaseProcessor):
                 temp_file = temp_folder / "dem_added_ocean.nc"
                 self.logger.info(f"Save DEM with ocean to netCDF: {temp_file}")
                 hydrologic_dem.save_and_load_dem(temp_file)
+                self.performance.record_stage(
+                    name="ocean", files=[temp_file], dataset=hydrologic_dem.dem
+                )
                 cached_file = temp_file
         # Check for waterways and interpolate if they exist
         if "waterways" in self.instructions["data_paths"]:
@@ -1270,6 +1749,9 @@ class HydrologicDemGenerator(BaseProcessor):
                     f"Save temp DEM with waterways added to netCDF: {temp_file}"
                 )
                 hydrologic_dem.save_and_load_dem(temp_file)
+                self.performance.record_stage(
+                    name="waterways", files=[temp_file], dataset=hydrologic_dem.dem
+                )
                 # Remove previous cached file and replace with new one
                 if cached_file is not None:
                     self.clean_cached_file(cached_file)
@@ -1335,6 +1817,11 @@ class HydrologicDemGenerator(BaseProcessor):
                     f"Save temp DEM with lake {index + 1} added to netCDF: {temp_file}"
                 )
                 hydrologic_dem.save_and_load_dem(temp_file)
+                self.performance.record_stage(
+                    name=f"lake {index + 1}",
+                    files=[temp_file],
+                    dataset=hydrologic_dem.dem,
+                )
                 # Remove previous cached file and replace with new one
                 if cached_file is not None:
                     self.clean_cached_file(cached_file)
@@ -1399,6 +1886,11 @@ class HydrologicDemGenerator(BaseProcessor):
                     f"Save temp DEM with rivers added to netCDF: {temp_file}"
                 )
                 hydrologic_dem.save_and_load_dem(temp_file)
+                self.performance.record_stage(
+                    name=f"river {index + 1}",
+                    files=[temp_file],
+                    dataset=hydrologic_dem.dem,
+                )
                 # Remove previous cached file and replace with new one
                 if cached_file is not None:
                     self.clean_cached_file(cached_file)
@@ -1450,6 +1942,9 @@ class HydrologicDemGenerator(BaseProcessor):
                     f"Save temp DEM with stopbanks added to netCDF: {temp_file}"
                 )
                 hydrologic_dem.save_and_load_dem(temp_file)
+                self.performance.record_stage(
+                    name="stopbanks", files=[temp_file], dataset=hydrologic_dem.dem
+                )
                 # Remove previous cached file and replace with new one
                 if cached_file is not None:
                     self.clean_cached_file(cached_file)
@@ -1477,6 +1972,11 @@ class HydrologicDemGenerator(BaseProcessor):
                     f"Save temp DEM with feature_masking added to netCDF: {temp_file}"
                 )
                 hydrologic_dem.save_and_load_dem(temp_file)
+                self.performance.record_stage(
+                    name="feature masking",
+                    files=[temp_file],
+                    dataset=hydrologic_dem.dem,
+                )
                 if cached_file is not None:
                     self.clean_cached_file(cached_file)
                 cached_file = temp_file
@@ -1498,16 +1998,11 @@ class HydrologicDemGenerator(BaseProcessor):
         temp_folder = self.setup_temp_folder()
 
         # Setup Dask cluster and client - LAZY SAVE LIDAR DEM
-        cluster_kwargs = {
-            "n_workers": self.get_processing_instructions("number_of_cores"),
-            "threads_per_worker": 1,
-            "processes": True,
-            "memory_limit": self.get_processing_instructions("memory_limit"),
-        }
-        cluster = distributed.LocalCluster(**cluster_kwargs)
+        cluster = distributed.LocalCluster(**self.get_cluster_kwargs())
         with cluster, distributed.Client(cluster) as client:
             self.logger.info(f"Dask client: {client}")
             self.logger.info(f"Dask dashboard: {client.dashboard_link}")
+            self.performance.record_stage(name="setup")
             client.forward_logging()  # Ensure root logging configuration is used
 
             # setup the hydrologically conditioned DEM generator
@@ -1518,6 +2013,7 @@ class HydrologicDemGenerator(BaseProcessor):
                 interpolation_method=self.get_instruction_general(
                     key="interpolation", subkey="no_data"
                 ),
+                kdtree_workers=self.get_kdtree_workers(),
             )
 
             # Check for and add any bathymetry information
@@ -1614,16 +2110,11 @@ class PatchDemGenerator(BaseProcessor):
         cached_file = None
 
         # Setup Dask cluster and client - LAZY SAVE LIDAR DEM
-        cluster_kwargs = {
-            "n_workers": self.get_processing_instructions("number_of_cores"),
-            "threads_per_worker": 1,
-            "processes": True,
-            "memory_limit": self.get_processing_instructions("memory_limit"),
-        }
-        cluster = distributed.LocalCluster(**cluster_kwargs)
+        cluster = distributed.LocalCluster(**self.get_cluster_kwargs())
         with cluster, distributed.Client(cluster) as client:
             self.logger.info(f"Dask client: {client}")
             self.logger.info(f"Dask dashboard: {client.dashboard_link}")
+            self.performance.record_stage(name="setup")
             client.forward_logging()  # Ensure root logging configuration is used
 
             layer = self.get_patch_instruction("layer")
@@ -1658,6 +2149,11 @@ class PatchDemGenerator(BaseProcessor):
                 temp_file = temp_folder / f"raw_dem_{patch_path.stem}.nc"
                 self.logger.info(f"Save patched DEM to netCDF: {temp_file}")
                 patch_dem.save_and_load_dem(temp_file)
+                self.performance.record_stage(
+                    name=f"patch {patch_path.stem}",
+                    files=[temp_file],
+                    dataset=patch_dem.dem,
+                )
                 # Remove previous cached file and replace with new one
                 if cached_file is not None:
                     self.clean_cached_file(cached_file)
@@ -1896,6 +2392,7 @@ class RoughnessLengthGenerator(BaseProcessor):
 
         # Get LiDAR data file-list - this may involve downloading lidar files
         lidar_datasets_info = self.get_lidar_datasets_info()
+        self.plan_processing(lidar_datasets_info=lidar_datasets_info)
 
         # Get the drop_offshore_lidar selection for each dataset
         drop_offshore_lidar = self.get_instruction_general("drop_offshore_lidar")
@@ -1925,16 +2422,11 @@ class RoughnessLengthGenerator(BaseProcessor):
         temp_folder = self.setup_temp_folder()
 
         # Setup Dask cluster and client
-        cluster_kwargs = {
-            "n_workers": self.get_processing_instructions("number_of_cores"),
-            "threads_per_worker": 1,
-            "processes": True,
-            "memory_limit": self.get_processing_instructions("memory_limit"),
-        }
-        cluster = distributed.LocalCluster(**cluster_kwargs)
+        cluster = distributed.LocalCluster(**self.get_cluster_kwargs())
         with cluster, distributed.Client(cluster) as client:
             self.logger.info(f"Dask client: {client}")
             self.logger.info(f"Dask dashboard: {client.dashboard_link}")
+            self.performance.record_stage(name="setup")
             client.forward_logging()  # Ensure root logging configuration is used
 
             # setup the roughness DEM generator
@@ -1949,6 +2441,8 @@ class RoughnessLengthGenerator(BaseProcessor):
                 ),
                 default_values=default_values,
                 drop_offshore_lidar=drop_offshore_lidar,
+                kdtree_workers=self.get_kdtree_workers(),
+                point_cache=self.get_point_cache(),
             )
 
             # Load in LiDAR tiles
@@ -1958,8 +2452,16 @@ class RoughnessLengthGenerator(BaseProcessor):
                     "lidar_classifications_to_keep"
                 ),
                 metadata=self.create_metadata(),
+                lidar_z_type=self.get_instruction_general("lidar_z_type"),
                 parameters=roughness_parameters,
             )  # Note must be called after all others if it is to be complete
+            self.performance.record_stage(
+                name="lidar rasterise",
+                files=[temp_folder / "raw_lidar_zo.nc"],
+                dataset=roughness_dem.dem,
+                lidar_bytes_read=roughness_dem.lidar_bytes_read,
+            )
+            self.evict_from_point_cache()
 
             # If roads save temp then add in the roads
             if roads is not None and roads.area.sum() > 0:
@@ -1977,6 +2479,9 @@ class RoughnessLengthGenerator(BaseProcessor):
                 temp_file = temp_folder / "geofabric_added_roads.nc"
                 self.logger.info(f"Save geofabric with roads to netCDF: {temp_file}")
                 roughness_dem.save_and_load_dem(temp_file)
+                self.performance.record_stage(
+                    name="roads", files=[temp_file], dataset=roughness_dem.dem
+                )
                 self.clean_cached_file(cached_file)
                 cached_file = temp_file
 
@@ -2057,7 +2562,7 @@ class MeasuredRiverGenerator(BaseProcessor):
         # Only create for the two closest points to the river mouth
         # And ensure is perpindicular to the river mouth
         riverlines = geopandas.read_file(self.get_instruction_path("riverbanks"))
-        elevations = geopandas.read_file(river_elevation_file)
+        elevations = geometry.read_vector(river_elevation_file)
         # Resample river edges at same spacing as used to interpolate
         n = len(elevations.groupby("level_0"))
         normalised_locations = numpy.arange(n) * 1 / n
@@ -2092,14 +2597,18 @@ class MeasuredRiverGenerator(BaseProcessor):
                 ),
             ]
         )
-        defaults["river_centreline"] = "river_centreline_for_fan.geojson"
+        defaults["river_centreline"] = self.get_vector_file_name(
+            "river_centreline_for_fan.geojson"
+        )
         river_centreline_file = self.get_instruction_path(
             "river_centreline", defaults=defaults
         )
         river_centreline = geopandas.GeoDataFrame(geometry=[river_centreline], crs=crs)
-        river_centreline.to_file(river_centreline_file)
+        geometry.write_vector(river_centreline, river_centreline_file)
         # Create the river bathmetries with needed widths and geometry
-        defaults["river_bathymetry"] = "river_bathymetry_for_fan.geojson"
+        defaults["river_bathymetry"] = self.get_vector_file_name(
+            "river_bathymetry_for_fan.geojson"
+        )
         river_bathymetry_file = self.get_instruction_path(
             "river_bathymetry", defaults=defaults
         )
@@ -2117,7 +2626,7 @@ class MeasuredRiverGenerator(BaseProcessor):
         ]
         # Add signifiers of being zero offset at bank edge and source of data
         elevations_clean["source"] = "measured"
-        elevations_clean.to_file(river_bathymetry_file)
+        geometry.write_vector(elevations_clean, river_bathymetry_file)
 
         # Create fan object
         if self.check_vector_or_raster(key="ocean_points", api_type="vector"):
@@ -2134,23 +2643,24 @@ class MeasuredRiverGenerator(BaseProcessor):
             cross_section_spacing=cross_section_spacing,
             elevation_labels=["z"],
             ocean_contour_depth_label=ocean_contour_depth_label,
+            vector_cache=self.get_instruction_path("local_cache") / "vector_cache",
         )
 
         # Estimate the fan extents and bathymetry
         fan_polygon, fan_bathymetry = fan.polygon_and_bathymetry()
-        river_polygon = geopandas.read_file(river_polygon_file)
+        river_polygon = geometry.read_vector(river_polygon_file)
 
         # Combine and save the river and fan geometries
         elevations["source"] = "measured"
-        elevations.to_file(river_bathymetry_file)
+        geometry.write_vector(elevations, river_bathymetry_file)
         fan_bathymetry["source"] = "fan"
         combined_bathymetry = geopandas.GeoDataFrame(
             pandas.concat([elevations, fan_bathymetry], ignore_index=True),
             crs=elevations_clean.crs,
         )
-        combined_bathymetry.to_file(river_bathymetry_file)
+        geometry.write_vector(combined_bathymetry, river_bathymetry_file)
         combined_polygon = river_polygon.overlay(fan_polygon, how="union")
-        combined_polygon.to_file(river_polygon_file)
+        geometry.write_vector(combined_polygon, river_polygon_file)
 
     def run(self):
         """This method extracts a main channel then executes the DemGeneration
@@ -2166,8 +2676,8 @@ class MeasuredRiverGenerator(BaseProcessor):
 
         # create the measured river interpolator object
         defaults = {
-            "result_polygon": "river_polygon.geojson",
-            "result_elevation": "river_elevations.geojson",
+            "result_polygon": self.get_vector_file_name("river_polygon.geojson"),
+            "result_elevation": self.get_vector_file_name("river_elevations.geojson"),
         }
         result_polygon_file = self.get_instruction_path(
             "result_polygon", defaults=defaults
@@ -2199,13 +2709,13 @@ class MeasuredRiverGenerator(BaseProcessor):
             )
 
             # Save the generated polygon and measured elevations
-            river_polygon.to_file(result_polygon_file)
-            river_elevations.to_file(result_elevations_file)
+            geometry.write_vector(river_polygon, result_polygon_file)
+            geometry.write_vector(river_elevations, result_elevations_file)
 
         # Estimate a river fan if `estimate_fan` is True
         if self.get_measured_instruction("estimate_fan"):
             # Check if already done
-            result_elevations = geopandas.read_file(result_elevations_file)
+            result_elevations = geometry.read_vector(result_elevations_file)
             if (
                 not ("source" in result_elevations.columns)
                 or not ("fan" == result_elevations["source"]).any()
@@ -2279,7 +2789,7 @@ class RiverBathymetryGenerator(BaseProcessor):
                 return files_exist
             else:
                 # True if fan source in bathymetry
-                bathymetry = geopandas.read_file(river_bathymetry_file)
+                bathymetry = geometry.read_vector(river_bathymetry_file)
                 return (bathymetry["source"] == "fan").any()
 
     def alignment_exists(self) -> bool:
@@ -2312,15 +2822,23 @@ class RiverBathymetryGenerator(BaseProcessor):
 
             # key to output name mapping
             name_dictionary = {
-                "aligned": f"aligned_river_centreline_{area_threshold}.geojson",
-                "river_characteristics": "river_characteristics.geojson",
-                "river_polygon": "river_polygon.geojson",
-                "river_bathymetry": "river_bathymetry.geojson",
+                "aligned": self.get_vector_file_name(
+                    f"aligned_river_centreline_{area_threshold}.geojson"
+                ),
+                "river_characteristics": self.get_vector_file_name(
+                    "river_characteristics.geojson"
+                ),
+                "river_polygon": self.get_vector_file_name("river_polygon.geojson"),
+                "river_bathymetry": self.get_vector_file_name(
+                    "river_bathymetry.geojson"
+                ),
                 "gnd_dem": "raw_gnd_dem.nc",
                 "gnd_dem_extents": "raw_gnd_extents.geojson",
                 "veg_dem": "raw_veg_dem.nc",
                 "veg_dem_extents": "raw_veg_extents.geojson",
-                "catchment": f"river_catchment_{area_threshold}.geojson",
+                "catchment": self.get_vector_file_name(
+                    f"river_catchment_{area_threshold}.geojson"
+                ),
                 "network": f"network_river_centreline_{area_threshold}.geojson",
                 "network_smoothed": f"network_river_centreline_{area_threshold}_"
                 "smoothed.geojson",
@@ -2356,6 +2874,7 @@ class RiverBathymetryGenerator(BaseProcessor):
             "keep_downstream_osm": False,
             "estimate_fan": False,
             "upstream_smoothing_factor": 25,  # i.e. 25 x cross_section_spacing
+            "veg_lidar_interpolation": None,  # i.e. the general LiDAR interpolation
         }
 
         assert key in defaults or key in self.instructions["rivers"], (
@@ -2396,6 +2915,8 @@ class RiverBathymetryGenerator(BaseProcessor):
                 sampling_direction=self.get_bathymetry_instruction(
                     "sampling_direction"
                 ),
+                cache_folder=self.get_instruction_path("local_cache")
+                / "network_graphs",
             )
 
             if self.debug:
@@ -2435,7 +2956,7 @@ class RiverBathymetryGenerator(BaseProcessor):
             channel_catchment = channel.get_channel_catchment(
                 corridor_radius=river_corridor_width / 2
             )
-            channel_catchment.to_file(catchment_file)
+            geometry.write_vector(channel_catchment, catchment_file)
         # Remove bathymetry contour information if it exists while creating DEMs
         bathy_data_paths = None
         bathy_apis = None
@@ -2448,16 +2969,41 @@ class RiverBathymetryGenerator(BaseProcessor):
             bathy_apis = self.instructions["datasets"]["vector"]["linz"].pop(
                 "ocean_contours"
             )
+        # Create both DEMs from one read of the LiDAR if neither exists yet
+        if not gnd_file.is_file() and not veg_file.is_file():
+            self.logger.info("Generating ground and vegetation DEMs.")
+            instruction_paths["raw_dem"] = str(self.get_result_file_name(key="gnd_dem"))
+            self.instructions["general"]["additional_lidar_layers"] = {
+                "veg": {
+                    "file": str(self.get_result_file_name(key="veg_dem")),
+                    "lidar_classifications_to_keep": self.get_bathymetry_instruction(
+                        "veg_lidar_classifications_to_keep"
+                    ),
+                    "interpolation": self.get_bathymetry_instruction(
+                        "veg_lidar_interpolation"
+                    ),
+                }
+            }
+            try:
+                runner = RawLidarDemGenerator(self.instructions)
+                runner.run()
+            finally:
+                instruction_paths.pop("raw_dem")
+                self.instructions["general"].pop("additional_lidar_layers")
+            del runner
+            gc.collect()
         # Get the ground DEM
         if not gnd_file.is_file():
             # Create the ground DEM file if this has not be created yet!
             self.logger.info("Generating ground DEM.")
             instruction_paths["raw_dem"] = str(self.get_result_file_name(key="gnd_dem"))
-            runner = RawLidarDemGenerator(self.instructions)
-            runner.run()
+            try:
+                runner = RawLidarDemGenerator(self.instructions)
+                runner.run()
+            finally:
+                instruction_paths.pop("raw_dem")
             del runner
             gc.collect()
-            instruction_paths.pop("raw_dem")
         # Load the Ground DEM
         self.logger.info("Loading ground DEM.")  # drop band added by rasterio.open()
         gnd_dem = rioxarray.rioxarray.open_rasterio(gnd_file, masked=True).squeeze(
@@ -2467,15 +3013,25 @@ class RiverBathymetryGenerator(BaseProcessor):
         if not veg_file.is_file():
             # Create the catchment file if this has not be created yet!
             self.logger.info("Generating vegetation DEM.")
+            general = copy.deepcopy(self.instructions["general"])
             self.instructions["general"][
                 "lidar_classifications_to_keep"
             ] = self.get_bathymetry_instruction("veg_lidar_classifications_to_keep")
+            if self.get_bathymetry_instruction("veg_lidar_interpolation") is not None:
+                self.get_instruction_general(key="interpolation", subkey="lidar")
+                self.instructions["general"]["interpolation"][
+                    "lidar"
+                ] = self.get_bathymetry_instruction("veg_lidar_interpolation")
             instruction_paths["raw_dem"] = str(self.get_result_file_name(key="veg_dem"))
-            runner = RawLidarDemGenerator(self.instructions)
-            runner.run()
+            try:
+                runner = RawLidarDemGenerator(self.instructions)
+                runner.run()
+            finally:
+                # Restore the ground classifications and interpolation
+                instruction_paths.pop("raw_dem")
+                self.instructions["general"] = general
             del runner
             gc.collect()
-            instruction_paths.pop("raw_dem")
         # Load the Veg DEM - drop band added by rasterio.open()
         self.logger.info("Loading the vegetation DEM.")
         veg_dem = dem.rioxarray.rioxarray.open_rasterio(veg_file, masked=True).squeeze(
@@ -2531,7 +3087,7 @@ class RiverBathymetryGenerator(BaseProcessor):
 
         # Save out results
         aligned_channel_file = self.get_result_file_path(key="aligned")
-        aligned_channel.to_file(aligned_channel_file)
+        geometry.write_vector(aligned_channel, aligned_channel_file)
         if self.debug:
             sampled_cross_sections[
                 ["width_line", "valid", "channel_count"]
@@ -2577,7 +3133,7 @@ class RiverBathymetryGenerator(BaseProcessor):
             max_threshold=max_bank_height,
         )
 
-        river_polygon.to_file(self.get_result_file_path("river_polygon"))
+        geometry.write_vector(river_polygon, self.get_result_file_path("river_polygon"))
         columns = ["geometry"]
         columns.extend(
             [
@@ -2592,9 +3148,12 @@ class RiverBathymetryGenerator(BaseProcessor):
                 or "bank_i" in column_name
             ]
         )
-        sampled_cross_sections.set_geometry("river_polygon_midpoint", drop=True)[
-            columns
-        ].to_file(self.get_result_file_path(key="river_characteristics"))
+        geometry.write_vector(
+            sampled_cross_sections.set_geometry("river_polygon_midpoint", drop=True)[
+                columns
+            ],
+            self.get_result_file_path(key="river_characteristics"),
+        )
 
         if self.debug:
             # Write out optional outputs
@@ -2666,7 +3225,7 @@ class RiverBathymetryGenerator(BaseProcessor):
             )
         else:
             aligned_channel_file = self.get_result_file_path(key="aligned")
-            aligned_channel = geopandas.read_file(aligned_channel_file)
+            aligned_channel = geometry.read_vector(aligned_channel_file)
         return channel_width, aligned_channel
 
     def align_channel_from_osm(
@@ -2806,7 +3365,9 @@ class RiverBathymetryGenerator(BaseProcessor):
             sampling_direction=1,
         )
         smoothed_osm_channel = osm_channel.get_parametric_spline_fit()
-        smoothed_osm_channel.to_file(self.get_result_file_path(key="aligned"))
+        geometry.write_vector(
+            smoothed_osm_channel, self.get_result_file_path(key="aligned")
+        )
         # Get DEMs - create and save if don't exist
         gnd_dem, veg_dem = self.get_dems(channel=osm_channel)
 
@@ -2897,7 +3458,7 @@ class RiverBathymetryGenerator(BaseProcessor):
         """
 
         # Read in the flow file and calcaulate the depths - write out the results
-        width_values = geopandas.read_file(
+        width_values = geometry.read_vector(
             self.get_result_file_path(key="river_characteristics")
         )
         width_values["source"] = "river"  # Specify as coming form river estimation
@@ -2908,14 +3469,16 @@ class RiverBathymetryGenerator(BaseProcessor):
             numpy.ones(len(width_values["widths"]), dtype=float) * numpy.nan
         )
         # Add the friction and flow values to the widths and slopes
-        width_values["mannings_n"] = numpy.zeros(len(width_values["id"]), dtype=int)
-        width_values["flow"] = numpy.zeros(len(width_values["id"]), dtype=int)
-        for i, row in width_values.iterrows():
-            if row.geometry is not None and not row.geometry.is_empty:
-                distances = channel.channel.distance(width_values.loc[i].geometry)
-                width_values.loc[i, ("id", "flow", "mannings_n")] = channel.channel[
-                    distances == distances.min()
-                ][["id", "flow", "mannings_n"]].min()
+        width_values["mannings_n"] = numpy.zeros(len(width_values["id"]), dtype=float)
+        width_values["flow"] = numpy.zeros(len(width_values["id"]), dtype=float)
+        nearest_values = bathymetry_estimation.nearest_reach_values(
+            samples=width_values,
+            reaches=channel.channel,
+            columns=["id", "flow", "mannings_n"],
+        )
+        width_values.loc[
+            nearest_values.index, ["id", "flow", "mannings_n"]
+        ] = nearest_values.to_numpy()
         # Fill in any missing values
         width_values["id"] = (
             width_values["id"].fillna(method="ffill").fillna(method="bfill")
@@ -3042,9 +3605,12 @@ class RiverBathymetryGenerator(BaseProcessor):
                 ]
             )
         # Save the widths and depths
-        width_values[values_to_save].rename(
-            columns={min_z_name: "bank_height", width_name: "width"}
-        ).to_file(self.get_result_file_path(key="river_bathymetry"))
+        geometry.write_vector(
+            width_values[values_to_save].rename(
+                columns={min_z_name: "bank_height", width_name: "width"}
+            ),
+            self.get_result_file_path(key="river_bathymetry"),
+        )
 
     def _calculate_neal_et_al_depth(
         self, width_values, width_name, slope_name, threshold_name
@@ -3177,12 +3743,13 @@ class RiverBathymetryGenerator(BaseProcessor):
                 "bed_elevation_Rupp_and_Smart",
             ],
             ocean_contour_depth_label=ocean_contour_depth_label,
+            vector_cache=self.get_instruction_path("local_cache") / "vector_cache",
         )
 
         # Estimate the fan extents and bathymetry
         fan_polygon, fan_bathymetry = fan.polygon_and_bathymetry()
-        river_bathymetry = geopandas.read_file(river_bathymetry_file)
-        river_polygon = geopandas.read_file(river_polygon_file)
+        river_bathymetry = geometry.read_vector(river_bathymetry_file)
+        river_polygon = geometry.read_vector(river_polygon_file)
 
         # Combine and save the river and fan geometries
         fan_bathymetry["source"] = "fan"
@@ -3193,7 +3760,7 @@ class RiverBathymetryGenerator(BaseProcessor):
             ),
             crs=river_bathymetry.crs,
         )
-        combined_bathymetry.to_file(river_bathymetry_file)
+        geometry.write_vector(combined_bathymetry, river_bathymetry_file)
         combined_polygon = river_polygon.overlay(fan_polygon, how="union")
         combined_polygon = (
             geopandas.GeoDataFrame(
@@ -3202,7 +3769,7 @@ class RiverBathymetryGenerator(BaseProcessor):
             .dissolve()
             .buffer(-self.get_resolution())
         )
-        combined_polygon.to_file(river_polygon_file)
+        geometry.write_vector(combined_polygon, river_polygon_file)
 
     def run(self):
         """This method extracts a main channel then executes the DemGeneration
@@ -3302,7 +3869,9 @@ class WaterwayBedElevationEstimator(BaseProcessor):
             "waterways_polygon": f"waterways_polygon_{index}.geojson",
             "waterways": "waterways.geojson",
         }
-        return name_dictionary[key]
+        if key == "raw_dem":
+            return name_dictionary[key]
+        return self.get_vector_file_name(name_dictionary[key])
 
     def get_result_file_path(self, key: str, index: int = None) -> pathlib.Path:
         """Return the file name of the file to save with the local cache path.
@@ -3379,10 +3948,15 @@ class WaterwayBedElevationEstimator(BaseProcessor):
         # If no closed waterways write out empty files and return
         if len(closed_waterways) == 0:
             closed_waterways["z"] = []
-            closed_waterways.set_geometry("polygon", drop=True)[
-                ["geometry", "width", "z"]
-            ].to_file(polygon_file)
-            closed_waterways.drop(columns=["polygon"]).to_file(elevation_file)
+            geometry.write_vector(
+                closed_waterways.set_geometry("polygon", drop=True)[
+                    ["geometry", "width", "z"]
+                ],
+                polygon_file,
+            )
+            geometry.write_vector(
+                closed_waterways.drop(columns=["polygon"]), elevation_file
+            )
             return
 
         # Sample the minimum elevation at each tunnel
@@ -3442,10 +4016,13 @@ class WaterwayBedElevationEstimator(BaseProcessor):
         closed_waterways = closed_waterways[nan_filter]
 
         # Save out polygons and elevations
-        closed_waterways.set_geometry("polygon", drop=True)[
-            ["geometry", "width", "z"]
-        ].to_file(polygon_file)
-        points_exploded.to_file(elevation_file)
+        geometry.write_vector(
+            closed_waterways.set_geometry("polygon", drop=True)[
+                ["geometry", "width", "z"]
+            ],
+            polygon_file,
+        )
+        geometry.write_vector(points_exploded, elevation_file)
 
     def estimate_open_elevations(self, waterways: geopandas.GeoDataFrame):
         """Sample the DEM along the open waterways to enforce a decreasing elevation."""
@@ -3497,12 +4074,14 @@ class WaterwayBedElevationEstimator(BaseProcessor):
         open_waterways = open_waterways[nan_filter]
 
         # save out the polygons
-        open_waterways.buffer(open_waterways["width"].to_numpy()).to_file(polygon_file)
+        geometry.write_vector(
+            open_waterways.buffer(open_waterways["width"].to_numpy()), polygon_file
+        )
 
         # If no closed waterways write out empty files and return
         if len(open_waterways) == 0:
             open_waterways["z"] = []
-            open_waterways.to_file(elevation_file)
+            geometry.write_vector(open_waterways, elevation_file)
             return
 
         # Sample down-slope location along each line
@@ -3549,7 +4128,7 @@ class WaterwayBedElevationEstimator(BaseProcessor):
             open_waterways.loc[index, "z"] = zs
 
         # Check open waterways take into account culvert bed elevations
-        closed_polygons = geopandas.read_file(
+        closed_polygons = geometry.read_vector(
             self.get_result_file_path(key="closed_polygon")
         )
         # Check each culvert
@@ -3569,7 +4148,9 @@ class WaterwayBedElevationEstimator(BaseProcessor):
                 waterway_points["z"]
             )
         # Save bathymetry
-        open_waterways[["geometry", "width", "z"]].to_file(elevation_file)
+        geometry.write_vector(
+            open_waterways[["geometry", "width", "z"]], elevation_file
+        )
 
     def create_dem(self, waterways: geopandas.GeoDataFrame) -> xarray.Dataset:
         """Create and return a DEM at a resolution 1.5x the waterway width."""
@@ -3586,7 +4167,7 @@ class WaterwayBedElevationEstimator(BaseProcessor):
                 waterways_polygon = geopandas.GeoDataFrame(
                     geometry=[row.geometry.buffer(row.width)], crs=waterways.crs
                 )
-                waterways_polygon.to_file(waterways_polygon_file)
+                geometry.write_vector(waterways_polygon, waterways_polygon_file)
 
                 # Create DEM generation instructions
                 dem_instructions = self.instructions
@@ -3609,11 +4190,14 @@ class WaterwayBedElevationEstimator(BaseProcessor):
     def load_waterways(self) -> bool:
         """Download OpenStreetMap waterways and tunnels within the catchment BBox."""
 
-        waterways_path = self.get_result_file_path(key="waterways")
+        # Use an existing waterways file in either intermediate vector format
+        waterways_path = geometry.existing_vector_file(
+            self.get_result_file_path(key="waterways")
+        )
         source = self.get_waterways_instruction("source")
 
         if waterways_path.is_file():
-            waterways = geopandas.read_file(waterways_path)
+            waterways = geometry.read_vector(waterways_path)
             if source == "osm":
                 waterways = waterways.set_index("OSM_id", drop=True)
             if "width" not in waterways.columns and source == "osm":
@@ -3710,7 +4294,7 @@ class WaterwayBedElevationEstimator(BaseProcessor):
             )
 
             # Save file
-            waterways.to_file(waterways_path)
+            geometry.write_vector(waterways, waterways_path)
         return waterways
 
     def run(self):
@@ -3759,10 +4343,10 @@ class WaterwayBedElevationEstimator(BaseProcessor):
             elevations = geopandas.GeoDataFrame(
                 {"geometry": [], "width": [], "z": []}, crs=crs
             )
-            polygons.to_file(self.get_result_file_path(key="open_polygon"))
-            polygons.to_file(self.get_result_file_path(key="closed_polygon"))
-            elevations.to_file(self.get_result_file_path(key="open_elevation"))
-            elevations.to_file(self.get_result_file_path(key="closed_elevation"))
+            for key in ["open_polygon", "closed_polygon"]:
+                geometry.write_vector(polygons, self.get_result_file_path(key=key))
+            for key in ["open_elevation", "closed_elevation"]:
+                geometry.write_vector(elevations, self.get_result_file_path(key=key))
             return
         # Create a DEM where the waterways and tunnels are
         self.create_dem(waterways=waterways)
@@ -3844,7 +4428,9 @@ class StopbankCrestElevationEstimator(BaseProcessor):
             "stopbank_polygon": "stopbank_polygon.geojson",
             "stopbank_elevation": "stopbank_elevation.geojson",
         }
-        return name_dictionary[key]
+        if key == "raw_dem":
+            return name_dictionary[key]
+        return self.get_vector_file_name(name_dictionary[key])
 
     def get_result_file_path(self, key: str, index: int = None) -> pathlib.Path:
         """Return the file name of the file to save with the local cache path.
@@ -3916,9 +4502,9 @@ class StopbankCrestElevationEstimator(BaseProcessor):
 
         # If no stopbanks return an empty result
         if len(stopbanks) == 0:
-            stopbanks.drop(columns=["width"]).to_file(polygon_file)
+            geometry.write_vector(stopbanks.drop(columns=["width"]), polygon_file)
             stopbanks["z"] = []
-            stopbanks.to_file(elevation_file)
+            geometry.write_vector(stopbanks, elevation_file)
             return
 
         # Sampled points along stopbanks to define crest elevation at
@@ -3968,10 +4554,12 @@ class StopbankCrestElevationEstimator(BaseProcessor):
         stopbanks["polygon"] = stopbanks.buffer(stopbanks["width"].to_numpy() / 2)
         stopbanks = stopbanks.sort_index(ascending=True)
         stopbanks = stopbanks[nan_filter]
-        stopbanks.set_geometry("polygon", drop=True)[["geometry"]].to_file(polygon_file)
+        geometry.write_vector(
+            stopbanks.set_geometry("polygon", drop=True)[["geometry"]], polygon_file
+        )
         # Filter points to keep not NaN values then save
         points = points[points["z"].notnull()]
-        points[["geometry", "width", "z"]].to_file(elevation_file)
+        geometry.write_vector(points[["geometry", "width", "z"]], elevation_file)
 
     def create_dem(self, stopbanks: geopandas.GeoDataFrame) -> xarray.Dataset:
         """Create and return a DEM at a resolution 1.5x the waterway width."""
@@ -3987,7 +4575,7 @@ class StopbankCrestElevationEstimator(BaseProcessor):
                 stopbank_polygon = geopandas.GeoDataFrame(
                     geometry=[row.geometry.buffer(row.width / 2)], crs=stopbanks.crs
                 )
-                stopbank_polygon.to_file(stopbank_polygon_file)
+                geometry.write_vector(stopbank_polygon, stopbank_polygon_file)
 
                 # Update instructions for next stopbank
                 dem_instructions = self.instructions
@@ -4010,11 +4598,17 @@ class StopbankCrestElevationEstimator(BaseProcessor):
         """Download OpenStreetMap waterways and tunnels within the catchment BBox."""
 
         source = self.get_stopbanks_instruction("source")
-        defaults = {"stopbanks": "osm_stopbanks.geojson"} if source == "osm" else {}
-        stopbanks_path = self.get_instruction_path("stopbanks", defaults=defaults)
+        defaults = (
+            {"stopbanks": self.get_vector_file_name("osm_stopbanks.geojson")}
+            if source == "osm"
+            else {}
+        )
+        stopbanks_path = geometry.existing_vector_file(
+            self.get_instruction_path("stopbanks", defaults=defaults)
+        )
 
         if stopbanks_path.is_file():
-            stopbanks = geopandas.read_file(stopbanks_path)
+            stopbanks = geometry.read_vector(stopbanks_path)
             stopbanks = stopbanks.clip(self.catchment_geometry.land).sort_index(
                 ascending=True
             )
@@ -4097,7 +4691,7 @@ class StopbankCrestElevationEstimator(BaseProcessor):
             )
 
             # Save file
-            stopbanks.to_file(stopbanks_path)
+            geometry.write_vector(stopbanks, stopbanks_path)
         else:
             message = (
                 f"No stopbanks file: {stopbanks_path} exists, and the source "
@@ -4148,8 +4742,12 @@ class StopbankCrestElevationEstimator(BaseProcessor):
             elevations = geopandas.GeoDataFrame(
                 {"geometry": [], "width": [], "z": []}, crs=crs
             )
-            polygons.to_file(self.get_result_file_path(key="stopbank_polygon"))
-            elevations.to_file(self.get_result_file_path(key="stopbank_elevation"))
+            geometry.write_vector(
+                polygons, self.get_result_file_path(key="stopbank_polygon")
+            )
+            geometry.write_vector(
+                elevations, self.get_result_file_path(key="stopbank_elevation")
+            )
             return
 
         # Create a DEM where the waterways and tunnels are
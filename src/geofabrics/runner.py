@@ -4,12 +4,14 @@ A convenience script for running the DEM generation pipelines contained in the p
  module of geofabrics.
 """
 from . import processor
+from . import performance
 import json
 import datetime
 import logging
 import pathlib
 import typing
 import copy
+import dask
 
 
 def config_logging(logging_filepath: pathlib):
@@ -48,8 +50,8 @@ def config_logging(logging_filepath: pathlib):
     logging.config.dictConfig(log_dict)
 
 
-def setup_logging_for_run(instructions: dict, label: str):
-    """Setup logging for the current processor run"""
+def get_log_folder(instructions: dict, label: str) -> pathlib.Path:
+    """Return the folder the logs (and performance report) are written to."""
 
     if label == "runner":
         # In this case expecting the top level instruction dictionary instead of a subsection
@@ -71,6 +73,13 @@ def setup_logging_for_run(instructions: dict, label: str):
             log_path = log_path / instructions["data_paths"]["subfolder"]
         else:
             log_path = log_path / "results"
+    return log_path
+
+
+def setup_logging_for_run(instructions: dict, label: str):
+    """Setup logging for the current processor run"""
+
+    log_path = get_log_folder(instructions=instructions, label=label)
     log_path.mkdir(parents=True, exist_ok=True)
 
     config_logging(log_path / f"geofabrics_{label}.log")
@@ -81,24 +90,59 @@ def setup_logging_for_run(instructions: dict, label: str):
     return logger
 
 
-def run_processor_class(processor_class, processor_label: str, instructions: dict):
+def run_processor_class(
+    processor_class, processor_label: str, instructions: dict
+) -> dict:
     """Run a processor class recording outputs in a unique log file and timing the
-    execution."""
+    execution. Return the performance metrics of the run - including those of each
+    stage recorded by the processor."""
 
     start_time = datetime.datetime.now()
+    start = performance.snapshot()
     run_instructions = instructions[processor_label]
     logger = setup_logging_for_run(instructions=run_instructions, label=processor_label)
     logger.info(f"Run {processor_class.__name__} at {start_time}")
     runner = processor_class(run_instructions)
-    runner.run()
-    message = (
-        f"Execution time is {datetime.datetime.now() - start_time} for the "
-        f"{processor_class.__name__}"
-    )
+    preload = list(dask.config.get("distributed.scheduler.preload", []))
+    with dask.config.set(
+        {"distributed.scheduler.preload": preload + [performance.__name__]}
+    ):
+        runner.run()
+    execution_time = datetime.datetime.now() - start_time
+    message = f"Execution time is {execution_time} for the {processor_class.__name__}"
     logger.info(message)
+
+    # Record the performance metrics
+    metrics = {
+        "processor": processor_class.__name__,
+        "label": processor_label,
+        "execution_mode": runner.get_processing_instructions("execution_mode"),
+        "number_of_cores": runner.get_processing_instructions("number_of_cores"),
+        "kdtree_workers": runner.get_kdtree_workers(),
+        **performance.metrics_between(start, performance.snapshot()),
+        "peak_memory_workers": runner.performance.peak_memory_workers,
+        "stages": runner.performance.stages,
+    }
+    logger.debug(f"Performance metrics: {metrics}")
     del runner
     del logger
-    return
+    return metrics
+
+
+def write_performance_report(
+    instructions: dict, performance_metrics: list, start_time: datetime.datetime
+):
+    """Write the performance metrics of each processor run next to the runner log
+    as 'geofabrics_performance.json'."""
+
+    log_path = get_log_folder(instructions=instructions, label="runner")
+    report = {
+        "start_time": start_time.isoformat(),
+        "total_wall_time": (datetime.datetime.now() - start_time).total_seconds(),
+        "processors": performance_metrics,
+    }
+    with open(log_path / "geofabrics_performance.json", "w") as file_pointer:
+        json.dump(report, file_pointer, indent=2)
 
 
 def merge_dicts(dict_a: dict, dict_b: dict, logger: logging.Logger, replace_a: bool):
@@ -155,9 +199,10 @@ def merge_dicts(dict_a: dict, dict_b: dict, logger: logging.Logger, replace_a: b
     )
 
 
-def from_instructions_dict(instructions: dict):
+def from_instructions_dict(instructions: dict) -> list:
     """Run the DEM generation pipeline(s) given the specified instructions.
-    If a benchmark is specified compare the result to the benchmark"""
+    If a benchmark is specified compare the result to the benchmark. Return the
+    performance metrics of each processor run."""
 
     # Construct the full instructions by adding the default entries to each stage
     logger = setup_logging_for_run(instructions=instructions, label="runner")
@@ -188,33 +233,42 @@ def from_instructions_dict(instructions: dict):
 
     # Run the pipeline
     initial_start_time = datetime.datetime.now()
+    performance_metrics = []
     if "measured" in instructions:
         # Estimate river channel bathymetry
-        run_processor_class(
-            processor_class=processor.MeasuredRiverGenerator,
-            processor_label="measured",
-            instructions=instructions,
+        performance_metrics.append(
+            run_processor_class(
+                processor_class=processor.MeasuredRiverGenerator,
+                processor_label="measured",
+                instructions=instructions,
+            )
         )
     if "rivers" in instructions:
         # Estimate river channel bathymetry
-        run_processor_class(
-            processor_class=processor.RiverBathymetryGenerator,
-            processor_label="rivers",
-            instructions=instructions,
+        performance_metrics.append(
+            run_processor_class(
+                processor_class=processor.RiverBathymetryGenerator,
+                processor_label="rivers",
+                instructions=instructions,
+            )
         )
     if "waterways" in instructions:
         # Estimate waterway elevations
-        run_processor_class(
-            processor_class=processor.WaterwayBedElevationEstimator,
-            processor_label="waterways",
-            instructions=instructions,
+        performance_metrics.append(
+            run_processor_class(
+                processor_class=processor.WaterwayBedElevationEstimator,
+                processor_label="waterways",
+                instructions=instructions,
+            )
         )
     if "stopbanks" in instructions:
         # Estimate waterway elevations
-        run_processor_class(
-            processor_class=processor.StopbankCrestElevationEstimator,
-            processor_label="stopbanks",
-            instructions=instructions,
+        performance_metrics.append(
+            run_processor_class(
+                processor_class=processor.StopbankCrestElevationEstimator,
+                processor_label="stopbanks",
+                instructions=instructions,
+            )
         )
     if "dem" in instructions:
         run_instructions = instructions["dem"]
@@ -229,10 +283,12 @@ def from_instructions_dict(instructions: dict):
             ).is_file()
         ):
             # Create a raw DEM from LiDAR / reference DEM
-            run_processor_class(
-                processor_class=processor.RawLidarDemGenerator,
-                processor_label="dem",
-                instructions=instructions,
+            performance_metrics.append(
+                run_processor_class(
+                    processor_class=processor.RawLidarDemGenerator,
+                    processor_label="dem",
+                    instructions=instructions,
+                )
             )
         # Only run if the dem doesn't already exist
         if "result_dem" not in dem_paths or not (
@@ -244,30 +300,43 @@ def from_instructions_dict(instructions: dict):
             ).is_file()
         ):
             # Add bathymetry information to a raw DEM
-            run_processor_class(
-                processor_class=processor.HydrologicDemGenerator,
-                processor_label="dem",
-                instructions=instructions,
+            performance_metrics.append(
+                run_processor_class(
+                    processor_class=processor.HydrologicDemGenerator,
+                    processor_label="dem",
+                    instructions=instructions,
+                )
             )
     if "roughness" in instructions:
         # Create a roughness map and add to the hydrological DEM
-        run_processor_class(
-            processor_class=processor.RoughnessLengthGenerator,
-            processor_label="roughness",
-            instructions=instructions,
+        performance_metrics.append(
+            run_processor_class(
+                processor_class=processor.RoughnessLengthGenerator,
+                processor_label="roughness",
+                instructions=instructions,
+            )
         )
     if "patch" in instructions:
         # Add patch to the hydrological dem or geofabric
-        run_processor_class(
-            processor_class=processor.PatchDemGenerator,
-            processor_label="patch",
-            instructions=instructions,
+        performance_metrics.append(
+            run_processor_class(
+                processor_class=processor.PatchDemGenerator,
+                processor_label="patch",
+                instructions=instructions,
+            )
         )
     logger = setup_logging_for_run(instructions=instructions, label="runner")
     logger.info(
         f"Total execution time is {datetime.datetime.now() - initial_start_time}"
     )
+    write_performance_report(
+        instructions=instructions,
+        performance_metrics=performance_metrics,
+        start_time=initial_start_time,
+    )
+    logger.info("Performance report written to geofabrics_performance.json")
     del logger
+    return performance_metrics
 
 
 def from_instructions_file(
@@ -280,4 +349,4 @@ def from_instructions_file(
     with open(instructions_path, "r") as file_pointer:
         instructions = json.load(file_pointer)
     # Run the pipeline
-    from_instructions_dict(instructions=instructions)
+    return from_instructions_dict(instructions=instructions)
@@ -0,0 +1,610 @@
+# -*- coding: utf-8 -*-
+"""
+This module contains classes for generating synthetic catchments with tiled LiDAR and
+matching vector data. These support offline scaling benchmarks of the processors (i.e.
+at 1x, 10x and 100x the data size) without depending on remote data services.
+"""
+import argparse
+import json
+import logging
+import pathlib
+import tempfile
+import zipfile
+import geopandas
+import numpy
+import pdal
+import shapely
+import shapely.geometry
+import shapely.ops
+
+
+class SyntheticCatchment:
+    """A class to generate a synthetic coastal catchment. The land slopes down
+    towards a wavy coastline in the east with rolling hills, and a meandering river
+    valley runs from the west to the coast. The ocean deepens offshore.
+
+    The `SyntheticCatchment` class writes out:
+     * catchment and land polygons
+     * a tiled LiDAR dataset of LAZ files with a tile index zip file
+     * ocean points offshore
+     * a REC like river network with 'id', 'to_node', 'from_node', 'flow', 'n' and
+       'area' columns
+     * waterways (drains with a culvert) with 'waterway', 'tunnel' and 'width' columns
+     * stopbanks along the river with a 'width' column
+     * a roads polygon with a 'roughness' column
+     * a runner instruction file using all of the above
+
+    Parameters
+    ----------
+
+    cache_path
+        The folder to write the synthetic data to.
+    scale
+        The number of times to increase the data size from the base catchment. The
+        catchment area (and so the number of tiles and points) increases with scale.
+    tiles_per_side
+        The number of tiles along each side of the base (scale=1) catchment.
+    tile_size
+        The width of each (square) LiDAR tile in metres.
+    point_density
+        The number of LiDAR points per square metre.
+    classification_mix
+        A dictionary of the fraction of points of each LAS classification. Non ground
+        classifications are given vegetation or building heights above the ground.
+    tile_overlap
+        The distance in metres each tile's points extend beyond the tile bounds.
+    noise
+        The standard deviation in metres of the noise added to the ground elevations.
+    resolution
+        The DEM resolution to specify in the instruction file.
+    seed
+        The seed of the random number generator.
+    """
+
+    DATASET_NAME = "Synthetic"
+    CRS = {"horizontal": 2193, "vertical": 7839}
+    ORIGIN = (1750000.0, 5450000.0)  # lower left corner in NZTM
+    LAND_SLOPE = 0.01
+    OCEAN_SLOPE = 0.02
+    HILL_HEIGHT = 20.0
+    HILL_WAVELENGTH = 1500.0
+    COAST_FRACTION = 0.75  # fraction of the catchment width that is land
+    RIVER_DEPTH = 4.0
+    RIVER_WIDTH = 20.0
+    RIVER_SPACING = 10.0
+    REACH_LENGTH = 500.0
+    FEATURE_HEIGHTS = {  # min and max height above ground by classification
+        3: (0.0, 0.5),
+        4: (0.5, 2.0),
+        5: (2.0, 15.0),
+        6: (3.0, 10.0),
+    }
+
+    def __init__(
+        self,
+        cache_path: str | pathlib.Path,
+        scale: float = 1,
+        tiles_per_side: int = 4,
+        tile_size: float = 500,
+        point_density: float = 1,
+        classification_mix: dict = {2: 0.6, 3: 0.1, 4: 0.1, 5: 0.1, 6: 0.05, 9: 0.05},
+        tile_overlap: float = 0,
+        noise: float = 0.05,
+        resolution: float = 10,
+        seed: int = 0,
+    ):
+        self.logger = logging.getLogger(f"{__name__}.{self.__class__.__name__}")
+
+        self.cache_path = pathlib.Path(cache_path)
+        self.tiles_per_side = max(1, int(round(tiles_per_side * numpy.sqrt(scale))))
+        self.tile_size = tile_size
+        self.point_density = point_density
+        self.tile_overlap = tile_overlap
+        self.noise = noise
+        self.resolution = resolution
+        self.random = numpy.random.default_rng(seed)
+
+        fractions = numpy.array(list(classification_mix.values()), dtype=float)
+        self.classifications = numpy.array(list(classification_mix.keys()))
+        self.classification_fractions = fractions / fractions.sum()
+
+        self.width = self.tiles_per_side * self.tile_size
+        self.bounds = (
+            self.ORIGIN[0],
+            self.ORIGIN[1],
+            self.ORIGIN[0] + self.width,
+            self.ORIGIN[1] + self.width,
+        )
+
+    @property
+    def lidar_path(self) -> pathlib.Path:
+        """The folder of the LiDAR dataset."""
+        return self.cache_path / self.DATASET_NAME
+
+    def _input_path(self, name: str) -> str:
+        """Return the absolute path of an input file. Absolute so the inputs are
+        found from any results subfolder."""
+        return str((self.cache_path / name).resolve())
+
+    def coast_x(self, y: numpy.ndarray) -> numpy.ndarray:
+        """Return the x location of the coastline at each y."""
+        return (
+            self.bounds[0]
+            + self.COAST_FRACTION * self.width
+            + 0.02 * self.width * numpy.sin(2 * numpy.pi * (y - self.bounds[1]) / 2000)
+        )
+
+    def river_y(self, x: numpy.ndarray) -> numpy.ndarray:
+        """Return the y location of the river centreline at each x."""
+        return (
+            self.bounds[1]
+            + 0.5 * self.width
+            + 0.05 * self.width * numpy.sin(2 * numpy.pi * (x - self.bounds[0]) / 1000)
+        )
+
+    def elevation(self, x: numpy.ndarray, y: numpy.ndarray) -> numpy.ndarray:
+        """Return the ground elevation at each x, y location."""
+
+        distance_inland = self.coast_x(y) - x
+        hills = (
+            self.HILL_HEIGHT
+            * numpy.sin(2 * numpy.pi * (x - self.bounds[0]) / self.HILL_WAVELENGTH)
+            * numpy.cos(2 * numpy.pi * (y - self.bounds[1]) / self.HILL_WAVELENGTH)
+        )
+        # Taper the hills to zero at the coast
+        taper = numpy.clip(distance_inland / self.HILL_WAVELENGTH, 0, 1)
+        land = self.LAND_SLOPE * distance_inland + numpy.abs(hills) * taper
+        # Incise the river valley
+        distance_to_river = numpy.abs(y - self.river_y(x))
+        land -= self.RIVER_DEPTH * numpy.exp(
+            -((distance_to_river / self.RIVER_WIDTH) ** 2)
+        )
+        return numpy.where(
+            distance_inland > 0, land, self.OCEAN_SLOPE * distance_inland
+        )
+
+    def _coast_line(self) -> numpy.ndarray:
+        """Return the coastline coordinates ordered north to south."""
+        y = numpy.linspace(self.bounds[3], self.bounds[1], 200)
+        return numpy.column_stack([self.coast_x(y), y])
+
+    def _river_line(self) -> numpy.ndarray:
+        """Return the river centreline coordinates ordered upstream to downstream at
+        RIVER_SPACING. The river stops at the coast."""
+        x = numpy.arange(self.bounds[0], self.bounds[2], self.RIVER_SPACING)
+        x = x[x < self.coast_x(self.river_y(x))]
+        return numpy.column_stack([x, self.river_y(x)])
+
+    def _river_reaches(self) -> list:
+        """Return the indices of the river centreline in each reach."""
+        number_of_points = len(self._river_line())
+        river_length = number_of_points * self.RIVER_SPACING
+        number_of_reaches = max(1, int(numpy.ceil(river_length / self.REACH_LENGTH)))
+        return numpy.array_split(numpy.arange(number_of_points), number_of_reaches)
+
+    def write_catchment(self):
+        """Write out the catchment and land polygons."""
+
+        catchment = geopandas.GeoDataFrame(
+            geometry=[shapely.geometry.box(*self.bounds)], crs=self.CRS["horizontal"]
+        )
+        catchment.to_file(self.cache_path / "catchment.geojson")
+
+        # Land extends beyond the catchment to the west, north and south
+        buffer = self.tile_size
+        coast = self._coast_line()
+        land = shapely.geometry.Polygon(
+            [(coast[0, 0], self.bounds[3] + buffer)]
+            + [tuple(xy) for xy in coast]
+            + [
+                (coast[-1, 0], self.bounds[1] - buffer),
+                (self.bounds[0] - buffer, self.bounds[1] - buffer),
+                (self.bounds[0] - buffer, self.bounds[3] + buffer),
+            ]
+        )
+        land = geopandas.GeoDataFrame(geometry=[land], crs=self.CRS["horizontal"])
+        land.to_file(self.cache_path / "land.geojson")
+
+    def _tile_points(self, tile_bounds: tuple) -> numpy.ndarray:
+        """Return the randomly located points of a tile."""
+
+        min_x = tile_bounds[0] - self.tile_overlap
+        min_y = tile_bounds[1] - self.tile_overlap
+        max_x = tile_bounds[2] + self.tile_overlap
+        max_y = tile_bounds[3] + self.tile_overlap
+        number_of_points = int(self.point_density * (max_x - min_x) * (max_y - min_y))
+
+        points = numpy.empty(
+            [number_of_points],
+            dtype=[
+                ("X", numpy.float64),
+                ("Y", numpy.float64),
+                ("Z", numpy.float64),
+                ("Classification", numpy.uint8),
+            ],
+        )
+        points["X"] = self.random.uniform(min_x, max_x, number_of_points)
+        points["Y"] = self.random.uniform(min_y, max_y, number_of_points)
+        points["Z"] = self.elevation(points["X"], points["Y"]) + self.random.normal(
+            0, self.noise, number_of_points
+        )
+        points["Classification"] = self.random.choice(
+            self.classifications, size=number_of_points, p=self.classification_fractions
+        )
+
+        # Add heights above the ground for vegetation and buildings
+        for classification, (min_height, max_height) in self.FEATURE_HEIGHTS.items():
+            mask = points["Classification"] == classification
+            points["Z"][mask] += self.random.uniform(min_height, max_height, mask.sum())
+        return points
+
+    def write_lidar(self):
+        """Write out the LAZ tiles and the tile index zip file."""
+
+        self.lidar_path.mkdir(parents=True, exist_ok=True)
+        tile_names = []
+        tile_boxes = []
+        for i in range(self.tiles_per_side):
+            for j in range(self.tiles_per_side):
+                tile_bounds = (
+                    self.bounds[0] + i * self.tile_size,
+                    self.bounds[1] + j * self.tile_size,
+                    self.bounds[0] + (i + 1) * self.tile_size,
+                    self.bounds[1] + (j + 1) * self.tile_size,
+                )
+                tile_name = f"{self.DATASET_NAME}_{i}_{j}.laz"
+                self.logger.info(f"Writing LiDAR tile {tile_name}")
+                pdal_pipeline_instructions = [
+                    {
+                        "type": "writers.las",
+                        "a_srs": f"EPSG:{self.CRS['horizontal']}+"
+                        f"{self.CRS['vertical']}",
+                        "filename": str(self.lidar_path / tile_name),
+                        "compression": "laszip",
+                        "scale_x": 0.01,
+                        "scale_y": 0.01,
+                        "scale_z": 0.01,
+                    }
+                ]
+                pdal_pipeline = pdal.Pipeline(
+                    json.dumps(pdal_pipeline_instructions),
+                    [self._tile_points(tile_bounds)],
+                )
+                pdal_pipeline.execute()
+                tile_names.append(tile_name)
+                tile_boxes.append(shapely.geometry.box(*tile_bounds))
+
+        # Write the tile index as a zipped shapefile
+        tile_index = geopandas.GeoDataFrame(
+            {"filename": tile_names, "geometry": tile_boxes},
+            crs=self.CRS["horizontal"],
+        )
+        tile_index_name = f"{self.DATASET_NAME}_TileIndex"
+        with tempfile.TemporaryDirectory() as temp_folder:
+            tile_index.to_file(pathlib.Path(temp_folder) / f"{tile_index_name}.shp")
+            with zipfile.ZipFile(self.lidar_path / f"{tile_index_name}.zip", "w") as zf:
+                for file in pathlib.Path(temp_folder).iterdir():
+                    zf.write(file, arcname=file.name)
+
+    def write_ocean_points(self, spacing: float = 100):
+        """Write out ocean points offshore of the coast with a 'z' column."""
+
+        x, y = numpy.meshgrid(
+            numpy.arange(self.bounds[0], self.bounds[2] + self.tile_size, spacing),
+            numpy.arange(
+                self.bounds[1] - self.tile_size,
+                self.bounds[3] + self.tile_size,
+                spacing,
+            ),
+        )
+        x, y = x.flatten(), y.flatten()
+        offshore = x > self.coast_x(y) + spacing
+        x, y = x[offshore], y[offshore]
+        z = self.elevation(x, y)
+        ocean_points = geopandas.GeoDataFrame(
+            {"z": z, "geometry": shapely.points(x, y, z)}, crs=self.CRS["horizontal"]
+        )
+        ocean_points.to_file(self.cache_path / "ocean_points.geojson")
+
+    def write_river_network(self):
+        """Write out a REC like river network along the river. Each reach is defined
+        upstream to downstream, and the upstream area decreases upstream. A small
+        tributary joins the second reach."""
+
+        river = self._river_line()
+        reaches = self._river_reaches()
+        element_dict = {
+            "id": [],
+            "to_node": [],
+            "from_node": [],
+            "flow": [],
+            "n": [],
+            "area": [],
+            "geometry": [],
+        }
+        for index, reach in enumerate(reaches):
+            # Include the first point of the next reach so the reaches join
+            if index + 1 < len(reaches):
+                reach = numpy.append(reach, reach[-1] + 1)
+            element_dict["id"].append(1000 + index)
+            element_dict["from_node"].append(index)
+            element_dict["to_node"].append(index + 1)
+            element_dict["flow"].append(10.0 * (index + 1))
+            element_dict["n"].append(0.03)
+            element_dict["area"].append(1e6 * (index + 1))
+            element_dict["geometry"].append(shapely.geometry.LineString(river[reach]))
+        if len(reaches) > 1:
+            join = river[reaches[1][0]]
+            element_dict["id"].append(1000 + len(reaches))
+            element_dict["from_node"].append(len(reaches) + 1)
+            element_dict["to_node"].append(1)
+            element_dict["flow"].append(1.0)
+            element_dict["n"].append(0.04)
+            element_dict["area"].append(1e4)
+            element_dict["geometry"].append(
+                shapely.geometry.LineString([join + [0, 200], join])
+            )
+        network = geopandas.GeoDataFrame(element_dict, crs=self.CRS["horizontal"])
+        network.to_file(self.cache_path / "river_network.geojson")
+        return network
+
+    def write_waterways(self, subfolder: pathlib.Path):
+        """Write out drains running north-south to the river with a culvert on the
+        first drain. Written to the waterways results subfolder as expected for a
+        'file' source."""
+
+        element_dict = {"waterway": [], "tunnel": [], "width": [], "geometry": []}
+        x_drains = numpy.arange(
+            self.bounds[0] + self.tile_size / 2,
+            self.coast_x(self.bounds[3]) - self.tile_size / 2,
+            self.tile_size,
+        )
+        for index, x in enumerate(x_drains):
+            river_y = float(self.river_y(x))
+            drain = shapely.geometry.LineString(
+                [(x, self.bounds[3] - self.tile_size / 4), (x, river_y + 30)]
+            )
+            if index == 0:
+                # Split the first drain into a culvert and an open drain
+                culvert_length = min(30, drain.length / 2)
+                culvert = shapely.ops.substring(
+                    drain, drain.length - culvert_length, drain.length
+                )
+                drain = shapely.ops.substring(drain, 0, drain.length - culvert_length)
+                element_dict["waterway"].append("drain")
+                element_dict["tunnel"].append(True)
+                element_dict["width"].append(2.5)
+                element_dict["geometry"].append(culvert)
+            element_dict["waterway"].append("drain")
+            element_dict["tunnel"].append(False)
+            element_dict["width"].append(2.5)
+            element_dict["geometry"].append(drain)
+        waterways = geopandas.GeoDataFrame(element_dict, crs=self.CRS["horizontal"])
+        subfolder.mkdir(parents=True, exist_ok=True)
+        waterways.to_file(subfolder / "waterways.geojson")
+
+    def write_stopbanks(self, offset: float = 60):
+        """Write out stopbanks on both sides of the river."""
+
+        river = self._river_line()
+        stopbanks = geopandas.GeoDataFrame(
+            {
+                "width": [6.0, 6.0],
+                "geometry": [
+                    shapely.geometry.LineString(river + [0, offset]),
+                    shapely.geometry.LineString(river - [0, offset]),
+                ],
+            },
+            crs=self.CRS["horizontal"],
+        )
+        stopbanks.to_file(self.cache_path / "stopbanks.geojson")
+
+    def write_roads(self, width: float = 10, roughness: float = 0.001):
+        """Write out a roads polygon with a grid of roads on the land."""
+
+        roads = []
+        for x in numpy.arange(self.bounds[0], self.bounds[2], 2 * self.tile_size):
+            roads.append(
+                shapely.geometry.LineString([(x, self.bounds[1]), (x, self.bounds[3])])
+            )
+        for y in numpy.arange(self.bounds[1], self.bounds[3], 2 * self.tile_size):
+            roads.append(
+                shapely.geometry.LineString([(self.bounds[0], y), (self.bounds[2], y)])
+            )
+        land = geopandas.read_file(self.cache_path / "land.geojson")
+        roads = (
+            geopandas.GeoDataFrame(geometry=roads, crs=self.CRS["horizontal"])
+            .buffer(width / 2)
+            .clip(land)
+        )
+        roads = geopandas.GeoDataFrame(
+            {"roughness": [roughness] * len(roads)},
+            geometry=roads.values,
+            crs=self.CRS["horizontal"],
+        )
+        roads.to_file(self.cache_path / "roads_polygon.geojson")
+
+    def instructions(self, number_of_cores: int = 1, chunk_size: int = 500) -> dict:
+        """Return runner instructions for all processors with the synthetic data. All
+        inputs other than the waterways (which must be in the waterways results
+        subfolder for a 'file' source) are specified with absolute paths."""
+
+        # Start from the most downstream reach
+        network_id = 1000 + len(self._river_reaches()) - 1
+        return {
+            "default": {
+                "output": {
+                    "crs": self.CRS,
+                    "grid_params": {"resolution": self.resolution},
+                },
+                "processing": {
+                    "chunk_size": chunk_size,
+                    "number_of_cores": number_of_cores,
+                },
+                "data_paths": {
+                    "local_cache": str(self.cache_path),
+                    "subfolder": "results",
+                    "extents": self._input_path("catchment.geojson"),
+                    "land": self._input_path("land.geojson"),
+                },
+                "datasets": {
+                    "lidar": {
+                        "local": {
+                            self.DATASET_NAME: {
+                                "folder_path": str(self.lidar_path.resolve()),
+                                "crs": self.CRS,
+                            }
+                        }
+                    }
+                },
+                "general": {
+                    "drop_offshore_lidar": True,
+                    "lidar_classifications_to_keep": [2, 9],
+                },
+            },
+            "rivers": {
+                "output": {"grid_params": {"resolution": 1}},
+                "data_paths": {"subfolder": "results/rivers"},
+                "rivers": {
+                    "veg_lidar_classifications_to_keep": [2, 3, 4, 5, 9],
+                    "river_corridor_width": 200,
+                    "max_channel_width": 80,
+                    "min_channel_width": 10,
+                    "max_bank_height": 2,
+                    "min_bank_height": 0.75,
+                    "cross_section_spacing": 10,
+                    "area_threshold": 1e5,
+                    "network_id": network_id,
+                    "network_file": self._input_path("river_network.geojson"),
+                    "network_columns": {
+                        "id": "id",
+                        "to_node": "to_node",
+                        "from_node": "from_node",
+                        "flow": "flow",
+                        "mannings_n": "n",
+                        "area": "area",
+                    },
+                },
+            },
+            "waterways": {
+                "output": {"grid_params": {"resolution": 1}},
+                "data_paths": {"subfolder": "results/waterways"},
+                "waterways": {"source": "file"},
+            },
+            "stopbanks": {
+                "output": {"grid_params": {"resolution": 1}},
+                "data_paths": {
+                    "subfolder": "results/stopbanks",
+                    "stopbanks": self._input_path("stopbanks.geojson"),
+                },
+                "stopbanks": {"source": "file"},
+            },
+            "dem": {
+                "data_paths": {
+                    "raw_dem": "raw_dem.nc",
+                    "ocean_points": self._input_path("ocean_points.geojson"),
+                    "rivers": [
+                        {
+                            "extents": "rivers/river_polygon.geojson",
+                            "elevations": "rivers/river_bathymetry.geojson",
+                        }
+                    ],
+                    "waterways": [
+                        {
+                            "extents": "waterways/closed_waterways_polygon.geojson",
+                            "elevations": "waterways/"
+                            "closed_waterways_elevation.geojson",
+                        },
+                        {
+                            "extents": "waterways/open_waterways_polygon.geojson",
+                            "elevations": "waterways/open_waterways_elevation.geojson",
+                        },
+                    ],
+                    "stopbanks": [
+                        {
+                            "extents": "stopbanks/stopbank_polygon.geojson",
+                            "elevations": "stopbanks/stopbank_elevation.geojson",
+                        }
+                    ],
+                    "result_dem": "dem.nc",
+                },
+                "general": {
+                    "z_labels": {
+                        "ocean": "z",
+                        "rivers": "bed_elevation_Rupp_and_Smart",
+                    },
+                    "interpolation": {"no_data": "linear", "ocean": "linear"},
+                },
+            },
+            "roughness": {
+                "data_paths": {
+                    "result_dem": "dem.nc",
+                    "result_geofabric": "geofabric.nc",
+                    "roads": self._input_path("roads_polygon.geojson"),
+                    "roads_polygon": self._input_path("roads_polygon.geojson"),
+                },
+                "general": {"lidar_classifications_to_keep": [1, 2, 3, 4, 5, 6, 9]},
+            },
+        }
+
+    def run(self, number_of_cores: int = 1, chunk_size: int = 500) -> pathlib.Path:
+        """Generate all synthetic data and an instruction file. Return the path of
+        the instruction file."""
+
+        self.cache_path.mkdir(parents=True, exist_ok=True)
+        self.logger.info(
+            f"Generating a synthetic catchment of {self.tiles_per_side ** 2} tiles in "
+            f"{self.cache_path}"
+        )
+        self.write_catchment()
+        self.write_lidar()
+        self.write_ocean_points()
+        self.write_river_network()
+        self.write_waterways(subfolder=self.cache_path / "results" / "waterways")
+        self.write_stopbanks()
+        self.write_roads()
+
+        instructions = self.instructions(
+            number_of_cores=number_of_cores, chunk_size=chunk_size
+        )
+        instruction_path = self.cache_path / "instruction.json"
+        with open(instruction_path, "w") as file_pointer:
+            json.dump(instructions, file_pointer, indent=2)
+        return instruction_path
+
+
+def parse_args():
+    """Expect command line arguments of the form:
+    '--output path/to/cache --scale 10'"""
+
+    parser = argparse.ArgumentParser(
+        description="Generate a synthetic catchment for benchmarking GeoFabrics."
+    )
+    parser.add_argument("--output", metavar="path", required=True, action="store")
+    parser.add_argument("--scale", type=float, default=1, action="store")
+    parser.add_argument("--point_density", type=float, default=1, action="store")
+    parser.add_argument("--tile_overlap", type=float, default=0, action="store")
+    parser.add_argument("--noise", type=float, default=0.05, action="store")
+    parser.add_argument("--seed", type=int, default=0, action="store")
+    return parser.parse_args()
+
+
+def cli_generate_synthetic():
+    """A CLI entry point to generate a synthetic catchment."""
+    args = parse_args()
+    logging.basicConfig(level=logging.INFO)
+    instruction_path = SyntheticCatchment(
+        cache_path=args.output,
+        scale=args.scale,
+        point_density=args.point_density,
+        tile_overlap=args.tile_overlap,
+        noise=args.noise,
+        seed=args.seed,
+    ).run()
+    print(f"Synthetic instructions written to {instruction_path}")
+
+
+if __name__ == "__main__":
+    """If called as a script."""
+
+    cli_generate_synthetic()
@@ -0,0 +1,860 @@
+# -*- coding: utf-8 -*-
+"""
+Tests comparing the vectorised river bathymetry kernels against the original
+implementations they replaced on small fixed inputs.
+"""
+
+import unittest
+import pathlib
+import tempfile
+import geopandas
+import numpy
+import pandas
+import scipy.spatial
+import shapely
+import shapely.geometry
+import xarray
+
+from geofabrics import bathymetry_estimation
+
+
+def reference_unimodal_smoothing(y: numpy.ndarray) -> numpy.ndarray:
+    """The original implementation - solve the dense system each iteration."""
+
+    x = numpy.arange(len(y))
+    dd = 3
+    la = 100
+    kp = 10000000
+    E = numpy.eye(len(x))
+    D3 = numpy.diff(E, n=dd, axis=0)
+    D1 = numpy.diff(E, n=1, axis=0)
+    ws = numpy.zeros(len(x) - 1)
+    for it in range(30):
+        Ws = numpy.diag(ws * kp)
+        mon_cof = numpy.linalg.solve(E + la * D3.T @ D3 + D1.T @ Ws @ D1, y)
+        ws_new = (D1 @ mon_cof < 0.0) * 1
+        if numpy.sum(ws != ws_new) == 0:
+            break
+        ws = ws_new
+    return mon_cof
+
+
+def reference_sample_cross_sections(
+    gnd_dem: xarray.Dataset,
+    veg_dem: xarray.Dataset,
+    cross_sections: pandas.DataFrame,
+    sample_index_array: numpy.ndarray,
+    resolution: float,
+    min_z_start_i: int,
+    min_z_stop_i: int,
+):
+    """The original implementation - KDTrees of all DEM pixels queried section by
+    section."""
+
+    cross_section_elevations = {"gnd_elevations": [], "veg_elevations": []}
+    min_z_centre = []
+    trees = {}
+    for name, dem in [("gnd", gnd_dem), ("veg", veg_dem)]:
+        grid_x, grid_y = numpy.meshgrid(dem.x, dem.y)
+        xy_in = numpy.concatenate(
+            [[grid_x.flatten()], [grid_y.flatten()]], axis=0
+        ).transpose()
+        trees[name] = scipy.spatial.KDTree(xy_in)
+    for index, row in cross_sections.iterrows():
+        xx = row["mid_x"] + sample_index_array * resolution * row["nx"]
+        yy = row["mid_y"] + sample_index_array * resolution * row["ny"]
+        xy_points = numpy.concatenate([[xx], [yy]], axis=0).transpose()
+        distances, indices = trees["veg"].query(xy_points)
+        cross_section_elevations["veg_elevations"].append(
+            veg_dem.z.data.flatten()[indices]
+        )
+        distances, indices = trees["gnd"].query(xy_points)
+        elevations = gnd_dem.z.data.flatten()[indices]
+        cross_section_elevations["gnd_elevations"].append(elevations)
+        if (
+            len(elevations[min_z_start_i:min_z_stop_i])
+            - numpy.sum(numpy.isnan(elevations[min_z_start_i:min_z_stop_i]))
+            > 0
+        ):
+            min_index = numpy.nanargmin(elevations[min_z_start_i:min_z_stop_i])
+            min_z_centre.append(elevations[min_z_start_i + min_index])
+        else:
+            min_z_centre.append(numpy.nan)
+    return cross_section_elevations, numpy.array(min_z_centre)
+
+
+def reference_width_outwards(veg_samples, start_index, z_water, threshold):
+    """The original outwards search of a single cross section."""
+
+    number_of_samples = len(veg_samples)
+    start_i = numpy.nan
+    stop_i = numpy.nan
+    if veg_samples[start_index] - z_water < threshold or (
+        numpy.isnan(veg_samples[start_index])
+    ):
+        for i in numpy.arange(0, number_of_samples + 1, 1):
+            if start_index + i < number_of_samples and numpy.isnan(stop_i):
+                if veg_samples[start_index + i] - z_water > threshold:
+                    stop_i = start_index + i
+            if start_index - i >= 0 and numpy.isnan(start_i):
+                if veg_samples[start_index - i] - z_water > threshold:
+                    start_i = start_index - i
+            if not numpy.isnan(start_i) and not numpy.isnan(stop_i):
+                break
+            if start_index + i >= number_of_samples - 1 and start_index - i <= 0:
+                start_i = 0
+                stop_i = number_of_samples - 1
+                break
+    return start_i, stop_i
+
+
+def reference_fixed_threshold_width(
+    veg_samples, z_water, threshold, search_radius_index, min_channel_width
+):
+    """The original fixed threshold width of a single cross section - searching
+    outwards, forwards and backwards from the centre."""
+
+    start_index = len(veg_samples) // 2
+    start_i_list = []
+    stop_i_list = []
+    forwards_index = start_index
+    backwards_index = start_index
+    start_i, stop_i = reference_width_outwards(
+        veg_samples, start_index, z_water, threshold
+    )
+    if not numpy.isnan(start_i) and not numpy.isnan(stop_i):
+        start_i_list.append(start_i)
+        stop_i_list.append(stop_i)
+        forwards_index = stop_i + 1
+        backwards_index = start_i - 1
+    while forwards_index - start_index < search_radius_index:
+        for i in numpy.arange(forwards_index, start_index + search_radius_index + 1):
+            start_i, stop_i = reference_width_outwards(
+                veg_samples, i, z_water, threshold
+            )
+            if not numpy.isnan(start_i) and not numpy.isnan(stop_i):
+                break
+        if not numpy.isnan(start_i) and not numpy.isnan(stop_i):
+            start_i_list.append(start_i)
+            stop_i_list.append(stop_i)
+            forwards_index = stop_i + 1
+        else:
+            break
+    while start_index - backwards_index < search_radius_index:
+        start_i, stop_i = numpy.nan, numpy.nan
+        for i in numpy.arange(
+            backwards_index, start_index - search_radius_index - 1, -1
+        ):
+            start_i, stop_i = reference_width_outwards(
+                veg_samples, i, z_water, threshold
+            )
+            if not numpy.isnan(start_i) and not numpy.isnan(stop_i):
+                break
+        if not numpy.isnan(start_i) and not numpy.isnan(stop_i):
+            start_i_list.append(start_i)
+            stop_i_list.append(stop_i)
+            backwards_index = start_i - 1
+        else:
+            break
+    start_i = numpy.nan
+    stop_i = numpy.nan
+    longest_width = 0
+    channel_count = 0
+    for i in range(len(start_i_list)):
+        channel_width = stop_i_list[i] - start_i_list[i]
+        if channel_width > longest_width:
+            longest_width = stop_i_list[i] - start_i_list[i]
+            start_i = start_i_list[i]
+            stop_i = stop_i_list[i]
+        if channel_width >= min_channel_width:
+            channel_count += 1
+    return start_i, stop_i, channel_count
+
+
+def reference_bankfull_width(
+    gnd_samples, veg_samples, z_water, start_i, stop_i, threshold, maximum_threshold
+):
+    """The original bankfull expansion of a single cross section - except the
+    maximum threshold stop compares the lowest elevation rather than a bool."""
+
+    number_of_samples = len(gnd_samples)
+    if (
+        numpy.isnan(start_i)
+        or numpy.isnan(stop_i)
+        or numpy.isnan([gnd_samples[start_i], veg_samples[start_i]]).all()
+        or numpy.isnan([gnd_samples[stop_i], veg_samples[stop_i]]).all()
+    ):
+        return start_i, stop_i, numpy.nan
+    maximum_z = z_water + maximum_threshold
+    start_i_bf = start_i
+    stop_i_bf = stop_i
+    dwidth = 1
+    prev_start_elevation = numpy.nanmin([gnd_samples[start_i], veg_samples[start_i]])
+    prev_stop_elevation = numpy.nanmin([gnd_samples[stop_i], veg_samples[stop_i]])
+    while start_i_bf > 0 and stop_i_bf < number_of_samples - 1 and dwidth > 0:
+        dwidth = 0
+        elevations = [gnd_samples[start_i_bf - 1], veg_samples[start_i_bf - 1]]
+        if numpy.isnan(elevations).all():
+            start_elevation = numpy.nan
+        else:
+            start_elevation = numpy.nanmin(elevations)
+        elevations = [gnd_samples[stop_i_bf + 1], veg_samples[stop_i_bf + 1]]
+        if numpy.isnan(elevations).all():
+            stop_elevation = numpy.nan
+        else:
+            stop_elevation = numpy.nanmin(elevations)
+        if numpy.isnan(start_elevation):
+            start_i_bf -= 1
+            dwidth += 1
+        elif numpy.isnan(stop_elevation):
+            stop_i_bf += 1
+            dwidth += 1
+        elif (
+            start_elevation <= stop_elevation
+            and start_elevation > prev_start_elevation
+            and start_elevation > z_water + threshold
+        ):
+            start_i_bf -= 1
+            dwidth += 1
+            prev_start_elevation = start_elevation
+        elif (
+            stop_elevation <= start_elevation
+            and stop_elevation > prev_stop_elevation
+            and stop_elevation > z_water + threshold
+        ):
+            stop_i_bf += 1
+            dwidth += 1
+            prev_stop_elevation = stop_elevation
+        if (
+            not numpy.isnan([start_elevation, stop_elevation]).all()
+            and numpy.nanmin([start_elevation, stop_elevation]) > maximum_z
+        ):
+            break
+    z_bankfull = min(max(prev_start_elevation, prev_stop_elevation), maximum_z)
+    return start_i_bf, stop_i_bf, z_bankfull - z_water
+
+
+def reference_segment_slope(x_array, y_array, index):
+    """The original slope and length of a line segment."""
+
+    length = numpy.sqrt(
+        (x_array[index + 1] - x_array[index]) ** 2
+        + (y_array[index + 1] - y_array[index]) ** 2
+    )
+    dx = (x_array[index + 1] - x_array[index]) / length
+    dy = (y_array[index + 1] - y_array[index]) / length
+    return dx, dy, length
+
+
+def reference_node_centred_reach_cross_section(
+    sampled_channel: geopandas.GeoDataFrame, transect_radius: float
+) -> pandas.DataFrame:
+    """The original implementation - a transect built at each node in turn."""
+
+    cross_sections_dict = {
+        "geometry": [],
+        "nx": [],
+        "ny": [],
+        "length": [],
+        "mid_x": [],
+        "mid_y": [],
+    }
+    (x_array, y_array) = sampled_channel.iloc[0].geometry.xy
+    for i in range(len(x_array)):
+        if i == 0:
+            dx, dy, length = reference_segment_slope(x_array, y_array, i)
+        elif i == len(x_array) - 1:
+            dx, dy, length = reference_segment_slope(x_array, y_array, i - 1)
+        else:
+            dx_prev, dy_prev, l_prev = reference_segment_slope(x_array, y_array, i)
+            dx_next, dy_next, l_next = reference_segment_slope(x_array, y_array, i - 1)
+            dx = (dx_prev * l_prev + dx_next * l_next) / (l_prev + l_next)
+            dy = (dy_prev * l_prev + dy_next * l_next) / (l_prev + l_next)
+            length = (l_prev + l_next) / 2
+        normal_x = -dy
+        normal_y = dx
+        cross_sections_dict["nx"].append(normal_x)
+        cross_sections_dict["ny"].append(normal_y)
+        cross_sections_dict["geometry"].append(
+            shapely.geometry.LineString(
+                [
+                    [
+                        x_array[i] - transect_radius * normal_x,
+                        y_array[i] - transect_radius * normal_y,
+                    ],
+                    [x_array[i], y_array[i]],
+                    [
+                        x_array[i] + transect_radius * normal_x,
+                        y_array[i] + transect_radius * normal_y,
+                    ],
+                ]
+            )
+        )
+        cross_sections_dict["mid_x"].append(x_array[i])
+        cross_sections_dict["mid_y"].append(y_array[i])
+        cross_sections_dict["length"].append(length)
+    return pandas.DataFrame(cross_sections_dict)
+
+
+def reference_bank_xy(row, bank_i, centre_index, resolution):
+    """The original location of an index along a single transect."""
+
+    return [
+        row["mid_x"] + (bank_i - centre_index) * row["nx"] * resolution,
+        row["mid_y"] + (bank_i - centre_index) * row["ny"] * resolution,
+    ]
+
+
+def reference_up_stream_reaches(
+    network: geopandas.GeoDataFrame, starting_id, area_threshold: float = None
+) -> geopandas.GeoDataFrame:
+    """The original upstream trace - filtering the whole network each step."""
+
+    reaches_index = network[network["id"] == starting_id].index.tolist()
+    while True:
+        upstream_reaches = network[
+            network["to_node"] == network.loc[reaches_index[-1]]["from_node"]
+        ][["area", "id"]]
+        if len(upstream_reaches) == 0:
+            break
+        max_index = upstream_reaches["area"].idxmax()
+        if (
+            area_threshold is not None
+            and upstream_reaches.loc[max_index]["area"] < area_threshold
+        ):
+            break
+        next_index = upstream_reaches.loc[max_index]["id"]
+        assert next_index not in numpy.array(reaches_index)
+        reaches_index.append(network[network["id"] == next_index].index[0])
+    return network.loc[reaches_index]
+
+
+def reference_nearest_reach_values(
+    width_values: geopandas.GeoDataFrame, reaches: geopandas.GeoDataFrame
+) -> geopandas.GeoDataFrame:
+    """The original implementation - the distance to every reach row by row."""
+
+    width_values = width_values.copy()
+    width_values["id"] = numpy.nan
+    width_values["mannings_n"] = numpy.zeros(len(width_values["id"]))
+    width_values["flow"] = numpy.zeros(len(width_values["id"]))
+    for i, row in width_values.iterrows():
+        if row.geometry is not None and not row.geometry.is_empty:
+            distances = reaches.distance(width_values.loc[i].geometry)
+            width_values.loc[i, ("id", "flow", "mannings_n")] = reaches[
+                distances == distances.min()
+            ][["id", "flow", "mannings_n"]].min()
+    return width_values
+
+
+def reference_thalweg_from_measured_centred_spacing(
+    samples_per_section: int,
+    cross_sections: geopandas.GeoDataFrame,
+    measured_sections_exploded: geopandas.GeoSeries,
+):
+    """The original implementation - the nearest cross section to each measured
+    thalweg by the distance to all cross sections, and each cross section split
+    into nodes one at a time."""
+
+    def calculate_normalised_thalweg_location(indices: tuple, sections_exploded):
+        thalweg_point = sections_exploded[indices]
+        left_bank_distance = thalweg_point.distance(
+            sections_exploded.loc[indices[0]][0]
+        )
+        right_bank_distance = thalweg_point.distance(
+            sections_exploded.loc[indices[0]][
+                len(sections_exploded.loc[indices[0]]) - 1
+            ]
+        )
+        return left_bank_distance / (left_bank_distance + right_bank_distance)
+
+    thalweg_indices = (
+        measured_sections_exploded.apply(lambda row: row.z).groupby(level=0).idxmin()
+    )
+    thalweg_points = measured_sections_exploded[thalweg_indices]
+    cross_sections["Thalweg ratio"] = numpy.nan
+    cross_sections.loc[
+        thalweg_indices.apply(
+            lambda row: cross_sections["Sections"]
+            .distance(thalweg_points[row])
+            .idxmin()
+        ),
+        "Thalweg ratio",
+    ] = thalweg_indices.apply(
+        lambda row: calculate_normalised_thalweg_location(
+            row, measured_sections_exploded
+        )
+    ).array
+    cross_sections["Thalweg ratio"] = cross_sections["Thalweg ratio"].interpolate(
+        limit_direction="both"
+    )
+
+    def split_line_to_nodes(line, thalweg_ratio, samples_per_section):
+        normalised_node_locations = numpy.concatenate(
+            [
+                numpy.arange(samples_per_section) * thalweg_ratio / samples_per_section,
+                numpy.arange(samples_per_section + 1)
+                * (1 - thalweg_ratio)
+                / samples_per_section
+                + thalweg_ratio,
+            ]
+        )
+        return shapely.geometry.MultiPoint(
+            line.interpolate(normalised_node_locations, normalized=True)
+        )
+
+    cross_sections["Sections"] = cross_sections[["Sections", "Thalweg ratio"]].apply(
+        lambda row: split_line_to_nodes(
+            row["Sections"],
+            row["Thalweg ratio"],
+            samples_per_section=samples_per_section,
+        ),
+        axis=1,
+    )
+
+
+class Test(unittest.TestCase):
+    """Compare the river bathymetry kernels against their original implementations.
+
+    Tests run include:
+        1. test_unimodal_smoothing - The banded monotonic smoothing matches the
+        dense solve for random, constant, monotonic and very short profiles
+        2. test_sample_cross_sections - Sampling by grid index arithmetic matches
+        the KDTree lookup, including NaN DEM cells, descending y and sections
+        leaving the DEM
+        3. test_threshold_widths - The batched fixed threshold and bankfull widths
+        match the per cross section searches, including NaN samples and cross
+        sections without a channel
+        4. test_cross_section_geometries - The vectorised transects, width lines
+        and bank midpoints match those built one cross section at a time
+        5. test_up_stream_reaches - Tracing through the cached network graph
+        selects the same reaches for string and integer IDs, area ties, area
+        thresholds and reaches without geometry
+        6. test_nearest_reach_values - The STRtree matching of samples to reaches
+        matches the row by row distances, including ties and missing geometries
+        7. test_thalweg_from_measured_centred_spacing - The measured thalwegs map
+        to the same cross sections and nodes, including thalwegs equally near
+        two cross sections
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        """Create a channel characteristics object without DEMs."""
+
+        cls.channel_characteristics = bathymetry_estimation.ChannelCharacteristics(
+            gnd_dem=None, veg_dem=None, cross_section_spacing=10, resolution=1
+        )
+
+    def test_unimodal_smoothing(self):
+        """Check the banded solve matches the dense solve."""
+
+        random = numpy.random.default_rng(seed=41)
+        profiles = [
+            random.normal(size=length).cumsum() for length in [2, 3, 5, 50, 300]
+        ]
+        profiles.extend(
+            [
+                numpy.ones(20),
+                numpy.arange(20, dtype=float),
+                numpy.arange(20, 0, -1, dtype=float),
+                numpy.array([0, 0, 10, 0, 0], dtype=float),
+                numpy.array([3.0]),
+            ]
+        )
+        for y in profiles:
+            numpy.testing.assert_allclose(
+                self.channel_characteristics._unimodal_smoothing(y),
+                reference_unimodal_smoothing(y),
+                rtol=1e-7,
+                atol=1e-7,
+                err_msg=f"Profile of length {len(y)} differs",
+            )
+
+    def test_sample_cross_sections(self):
+        """Check the nearest pixel sampling and min_z_centre match the KDTree."""
+
+        random = numpy.random.default_rng(seed=42)
+        resolution = 1
+        x = numpy.arange(0, 40) * resolution + 0.5
+        y = numpy.arange(30, 0, -1) * resolution - 0.5
+        dems = {}
+        for name in ["gnd", "veg"]:
+            z = random.normal(size=(len(y), len(x)))
+            z[random.random(size=z.shape) < 0.1] = numpy.nan
+            dems[name] = xarray.Dataset({"z": (["y", "x"], z)}, coords={"x": x, "y": y})
+        # Make the centre of one section all NaN
+        dems["gnd"].z.data[14:17, 18:23] = numpy.nan
+        angles = random.uniform(0, 2 * numpy.pi, size=12)
+        cross_sections = pandas.DataFrame(
+            {
+                "mid_x": numpy.append(random.uniform(3, 37, size=11), 20.2),
+                "mid_y": numpy.append(random.uniform(3, 27, size=11), 15.1),
+                "nx": numpy.append(numpy.cos(angles[:-1]), 1),
+                "ny": numpy.append(numpy.sin(angles[:-1]), 0),
+            }
+        )
+
+        channel_characteristics = bathymetry_estimation.ChannelCharacteristics(
+            gnd_dem=dems["gnd"],
+            veg_dem=dems["veg"],
+            cross_section_spacing=10,
+            resolution=resolution,
+        )
+        channel_characteristics.transect_radius = 12.3
+        elevations = channel_characteristics.sample_cross_sections(
+            cross_sections=cross_sections, min_z_search_radius=2.3
+        )
+        sample_index_array = numpy.arange(
+            -numpy.floor(channel_characteristics.number_of_samples / 2),
+            numpy.floor(channel_characteristics.number_of_samples / 2) + 1,
+        )
+        reference_elevations, reference_min_z_centre = reference_sample_cross_sections(
+            gnd_dem=dems["gnd"],
+            veg_dem=dems["veg"],
+            cross_sections=cross_sections,
+            sample_index_array=sample_index_array,
+            resolution=resolution,
+            min_z_start_i=channel_characteristics.calculate_min_z_start_i(2.3),
+            min_z_stop_i=channel_characteristics.calculate_min_z_stop_i(2.3),
+        )
+        for key in ["gnd_elevations", "veg_elevations"]:
+            numpy.testing.assert_array_equal(
+                elevations[key], numpy.array(reference_elevations[key])
+            )
+        numpy.testing.assert_array_equal(
+            cross_sections["min_z_centre"], reference_min_z_centre
+        )
+        self.assertTrue(numpy.isnan(cross_sections["min_z_centre"].iloc[-1]))
+
+    def test_threshold_widths(self):
+        """Check the batched bank detection matches the per section searches."""
+
+        random = numpy.random.default_rng(seed=43)
+        number_of_samples = 41
+        offsets = numpy.abs(numpy.arange(number_of_samples) - number_of_samples // 2)
+        gnd_elevations = []
+        for i in range(60):
+            # A channel of random width, with some noise and secondary channels
+            profile = numpy.where(offsets < random.integers(2, 15), 0.0, 2.0)
+            profile += random.uniform(0, 1.5, size=number_of_samples) * (
+                random.random(size=number_of_samples) < 0.4
+            )
+            profile += numpy.maximum(offsets - 15, 0) * random.uniform(0, 0.5)
+            gnd_elevations.append(profile)
+        gnd_elevations = numpy.array(gnd_elevations)
+        veg_elevations = gnd_elevations + random.uniform(0, 1, gnd_elevations.shape)
+        veg_elevations[random.random(size=veg_elevations.shape) < 0.1] = numpy.nan
+        gnd_elevations[random.random(size=gnd_elevations.shape) < 0.1] = numpy.nan
+        # Cross sections rising above the maximum threshold, all in channel, all
+        # bank and all NaN
+        gnd_elevations[-4] = numpy.maximum(offsets - 3.0, 0)
+        veg_elevations[-4] = gnd_elevations[-4] + 0.1
+        veg_elevations[-3] = 0
+        veg_elevations[-2] = 5
+        veg_elevations[-1] = numpy.nan
+        gnd_elevations[-1] = numpy.nan
+        z_water = random.uniform(-0.2, 0.2, size=len(gnd_elevations))
+        threshold, maximum_threshold, search_radius_index = 0.5, 3, 12
+
+        (
+            start_i,
+            stop_i,
+            channel_count,
+        ) = self.channel_characteristics.fixed_threshold_widths(
+            veg_elevations=veg_elevations,
+            z_water=z_water,
+            threshold=threshold,
+            search_radius_index=search_radius_index,
+            min_channel_width=3,
+        )
+        (
+            bankfull_start_i,
+            bankfull_stop_i,
+            dz_bankfull,
+        ) = self.channel_characteristics.bankfull_widths(
+            gnd_elevations=gnd_elevations,
+            veg_elevations=veg_elevations,
+            z_water=z_water,
+            first_bank_i=start_i,
+            last_bank_i=stop_i,
+            threshold=threshold,
+            maximum_threshold=maximum_threshold,
+        )
+        for j in range(len(gnd_elevations)):
+            reference = reference_fixed_threshold_width(
+                veg_samples=veg_elevations[j],
+                z_water=z_water[j],
+                threshold=threshold,
+                search_radius_index=search_radius_index,
+                min_channel_width=3,
+            )
+            numpy.testing.assert_array_equal(
+                [start_i[j], stop_i[j], channel_count[j]],
+                reference,
+                err_msg=f"Cross section {j} fixed threshold width differs",
+            )
+            reference = reference_bankfull_width(
+                gnd_samples=gnd_elevations[j],
+                veg_samples=veg_elevations[j],
+                z_water=z_water[j],
+                start_i=reference[0],
+                stop_i=reference[1],
+                threshold=threshold,
+                maximum_threshold=maximum_threshold,
+            )
+            numpy.testing.assert_allclose(
+                [bankfull_start_i[j], bankfull_stop_i[j], dz_bankfull[j]],
+                reference,
+                err_msg=f"Cross section {j} bankfull width differs",
+            )
+        self.assertAlmostEqual(dz_bankfull[-4], maximum_threshold)
+        self.assertLess(bankfull_stop_i[-4] - bankfull_start_i[-4], 20)
+        self.assertEqual(channel_count[-2], 0)
+        self.assertTrue(numpy.isnan(start_i[-2]))
+
+    def test_cross_section_geometries(self):
+        """Check the vectorised geometries match the per cross section ones."""
+
+        random = numpy.random.default_rng(seed=44)
+        for number_of_nodes in [2, 3, 25]:
+            xy = numpy.cumsum(random.uniform(0.5, 10, size=(number_of_nodes, 2)), 0)
+            sampled_channel = geopandas.GeoDataFrame(
+                geometry=[shapely.geometry.LineString(xy)], crs=2193
+            )
+            cross_sections = bathymetry_estimation.node_centred_reach_cross_section(
+                sampled_channel=sampled_channel, transect_radius=15
+            )
+            reference = reference_node_centred_reach_cross_section(
+                sampled_channel=sampled_channel, transect_radius=15
+            )
+            for column in ["nx", "ny", "length", "mid_x", "mid_y"]:
+                numpy.testing.assert_allclose(
+                    cross_sections[column], reference[column], rtol=1e-12
+                )
+            numpy.testing.assert_allclose(
+                shapely.get_coordinates(cross_sections.geometry.to_numpy()),
+                shapely.get_coordinates(reference["geometry"].to_numpy()),
+                rtol=1e-12,
+            )
+
+        # Width lines and midpoints - including cross sections without banks
+        channel_characteristics = bathymetry_estimation.ChannelCharacteristics(
+            gnd_dem=None, veg_dem=None, cross_section_spacing=10, resolution=2
+        )
+        channel_characteristics.transect_radius = 30
+        centre_index = channel_characteristics.centre_index
+        cross_sections["first_bank_i"] = random.integers(0, 10, len(cross_sections))
+        cross_sections["last_bank_i"] = random.integers(15, 29, len(cross_sections))
+        cross_sections = cross_sections.astype(
+            {"first_bank_i": float, "last_bank_i": float}
+        )
+        cross_sections.loc[[3, 7], ["first_bank_i", "last_bank_i"]] = numpy.nan
+        width_lines = channel_characteristics._bank_width_lines(
+            cross_sections, "first_bank_i", "last_bank_i"
+        )
+        midpoints = channel_characteristics._bank_midpoints(
+            cross_sections, "first_bank_i", "last_bank_i"
+        )
+        for j, row in cross_sections.iterrows():
+            first_xy, last_xy = [
+                reference_bank_xy(row, row[column], centre_index, resolution=2)
+                for column in ["first_bank_i", "last_bank_i"]
+            ]
+            mid_i = (row["first_bank_i"] + row["last_bank_i"]) / 2
+            numpy.testing.assert_allclose(
+                shapely.get_coordinates(width_lines[j]),
+                [first_xy, last_xy],
+                rtol=1e-12,
+            )
+            numpy.testing.assert_allclose(
+                shapely.get_coordinates(midpoints[j]),
+                [reference_bank_xy(row, mid_i, centre_index, resolution=2)],
+                rtol=1e-12,
+            )
+
+    def test_up_stream_reaches(self):
+        """Check the graph trace matches the original trace of the network."""
+
+        name_dict = {
+            "id": "reach",
+            "to_node": "to",
+            "from_node": "from",
+            "flow": "flow",
+            "mannings_n": "n",
+            "area": "area",
+        }
+        # Reach 2 has the largest area upstream of reach 0, reaches 3 and 4 tie, and
+        # reach 5 has no geometry
+        to_nodes = [0, 1, 1, 2, 2, 3, 4, 8, 9]
+        from_nodes = [1, 9, 2, 3, 8, 4, 5, 11, 10]
+        areas = [100.0, 50, 80, 30, 30, 5, 2, 1, 1]
+        geometries = [
+            shapely.geometry.LineString([(i, 0), (i, 10)]) for i in range(len(areas))
+        ]
+        geometries[5] = None
+        with tempfile.TemporaryDirectory() as temp_folder:
+            temp_folder = pathlib.Path(temp_folder)
+            for ids in [list(range(len(areas))), [f"r{i}" for i in range(len(areas))]]:
+                network_file = temp_folder / f"network_{type(ids[0]).__name__}.gpkg"
+                geopandas.GeoDataFrame(
+                    {
+                        "reach": ids,
+                        "to": to_nodes,
+                        "from": from_nodes,
+                        "flow": numpy.ones(len(ids)),
+                        "n": numpy.ones(len(ids)),
+                        "area": areas,
+                    },
+                    geometry=geometries,
+                    crs=2193,
+                ).to_file(network_file)
+                network = geopandas.read_file(network_file)
+                network = network.rename(
+                    columns={value: key for key, value in name_dict.items()}
+                )
+                for starting_id, area_threshold in [
+                    (ids[0], None),
+                    (ids[0], 10),
+                    (ids[1], None),
+                    (ids[6], None),
+                    (ids[8], None),
+                ]:
+                    reference = reference_up_stream_reaches(
+                        network, starting_id=starting_id, area_threshold=area_threshold
+                    )
+                    # Twice - building then reading the cached graph
+                    for i in range(2):
+                        channel = bathymetry_estimation.Channel.from_network(
+                            network_file=network_file,
+                            crs=2193,
+                            starting_id=starting_id,
+                            resolution=1,
+                            area_threshold=area_threshold,
+                            name_dict=name_dict,
+                            cache_folder=temp_folder / "network_graphs",
+                        )
+                        self.assertEqual(
+                            list(channel.channel["id"]), list(reference["id"])
+                        )
+                        self.assertTrue(
+                            all(
+                                shapely.equals(
+                                    channel.channel.geometry.to_numpy(),
+                                    reference.geometry.to_numpy(),
+                                )
+                                | reference.geometry.isna().to_numpy()
+                            )
+                        )
+            # The graphs are cached in the cache folder only
+            self.assertEqual(len(list(temp_folder.glob("*.npz"))), 0)
+            self.assertEqual(len(list(temp_folder.glob("network_graphs/*.npz"))), 2)
+
+    def test_nearest_reach_values(self):
+        """Check the nearest reach values match the row by row distances."""
+
+        random = numpy.random.default_rng(seed=46)
+        # Two parallel reaches 10m apart then one joining on from the end
+        reaches = geopandas.GeoDataFrame(
+            {
+                "id": [3, 1, 2],
+                "flow": [5.0, 7.0, 2.0],
+                "mannings_n": [0.04, 0.03, 0.05],
+            },
+            geometry=[
+                shapely.geometry.LineString([(0, 0), (100, 0)]),
+                shapely.geometry.LineString([(0, 10), (100, 10)]),
+                shapely.geometry.LineString([(100, 0), (150, 0)]),
+            ],
+            crs=2193,
+        )
+        # Random samples, samples midway between the parallel reaches, at the
+        # junction and without geometry
+        points = list(
+            shapely.points(
+                random.uniform(-20, 170, size=20), random.uniform(-10, 20, size=20)
+            )
+        )
+        points.extend(
+            [
+                shapely.geometry.Point(50, 5),
+                shapely.geometry.Point(100, 0),
+                shapely.geometry.Point(),
+                None,
+            ]
+        )
+        width_values = geopandas.GeoDataFrame(
+            {"widths": numpy.ones(len(points))},
+            geometry=points,
+            index=numpy.arange(len(points)) * 2,
+            crs=2193,
+        )
+
+        nearest_values = bathymetry_estimation.nearest_reach_values(
+            samples=width_values,
+            reaches=reaches,
+            columns=["id", "flow", "mannings_n"],
+        )
+        reference = reference_nearest_reach_values(width_values, reaches)
+        self.assertEqual(list(nearest_values.index), list(width_values.index[:-2]))
+        for column in ["id", "flow", "mannings_n"]:
+            numpy.testing.assert_array_equal(
+                nearest_values[column], reference.loc[nearest_values.index, column]
+            )
+        # Ties take the minimum of each value
+        numpy.testing.assert_array_equal(
+            nearest_values.loc[40, ["id", "flow", "mannings_n"]], [1, 5.0, 0.03]
+        )
+
+    def test_thalweg_from_measured_centred_spacing(self):
+        """Check the thalweg centred nodes match the original implementation."""
+
+        random = numpy.random.default_rng(seed=47)
+        # Cross sections every 10m - measured sections midway between the first
+        # two, on the fourth and near the last
+        sections = shapely.linestrings(
+            [[(0, y), (20, y)] for y in numpy.arange(0, 60, 10)]
+        )
+        measured_sections = geopandas.GeoSeries(
+            [
+                shapely.geometry.MultiPoint(
+                    [
+                        (x, y, z)
+                        for x, z in zip(
+                            numpy.linspace(0, 20, 9), random.uniform(0, 5, size=9)
+                        )
+                    ]
+                )
+                for y in [5, 30, 47]
+            ],
+            crs=2193,
+        ).explode(index_parts=True)
+
+        interpolator = bathymetry_estimation.InterpolateMeasuredElevations.__new__(
+            bathymetry_estimation.InterpolateMeasuredElevations
+        )
+        cross_sections = geopandas.GeoDataFrame(
+            {"Sections": geopandas.GeoSeries(sections)}
+        )
+        interpolator.thalweg_from_measured_centred_spacing(
+            samples_per_section=4,
+            cross_sections=cross_sections,
+            measured_sections_exploded=measured_sections,
+        )
+        reference = geopandas.GeoDataFrame({"Sections": geopandas.GeoSeries(sections)})
+        reference_thalweg_from_measured_centred_spacing(
+            samples_per_section=4,
+            cross_sections=reference,
+            measured_sections_exploded=measured_sections,
+        )
+        numpy.testing.assert_allclose(
+            cross_sections["Thalweg ratio"], reference["Thalweg ratio"], rtol=1e-12
+        )
+        numpy.testing.assert_allclose(
+            shapely.get_coordinates(cross_sections["Sections"].to_numpy()),
+            shapely.get_coordinates(reference["Sections"].to_numpy()),
+            rtol=1e-12,
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,141 @@
+# -*- coding: utf-8 -*-
+"""
+Tests for the polygonising of DEM extents from a raster mask.
+"""
+
+import unittest
+import numpy
+import rasterio
+import rasterio.features
+import shapely
+import shapely.affinity
+import shapely.geometry
+import shapely.ops
+
+from geofabrics import dem
+
+
+def reference_extents(mask: numpy.ndarray, transform) -> shapely.Geometry:
+    """The original implementation - polygonise the whole mask in one call with
+    holes removed and no simplification."""
+
+    extents = shapely.ops.unary_union(
+        [
+            shapely.geometry.shape(polygon[0])
+            for polygon in rasterio.features.shapes(numpy.uint8(mask))
+            if polygon[1] == 1.0
+        ]
+    )
+    if type(extents) is shapely.geometry.Polygon:
+        extents = shapely.geometry.Polygon(extents.exterior)
+    else:
+        extents = shapely.geometry.MultiPolygon(
+            [shapely.geometry.Polygon(polygon.exterior) for polygon in extents.geoms]
+        )
+    return shapely.affinity.affine_transform(
+        extents,
+        [
+            transform.a,
+            transform.b,
+            transform.d,
+            transform.e,
+            transform.xoff,
+            transform.yoff,
+        ],
+    ).buffer(0)
+
+
+class Test(unittest.TestCase):
+    """Compare the chunked and simplified extents against the original extents.
+
+    Tests run include:
+        1. test_within_half_pixel - The simplified outline is within half a pixel
+        of the pixel exact outline
+        2. test_chunk_seams - Chunking the mask doesn't change the extents
+        3. test_empty_and_full - An all False mask has no extents and an all True
+        mask is its bounding box
+    """
+
+    RESOLUTION = 2
+
+    @classmethod
+    def setUpClass(cls):
+        """Create an irregular mask - a disc with a hole, a notched rectangle and
+        a single pixel."""
+
+        rows, columns = numpy.mgrid[0:120, 0:150]
+        radius = numpy.hypot(rows - 50, columns - 55)
+        cls.mask = (radius < 40) & (radius > 10)
+        cls.mask[90:115, 100:145] = True
+        cls.mask[95:100, 110:120] = False
+        cls.mask[5, 140] = True
+        cls.transform = rasterio.Affine(
+            cls.RESOLUTION, 0, 1000, 0, -cls.RESOLUTION, 5000
+        )
+        cls.reference = reference_extents(cls.mask, cls.transform)
+
+    def test_within_half_pixel(self):
+        """Check the simplification only removes pixel stair-steps."""
+
+        extents = dem.extents_from_mask(
+            mask=self.mask, transform=self.transform, crs=2193, chunk_size=None
+        ).geometry.iloc[0]
+        tolerance = dem.EXTENTS_SIMPLIFY_TOLERANCE * self.RESOLUTION
+        self.assertLessEqual(
+            shapely.hausdorff_distance(extents, self.reference), tolerance + 1e-9
+        )
+        self.assertLess(
+            abs(extents.area - self.reference.area) / self.reference.area, 0.01
+        )
+        self.assertEqual(
+            len(shapely.get_parts(extents)), len(shapely.get_parts(self.reference))
+        )
+
+    def test_chunk_seams(self):
+        """Check the chunks merge along their seams without slivers."""
+
+        unchunked = dem.extents_from_mask(
+            mask=self.mask, transform=self.transform, crs=2193, chunk_size=None
+        ).geometry.iloc[0]
+        for chunk_size in [7, 32, 64]:
+            extents = dem.extents_from_mask(
+                mask=self.mask,
+                transform=self.transform,
+                crs=2193,
+                chunk_size=chunk_size,
+            ).geometry.iloc[0]
+            self.assertEqual(
+                len(shapely.get_parts(extents)), len(shapely.get_parts(unchunked))
+            )
+            self.assertLessEqual(
+                shapely.hausdorff_distance(extents, self.reference),
+                dem.EXTENTS_SIMPLIFY_TOLERANCE * self.RESOLUTION + 1e-9,
+            )
+
+    def test_empty_and_full(self):
+        """Check the extents of empty and fully covered masks."""
+
+        empty = dem.extents_from_mask(
+            mask=numpy.zeros((20, 30), dtype=bool),
+            transform=self.transform,
+            crs=2193,
+            chunk_size=8,
+        )
+        self.assertTrue(empty.geometry.iloc[0].is_empty)
+        full = dem.extents_from_mask(
+            mask=numpy.ones((20, 30), dtype=bool),
+            transform=self.transform,
+            crs=2193,
+            chunk_size=8,
+        ).geometry.iloc[0]
+        self.assertTrue(
+            full.equals(
+                shapely.geometry.box(
+                    1000, 5000 - 20 * self.RESOLUTION, 1000 + 30 * self.RESOLUTION, 5000
+                )
+            )
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
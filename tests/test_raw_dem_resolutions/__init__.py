@@ -0,0 +1,6 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Tue Jun 29 14:33:10 2021
+
+@author: pearsonra
+"""
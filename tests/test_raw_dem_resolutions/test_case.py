@@ -0,0 +1,266 @@
+# -*- coding: utf-8 -*-
+"""
+Tests for rasterising raw DEMs at additional resolutions from the same LiDAR reads.
+"""
+
+import pathlib
+import tempfile
+import types
+import unittest
+import unittest.mock
+import geopandas
+import numpy
+import shapely.geometry
+
+from geofabrics import dem
+from geofabrics import geometry
+
+
+class Test(unittest.TestCase):
+    """Compare additional resolution raw DEMs against single resolution raw DEMs.
+    The LiDAR is a single synthetic tile - the PDAL read is replaced by its points.
+
+    Tests run include:
+        1. test_split_into_chunks - The coordinates of coarser and finer grids are
+        split at the chunk seams of the main DEM
+        2. test_empty_chunks_dropped - Chunks with no coordinates in a much coarser
+        grid are dropped from the blocked arrays
+        3. test_matches_single_resolution - Additional resolution DEMs match those
+        created on their own from the same points, with each chunk read once
+    """
+
+    CRS = {"horizontal": 2193, "vertical": 7839}
+    METADATA = {
+        "library_name": "GeoFabrics",
+        "library_version": "test",
+        "class_name": "Test",
+        "utc_time": "",
+        "instructions": {"dataset_mapping": {"lidar": {"synthetic": 1, "no LiDAR": 0}}},
+    }
+
+    @classmethod
+    def setUpClass(cls):
+        """Create a catchment not aligned to any of the grids, a tile index of one
+        tile covering it and points over the tile."""
+
+        cls.temp_folder = tempfile.TemporaryDirectory()
+        cls.folder = pathlib.Path(cls.temp_folder.name)
+        cls.catchment_file = cls.folder / "catchment.geojson"
+        geopandas.GeoSeries(
+            [shapely.geometry.box(1000.5, 2000.3, 1101.7, 2083.2)], crs=2193
+        ).to_file(cls.catchment_file)
+
+        cls.tile_file = cls.folder / "tile.laz"
+        cls.tile_file.touch()
+        cls.tile_index_file = cls.folder / "tile_index.geojson"
+        geopandas.GeoDataFrame(
+            {"filename": [cls.tile_file.name]},
+            geometry=[shapely.geometry.box(990, 1990, 1110, 2090)],
+            crs=2193,
+        ).to_file(cls.tile_index_file)
+
+        generator = numpy.random.default_rng(seed=5)
+        number_of_points = 20000
+        cls.points = numpy.empty(
+            number_of_points,
+            dtype=[("X", "f8"), ("Y", "f8"), ("Z", "f8"), ("Classification", "u1")],
+        )
+        cls.points["X"] = generator.uniform(990, 1110, number_of_points)
+        cls.points["Y"] = generator.uniform(1990, 2090, number_of_points)
+        cls.points["Z"] = 0.1 * cls.points["X"] + generator.normal(
+            scale=0.5, size=number_of_points
+        )
+        cls.points["Classification"] = 2
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.temp_folder.cleanup()
+
+    def read_file_with_pdal(self, **kwargs):
+        """Return the synthetic points in place of a PDAL pipeline - recording each
+        read."""
+
+        self.reads.append(kwargs["lidar_file"])
+        return types.SimpleNamespace(arrays=[self.points.copy()])
+
+    def setUp(self):
+        """Clear the recorded reads."""
+
+        self.reads = []
+
+    def create_raw_dem(self, resolution: float, chunk_size: int) -> dem.RawDem:
+        """Create a raw DEM of the catchment at the resolution."""
+
+        catchment_geometry = geometry.CatchmentGeometry(
+            self.catchment_file, self.CRS, resolution, foreshore_buffer=2
+        )
+        catchment_geometry.land = self.catchment_file
+        return dem.RawDem(
+            catchment_geometry=catchment_geometry,
+            lidar_interpolation_method="mean",
+            drop_offshore_lidar={"synthetic": False},
+            zero_positive_foreshore=False,
+            buffer_cells=0,
+            chunk_size=chunk_size,
+        )
+
+    def add_lidar(self, raw_dem: dem.RawDem, additional_dems: list = []):
+        """Add the synthetic LiDAR to the raw DEM and any additional DEMs."""
+
+        with unittest.mock.patch.object(
+            dem, "read_file_with_pdal", self.read_file_with_pdal
+        ):
+            raw_dem.add_lidar(
+                lidar_datasets_info={
+                    "synthetic": {
+                        "file_paths": [self.tile_file],
+                        "tile_index_file": self.tile_index_file,
+                        "crs": self.CRS,
+                    }
+                },
+                lidar_classifications_to_keep=[2],
+                metadata=self.METADATA,
+                additional_dems=additional_dems,
+            )
+            # Compute while the PDAL read is replaced
+            folder = pathlib.Path(tempfile.mkdtemp(dir=self.folder))
+            dems = [raw_dem] + additional_dems
+            dem.DemBase.save_and_load_dems(
+                dems=dems,
+                filenames=[folder / f"raw_lidar_{i}.nc" for i in range(len(dems))],
+            )
+
+    def test_split_into_chunks(self):
+        """Check coordinates are split by the chunk containing them."""
+
+        main_dem = self.create_raw_dem(resolution=2, chunk_size=7)
+        chunked_dim_x, chunked_dim_y = main_dem._set_up_chunks()
+        for resolution in [0.5, 3]:
+            additional_dem = self.create_raw_dem(resolution=resolution, chunk_size=7)
+            dims_x, dims_y = additional_dem._split_into_chunks(
+                chunked_dim_x, chunked_dim_y
+            )
+            self.assertEqual(len(dims_x), len(chunked_dim_x))
+            self.assertEqual(len(dims_y), len(chunked_dim_y))
+
+            # No coordinates are lost or repeated
+            x = numpy.concatenate(dims_x)
+            y = numpy.concatenate(dims_y)
+            bounds = additional_dem.catchment_geometry.catchment.total_bounds
+            self.assertEqual(x[0], numpy.ceil(bounds[0] / resolution) * resolution)
+            self.assertEqual(y[0], numpy.ceil(bounds[3] / resolution) * resolution)
+            numpy.testing.assert_allclose(numpy.diff(x), resolution)
+            numpy.testing.assert_allclose(numpy.diff(y), -resolution)
+
+            # Each coordinate is in the chunk containing it - or within a pixel of
+            # the outer chunks as the grids are aligned to their own resolution
+            margin = max(resolution, main_dem.catchment_geometry.resolution)
+            for j, dim_x in enumerate(dims_x):
+                lower = chunked_dim_x[j][0] if j > 0 else chunked_dim_x[0][0] - margin
+                self.assertTrue((dim_x >= lower).all())
+                if j + 1 < len(dims_x):
+                    self.assertTrue((dim_x < chunked_dim_x[j + 1][0]).all())
+                else:
+                    self.assertTrue((dim_x <= chunked_dim_x[j][-1] + margin).all())
+            for i, dim_y in enumerate(dims_y):
+                upper = chunked_dim_y[i][0] if i > 0 else chunked_dim_y[0][0] + margin
+                self.assertTrue((dim_y <= upper).all())
+                if i + 1 < len(dims_y):
+                    self.assertTrue((dim_y > chunked_dim_y[i + 1][0]).all())
+                else:
+                    self.assertTrue((dim_y >= chunked_dim_y[i][-1] - margin).all())
+
+    def test_empty_chunks_dropped(self):
+        """Check a grid coarser than the chunks is blocked without its empty
+        chunks."""
+
+        main_dem = self.create_raw_dem(resolution=1, chunk_size=8)
+        additional_dem = self.create_raw_dem(resolution=30, chunk_size=8)
+        chunked_dim_x, chunked_dim_y = main_dem._set_up_chunks()
+        dims_x, dims_y = additional_dem._split_into_chunks(chunked_dim_x, chunked_dim_y)
+        self.assertTrue(any(len(dim_x) == 0 for dim_x in dims_x))
+        self.assertTrue(any(len(dim_y) == 0 for dim_y in dims_y))
+
+        with unittest.mock.patch.object(
+            dem, "read_file_with_pdal", self.read_file_with_pdal
+        ):
+            main_dem._add_tiled_lidar_chunked(
+                lidar_datasets_info={
+                    "synthetic": {
+                        "file_paths": [self.tile_file],
+                        "tile_index_file": self.tile_index_file,
+                        "crs": self.CRS,
+                    }
+                },
+                metadata=self.METADATA,
+                raster_options={
+                    "lidar_classifications_to_keep": [2],
+                    "lidar_classifications_to_read": [2],
+                    "raster_type": geometry.RASTER_TYPE,
+                    "elevation_range": None,
+                    "radius": 1 / numpy.sqrt(2),
+                    "method": "mean",
+                    "crs": self.CRS,
+                    "strict": True,
+                    "workers": 1,
+                    "lidar_z_type": "float64",
+                },
+                additional_dems=[additional_dem],
+                additional_options=[
+                    {
+                        "lidar_classifications_to_keep": [2],
+                        "raster_type": geometry.RASTER_TYPE,
+                        "elevation_range": None,
+                        "radius": 30 / numpy.sqrt(2),
+                        "method": "mean",
+                        "crs": self.CRS,
+                        "strict": True,
+                        "workers": 1,
+                        "lidar_z_type": "float64",
+                    }
+                ],
+            )
+            z = additional_dem._dem.z
+            self.assertEqual(
+                z.shape,
+                (len(numpy.concatenate(dims_y)), len(numpy.concatenate(dims_x))),
+            )
+            self.assertEqual(
+                z.data.numblocks,
+                (
+                    sum(len(dim_y) > 0 for dim_y in dims_y),
+                    sum(len(dim_x) > 0 for dim_x in dims_x),
+                ),
+            )
+            self.assertFalse(numpy.isnan(z.values).any())
+
+    def test_matches_single_resolution(self):
+        """Check coarser and finer additional DEMs match single resolution runs."""
+
+        main_dem = self.create_raw_dem(resolution=2, chunk_size=7)
+        additional_dems = [
+            self.create_raw_dem(resolution=resolution, chunk_size=7)
+            for resolution in [1, 5]
+        ]
+        self.add_lidar(main_dem, additional_dems=additional_dems)
+        chunked_dim_x, chunked_dim_y = main_dem._set_up_chunks()
+        self.assertEqual(len(self.reads), len(chunked_dim_x) * len(chunked_dim_y))
+
+        for raw_dem in [main_dem] + additional_dems:
+            single_dem = self.create_raw_dem(
+                resolution=raw_dem.catchment_geometry.resolution, chunk_size=7
+            )
+            self.add_lidar(single_dem)
+            numpy.testing.assert_array_equal(raw_dem.dem.x, single_dem.dem.x)
+            numpy.testing.assert_array_equal(raw_dem.dem.y, single_dem.dem.y)
+            self.assertLess(numpy.isnan(raw_dem.dem.z.values).mean(), 0.5)
+            for layer in ["z", "data_source", "lidar_source"]:
+                numpy.testing.assert_allclose(
+                    raw_dem.dem[layer].values,
+                    single_dem.dem[layer].values,
+                    err_msg=f"{layer} at {raw_dem.catchment_geometry.resolution}m",
+                )
+
+
+if __name__ == "__main__":
+    unittest.main()
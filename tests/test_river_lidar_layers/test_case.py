@@ -0,0 +1,205 @@
+# -*- coding: utf-8 -*-
+"""
+Tests for creating the river ground and vegetation DEMs from one LiDAR pass.
+"""
+
+import copy
+import pathlib
+import shutil
+import tempfile
+import types
+import unittest
+import unittest.mock
+import geopandas
+import numpy
+import shapely.geometry
+import xarray
+
+from geofabrics import dem
+from geofabrics import processor
+
+
+class Channel:
+    """A channel with a fixed catchment - in place of a river network channel."""
+
+    def __init__(self, catchment: geopandas.GeoDataFrame):
+        self.catchment = catchment
+
+    def get_channel_catchment(self, corridor_radius: float):
+        return self.catchment
+
+
+class Test(unittest.TestCase):
+    """Compare the ground and vegetation DEMs created in one pass against those
+    created in separate passes. The LiDAR is a single synthetic tile - the PDAL
+    read is replaced by its points.
+
+    Tests run include:
+        1. test_single_pass_matches_two_pass - The single pass raw_gnd_dem.nc and
+        raw_veg_dem.nc match those created separately
+        2. test_instructions_restored - The instructions are restored after each
+        pass, including when it raises an error
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        """Create a catchment, a tile index of one tile covering it and ground and
+        vegetation points over the tile."""
+
+        cls.temp_folder = tempfile.TemporaryDirectory()
+        cls.folder = pathlib.Path(cls.temp_folder.name)
+        cls.catchment = geopandas.GeoDataFrame(
+            geometry=[shapely.geometry.box(1000.5, 2000.3, 1061.7, 2043.2)], crs=2193
+        )
+
+        cls.tile_file = cls.folder / "tile.laz"
+        cls.tile_file.touch()
+        cls.tile_index_file = cls.folder / "tile_index.geojson"
+        geopandas.GeoDataFrame(
+            {"filename": [cls.tile_file.name]},
+            geometry=[shapely.geometry.box(990, 1990, 1070, 2050)],
+            crs=2193,
+        ).to_file(cls.tile_index_file)
+
+        generator = numpy.random.default_rng(seed=7)
+        number_of_points = 20000
+        cls.points = numpy.empty(
+            number_of_points,
+            dtype=[("X", "f8"), ("Y", "f8"), ("Z", "f8"), ("Classification", "u1")],
+        )
+        cls.points["X"] = generator.uniform(990, 1070, number_of_points)
+        cls.points["Y"] = generator.uniform(1990, 2050, number_of_points)
+        cls.points["Classification"] = generator.choice(
+            [2, 3, 4, 5], size=number_of_points
+        )
+        cls.points["Z"] = (
+            0.1 * cls.points["X"]
+            + 2 * (cls.points["Classification"] - 2)
+            + generator.normal(scale=0.2, size=number_of_points)
+        )
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.temp_folder.cleanup()
+
+    def read_file_with_pdal(self, **kwargs):
+        """Return the synthetic points in place of a PDAL pipeline."""
+
+        return types.SimpleNamespace(arrays=[self.points.copy()])
+
+    def instructions(self, name: str) -> dict:
+        """Return river instructions with a separate local cache."""
+
+        return {
+            "output": {
+                "crs": {"horizontal": 2193, "vertical": 7839},
+                "grid_params": {"resolution": 2},
+            },
+            "processing": {
+                "chunk_size": 8,
+                "number_of_cores": 1,
+                "execution_mode": "threads",
+            },
+            "data_paths": {
+                "local_cache": str(self.folder / name),
+                "subfolder": "results",
+            },
+            "datasets": {
+                "lidar": {
+                    "local": {
+                        "synthetic": {
+                            "file_paths": [str(self.tile_file)],
+                            "tile_index_file": str(self.tile_index_file),
+                            "crs": {"horizontal": 2193, "vertical": 7839},
+                        }
+                    }
+                }
+            },
+            "dataset_mapping": {"lidar": {"synthetic": 1}},
+            "general": {
+                "drop_offshore_lidar": False,
+                "lidar_classifications_to_keep": [2],
+                "interpolation": {"lidar": "mean"},
+                "vector_format": "geojson",
+            },
+            "rivers": {
+                "veg_lidar_classifications_to_keep": [2, 3, 4, 5],
+                "veg_lidar_interpolation": "max",
+                "river_corridor_width": 20,
+                "area_threshold": 100,
+            },
+        }
+
+    def get_dems(self, runner: processor.RiverBathymetryGenerator) -> tuple:
+        """Create or load the ground and vegetation DEMs."""
+
+        runner.get_instruction_path("subfolder").mkdir(parents=True, exist_ok=True)
+        with unittest.mock.patch.object(
+            dem, "read_file_with_pdal", self.read_file_with_pdal
+        ):
+            return runner.get_dems(channel=Channel(self.catchment))
+
+    def test_single_pass_matches_two_pass(self):
+        """Check each DEM created separately matches the single pass."""
+
+        single_runner = processor.RiverBathymetryGenerator(self.instructions("single"))
+        single_gnd, single_veg = self.get_dems(single_runner)
+
+        # Create the other DEM separately given an existing ground or vegetation DEM
+        for key, other_key in [("gnd_dem", "veg_dem"), ("veg_dem", "gnd_dem")]:
+            runner = processor.RiverBathymetryGenerator(self.instructions(key))
+            runner.get_instruction_path("subfolder").mkdir(parents=True)
+            shutil.copy(
+                single_runner.get_result_file_path(key=other_key),
+                runner.get_result_file_path(key=other_key),
+            )
+            gnd_dem, veg_dem = self.get_dems(runner)
+            single_dem, two_pass_dem = (
+                (single_gnd, gnd_dem) if key == "gnd_dem" else (single_veg, veg_dem)
+            )
+            numpy.testing.assert_array_equal(single_dem.x, two_pass_dem.x)
+            numpy.testing.assert_array_equal(single_dem.y, two_pass_dem.y)
+            self.assertLess(numpy.isnan(single_dem.z.values).mean(), 0.5)
+            for layer in ["z", "data_source", "lidar_source"]:
+                xarray.testing.assert_allclose(
+                    single_dem[layer].load(), two_pass_dem[layer].load()
+                )
+
+        # The vegetation DEM is the maximum of all classes so above the ground
+        self.assertTrue(
+            (single_veg.z >= single_gnd.z).where(single_gnd.z.notnull()).all()
+        )
+        self.assertGreater(float((single_veg.z - single_gnd.z).mean()), 1)
+
+    def test_instructions_restored(self):
+        """Check the instructions are unchanged after each pass."""
+
+        runner = processor.RiverBathymetryGenerator(self.instructions("restored"))
+        runner.get_instruction_path("subfolder").mkdir(parents=True, exist_ok=True)
+        runner.get_bathymetry_instruction("veg_lidar_interpolation")
+        runner.get_instruction_general(key="interpolation", subkey="lidar")
+        runner.instructions["data_paths"]["extents"] = runner.get_result_file_name(
+            key="catchment"
+        )
+        instructions = copy.deepcopy(runner.instructions)
+
+        def run(self):
+            raise RuntimeError("Failed run")
+
+        # Existing DEMs are empty files so aren't opened
+        with unittest.mock.patch.object(
+            processor.RawLidarDemGenerator, "run", run
+        ), unittest.mock.patch("rioxarray.open_rasterio"):
+            # Single pass, ground and vegetation passes
+            for existing_key in [None, "veg_dem", "gnd_dem"]:
+                if existing_key is not None:
+                    runner.get_result_file_path(key=existing_key).touch()
+                with self.assertRaises(RuntimeError):
+                    runner.get_dems(channel=Channel(self.catchment))
+                self.assertEqual(runner.instructions, instructions)
+                if existing_key is not None:
+                    runner.get_result_file_path(key=existing_key).unlink()
+
+
+if __name__ == "__main__":
+    unittest.main()
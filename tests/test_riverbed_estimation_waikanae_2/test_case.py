@@ -15,6 +15,7 @@ import pytest
 import numpy
 
 from geofabrics import processor
+from geofabrics import geometry
 from tests import base_test
 
 
@@ -26,6 +27,7 @@ class Test(base_test.Test):
         1. test_river_polygon - Test that the expected river polygon is created
         2. test_river_bathymetry - Test that the expected river bathymetry is created
         3. test_fan - Test that the expected fan polygon and geometry are created
+        4. test_vector_format - Test the outputs are GeoParquet by default
     """
 
     @classmethod
@@ -56,7 +58,7 @@ class Test(base_test.Test):
         print(f"Compare river polygon - with tolerance {decimal_places}")
         data_path_instructions = self.instructions["data_paths"]
 
-        test = geopandas.read_file(self.results_dir / "river_polygon.geojson")
+        test = geometry.read_vector(self.results_dir / "river_polygon.geojson")
         benchmark = geopandas.read_file(
             self.cache_dir / data_path_instructions["benchmark"]["extents"]
         )
@@ -84,7 +86,7 @@ class Test(base_test.Test):
 
         data_path_instructions = self.instructions["data_paths"]
 
-        test = geopandas.read_file(self.results_dir / "river_polygon.geojson")
+        test = geometry.read_vector(self.results_dir / "river_polygon.geojson")
         benchmark = geopandas.read_file(
             self.cache_dir / data_path_instructions["benchmark"]["extents"]
         )
@@ -110,7 +112,7 @@ class Test(base_test.Test):
 
         data_path_instructions = self.instructions["data_paths"]
 
-        test = geopandas.read_file(self.results_dir / "river_bathymetry.geojson")
+        test = geometry.read_vector(self.results_dir / "river_bathymetry.geojson")
         benchmark = geopandas.read_file(
             self.cache_dir / data_path_instructions["benchmark"]["elevations"]
         )
@@ -170,7 +172,7 @@ class Test(base_test.Test):
 
         data_path_instructions = self.instructions["data_paths"]
 
-        test = geopandas.read_file(self.results_dir / "river_bathymetry.geojson")
+        test = geometry.read_vector(self.results_dir / "river_bathymetry.geojson")
         benchmark = geopandas.read_file(
             self.cache_dir / data_path_instructions["benchmark"]["elevations"]
         )
@@ -190,6 +192,18 @@ class Test(base_test.Test):
             f"river bathymetry {benchmark}: {comparison}",
         )
 
+    def test_vector_format(self):
+        """A test to see if the outputs are written in the default GeoParquet
+        format - and read when named by their GeoJSON file name."""
+
+        for name in ["river_polygon", "river_bathymetry"]:
+            self.assertTrue((self.results_dir / f"{name}.parquet").is_file())
+            self.assertFalse((self.results_dir / f"{name}.geojson").is_file())
+            self.assertEqual(
+                geometry.existing_vector_file(self.results_dir / f"{name}.geojson"),
+                self.results_dir / f"{name}.parquet",
+            )
+
 
 if __name__ == "__main__":
     unittest.main()
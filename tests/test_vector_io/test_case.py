@@ -0,0 +1,121 @@
+# -*- coding: utf-8 -*-
+"""
+Tests for writing and reading intermediate vector outputs as GeoParquet and GeoJSON.
+"""
+
+import os
+import pathlib
+import tempfile
+import unittest
+import geopandas
+import numpy
+import pandas
+import shapely
+import shapely.geometry
+
+from geofabrics import geometry
+
+
+class Test(unittest.TestCase):
+    """Check GeoParquet round trips the same as GeoJSON.
+
+    Tests run include:
+        1. test_multi_index - A MultiIndex is written as columns as with GeoJSON
+        2. test_geoseries - A GeoSeries is written as a GeoDataFrame
+        3. test_extent - Only the features within the extent bounding box are read
+        4. test_existing_vector_file - The most recently written format is read
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        """Create lines with a MultiIndex and values."""
+
+        cls.temp_folder = tempfile.TemporaryDirectory()
+        cls.folder = pathlib.Path(cls.temp_folder.name)
+        lines = geopandas.GeoDataFrame(
+            {"width": [1.0, 2.5, 4.0], "name": ["a", "b", "c"]},
+            geometry=[
+                shapely.geometry.LineString([(0, 0), (10, 0)]),
+                shapely.geometry.LineString([(20, 0), (30, 10)]),
+                shapely.geometry.LineString([(100, 100), (110, 100)]),
+            ],
+            crs=2193,
+        )
+        lines.index = pandas.MultiIndex.from_arrays(
+            [[0, 0, 1], [0, 1, 0]], names=["reach", "section"]
+        )
+        cls.vector = lines
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.temp_folder.cleanup()
+
+    def write_and_read(self, vector, name: str, **kwargs) -> dict:
+        """Write and read in both vector formats - returning each by suffix."""
+
+        results = {}
+        for suffix in geometry.VECTOR_FORMATS.values():
+            file = self.folder / f"{name}{suffix}"
+            geometry.write_vector(vector, file)
+            results[suffix] = geometry.read_vector(file, **kwargs)
+        return results
+
+    def test_multi_index(self):
+        """Check the index levels are written as columns."""
+
+        results = self.write_and_read(self.vector, "multi_index")
+        parquet, geojson = results[".parquet"], results[".geojson"]
+        self.assertEqual(list(parquet.columns), list(geojson.columns))
+        self.assertIn("reach", parquet.columns)
+        self.assertIn("section", parquet.columns)
+        self.assertEqual(parquet.crs, self.vector.crs)
+        self.assertTrue(all(parquet.geometry.geom_equals(geojson.geometry)))
+        numpy.testing.assert_array_equal(parquet["width"], self.vector["width"])
+        numpy.testing.assert_array_equal(
+            parquet["reach"], self.vector.index.get_level_values("reach")
+        )
+
+    def test_geoseries(self):
+        """Check a GeoSeries is read back with the same geometries."""
+
+        results = self.write_and_read(self.vector.reset_index().geometry, "series")
+        for vector in results.values():
+            self.assertIsInstance(vector, geopandas.GeoDataFrame)
+            self.assertEqual(vector.crs, self.vector.crs)
+            self.assertTrue(
+                all(shapely.equals(vector.geometry.to_numpy(), self.vector.geometry))
+            )
+
+    def test_extent(self):
+        """Check the same features are read within an extent in another CRS."""
+
+        extent = geopandas.GeoDataFrame(
+            geometry=[shapely.geometry.box(5, -5, 25, 5)], crs=2193
+        ).to_crs(4326)
+        results = self.write_and_read(self.vector, "extent", extent=extent)
+        for vector in results.values():
+            self.assertEqual(list(vector["name"]), ["a", "b"])
+
+    def test_existing_vector_file(self):
+        """Check the newest of the intermediate vector formats is resolved."""
+
+        parquet_file = self.folder / "existing.parquet"
+        geojson_file = self.folder / "existing.geojson"
+        self.assertEqual(geometry.existing_vector_file(parquet_file), parquet_file)
+
+        geometry.write_vector(self.vector, geojson_file)
+        self.assertEqual(geometry.existing_vector_file(parquet_file), geojson_file)
+
+        # A newer GeoParquet file is read when the stale GeoJSON is named
+        geometry.write_vector(self.vector.iloc[:1], parquet_file)
+        os.utime(geojson_file, ns=(1_000_000_000, 1_000_000_000))
+        self.assertEqual(geometry.existing_vector_file(geojson_file), parquet_file)
+        self.assertEqual(len(geometry.read_vector(geojson_file)), 1)
+
+        # Other files are returned as named
+        other_file = self.folder / "existing.gpkg"
+        self.assertEqual(geometry.existing_vector_file(other_file), other_file)
+
+
+if __name__ == "__main__":
+    unittest.main()